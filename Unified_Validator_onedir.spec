@@ -0,0 +1,53 @@
+# -*- mode: python ; coding: utf-8 -*-
+# Startup-optimized build: pyinstaller Unified_Validator_onedir.spec
+#   -> dist/Unified_Validator_onedir/Unified_Validator
+# One folder instead of one file, so a launch does not unpack the whole
+# bundle to a temp dir first, and no UPX, so nothing is decompressed either.
+# Modules the validator never imports (lxml.html and the parsers it can
+# hook into, test and doc tooling) are left out of the bundle.
+
+
+a = Analysis(
+    ['main.py'],
+    pathex=[],
+    binaries=[],
+    datas=[],
+    hiddenimports=[],
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    excludes=[
+        'tkinter', 'unittest', 'doctest', 'pydoc', 'pdb', 'xmlrpc', 'webbrowser', 'asyncio',
+        'lxml.html', 'bs4', 'soupsieve', 'html5lib', 'charset_normalizer',
+    ],
+    noarchive=False,
+    optimize=0,
+)
+pyz = PYZ(a.pure)
+
+exe = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+    name='Unified_Validator',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=False,
+    console=True,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+)
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='Unified_Validator_onedir',
+)
@@ -0,0 +1,596 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import tracemalloc
+import multiprocessing
+from functools import partial
+
+try:
+    import resource
+except ImportError:
+    # Windows: no peak RSS, stage memory still comes from tracemalloc
+    resource = None
+
+from lxml import etree
+
+from parser import parse_xml, parse_xml_streaming, preprocess_file_content
+from entity_checker import check_entities, check_table_spacing
+from tag_checker import check_tag_nesting, check_cross_page_tags, validate_tags, TagRulesTarget
+from validator import (
+    validate_file, check_invalid_angle_tags, check_blank_lines_after_page_one,
+    ROOT_TAG_PATTERN, SPAGE_TAG_PATTERN,
+)
+from config import CUSTOM_ENTITIES, SUPPORTED_TAGS, NON_CLOSING_TAGS
+from ruleset import active_ruleset
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_FILE = os.path.join(HERE, "Samples", "327A3D.fnt")
+MAIN_SCRIPT = os.path.join(HERE, "main.py")
+DEFAULT_CORPUS_DIR = "bench_corpus"
+DEFAULT_RESULTS_FILE = "benchmark_results.json"
+
+KB = 1024
+MB = 1024 * KB
+SIZES = {
+    "1KB": 1 * KB,
+    "64KB": 64 * KB,
+    "1MB": 1 * MB,
+    "16MB": 16 * MB,
+    "128MB": 128 * MB,
+    "500MB": 500 * MB,
+}
+DEFAULT_MAX_SIZE = "16MB"
+
+# Many-small-files case
+SMALL_FILE_COUNT = 1000
+SMALL_FILE_BYTES = 4 * KB
+
+# Timings/peaks below these are noise, never reported as regressions
+MIN_COMPARE_SECONDS = 0.005
+MIN_COMPARE_KB = 256
+
+DEFAULT_MAX_SLOWDOWN = 0.25
+DEFAULT_MAX_MEMORY_GROWTH = 0.25
+
+# --startup: launches timed per command, after a first (coldest) one
+DEFAULT_LAUNCHES = 10
+# Frozen builds compared when they are there (Unified_Validator.spec, Unified_Validator_onedir.spec)
+_EXE_SUFFIX = ".exe" if sys.platform == "win32" else ""
+FROZEN_BUILDS = (
+    os.path.join(HERE, "dist", "Unified_Validator" + _EXE_SUFFIX),
+    os.path.join(HERE, "dist", "Unified_Validator_onedir", "Unified_Validator" + _EXE_SUFFIX),
+)
+
+PAGE_MARKER_PATTERN = re.compile(r"^<Page\s+\d+\s*>\s*$", re.MULTILINE)
+
+WORDS = (
+    "court appeal judgment motion party record finding order trial evidence "
+    "statute claim relief contract damages review remand hearing counsel affirm"
+).split()
+
+
+# ========== CORPUS GENERATOR ==========
+
+def split_pages(content):
+    """Page bodies of a document, without their <Page N> line."""
+    bodies = PAGE_MARKER_PATTERN.split(content)
+    # Text before <Page 1> (usually nothing) goes with the first page
+    if len(bodies) > 1:
+        bodies[1] = bodies[0] + bodies[1]
+        bodies = bodies[1:]
+    return [body.strip("\n") for body in bodies]
+
+
+def render_pages(page_source, target_bytes):
+    """
+    Renumbered <Page N> pages taken from page_source(n) until target_bytes is
+    reached; a single page larger than the target is cut at a line boundary.
+    """
+    parts = []
+    size = 0
+    page = 1
+    while size < target_bytes:
+        part = f"<Page {page}>\n{page_source(page)}\n"
+        size += len(part.encode("utf-8"))
+        parts.append(part)
+        page += 1
+    content = "".join(parts)
+    if len(content.encode("utf-8")) > target_bytes and page == 2:
+        content = content.encode("utf-8")[:target_bytes].decode("utf-8", "ignore")
+        content = content[:content.rfind("\n") + 1] or content
+    return content
+
+
+def _sentence(rng, words=8):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def _sample_pages():
+    with open(SAMPLE_FILE, "r", encoding="utf-8") as f:
+        return split_pages(f.read())
+
+
+def mixed_source(rng, sample_pages):
+    """The sample's own pages, in order: real-world tag and error mix."""
+    return lambda page: sample_pages[(page - 1) % len(sample_pages)]
+
+
+def dense_source(rng, sample_pages):
+    """Sample pages with an error injected every few lines."""
+    injections = [
+        "&bogusent; stray entity",
+        "<Q9>unsupported tag</Q9>",
+        "<EMB><EM>bad nesting</EMB></EM>",
+        "< EM>spaced tag</EM>",
+        "</EMU> closing a tag opened nowhere",
+        "unclosed <EM>emphasis",
+    ]
+
+    def source(page):
+        lines = sample_pages[(page - 1) % len(sample_pages)].split("\n")
+        for i in range(0, len(lines), 4):
+            lines[i] += " " + rng.choice(injections)
+        return "\n".join(lines)
+    return source
+
+
+def clean_source(rng, sample_pages):
+    """Synthetic pages that pass every check."""
+    def source(page):
+        lines = ["[MT]", f"<P20>[&para;{page}] {_sentence(rng)}"]
+        for _ in range(rng.randint(6, 14)):
+            line = _sentence(rng)
+            if rng.random() < 0.3:
+                line += f" <EM>{_sentence(rng, 2)}</EM>"
+            if rng.random() < 0.1:
+                line += " &sect; 12"
+            lines.append(line)
+        lines.append(f"<HN24><EMB>{_sentence(rng, 3)}</EMB>")
+        lines.append("")
+        return "\n".join(lines)
+    return source
+
+
+def tables_source(rng, sample_pages):
+    """Pages made of <T>/<A> tables; some <EMB> cells hold runs of spaces."""
+    def source(page):
+        lines = []
+        for tag in ("T", "A", "T"):
+            lines.append(f"<{tag}>")
+            for _ in range(rng.randint(5, 12)):
+                gap = "  " if rng.random() < 0.2 else " "
+                lines.append(
+                    f"   <EMB>{rng.choice(WORDS)}{gap}{rng.choice(WORDS)}</EMB>"
+                    f"        {rng.randint(1, 99999):,}"
+                )
+                lines.append("")
+            lines.append(f"</{tag}>")
+        lines.append(f"<P20>{_sentence(rng)}")
+        return "\n".join(lines)
+    return source
+
+
+def entities_source(rng, sample_pages):
+    """
+    Long one-line paragraphs packed with &para;/&sect; references, an entity in
+    a tag attribute and bare '<' comparisons with no '>' after them (quadratic
+    for a tag scan that looks ahead for '>').
+    """
+    def source(page):
+        lines = []
+        for paragraph in range(rng.randint(2, 4)):
+            parts = [
+                f"<P20>[&para;{page}.{paragraph}]",
+                f'<EM title="&para;{rng.randint(1, 9)}">{rng.choice(WORDS)}</EM>',
+            ]
+            for _ in range(rng.randint(300, 600)):
+                roll = rng.random()
+                if roll < 0.3:
+                    parts.append(f"&sect; {rng.randint(1, 999)}")
+                elif roll < 0.45:
+                    parts.append(f"[&para;{rng.randint(1, 99)}]")
+                elif roll < 0.6:
+                    parts.append(f"x < {rng.randint(1, 99)}")
+                elif roll < 0.62:
+                    parts.append("&bogusent;")
+                else:
+                    parts.append(rng.choice(WORDS))
+            lines.append(" ".join(parts))
+        return "\n".join(lines)
+    return source
+
+
+VARIANTS = {
+    "mixed": mixed_source,
+    "dense": dense_source,
+    "clean": clean_source,
+    "tables": tables_source,
+    "entities": entities_source,
+}
+
+
+def build_corpus(corpus_dir, max_bytes, regenerate=False, seed=0):
+    """
+    Writes the benchmark corpus (once; regenerate=True rebuilds it) and returns
+    {case name: [file paths]}. Every variant at every size up to max_bytes,
+    plus a folder of many small files.
+    """
+    os.makedirs(corpus_dir, exist_ok=True)
+    sample_pages = None
+    cases = {}
+
+    for variant, make_source in VARIANTS.items():
+        for size_name, size in SIZES.items():
+            if size > max_bytes:
+                continue
+            name = f"{variant}_{size_name}"
+            path = os.path.join(corpus_dir, name + ".fnt")
+            if regenerate or not os.path.exists(path):
+                if sample_pages is None:
+                    sample_pages = _sample_pages()
+                rng = random.Random(f"{seed}-{name}")
+                content = render_pages(make_source(rng, sample_pages), size)
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(content)
+            cases[name] = [path]
+
+    small_dir = os.path.join(corpus_dir, "many_small")
+    os.makedirs(small_dir, exist_ok=True)
+    paths = [os.path.join(small_dir, f"small_{i:05d}.fnt") for i in range(SMALL_FILE_COUNT)]
+    if regenerate or not all(os.path.exists(path) for path in paths):
+        if sample_pages is None:
+            sample_pages = _sample_pages()
+        rng = random.Random(f"{seed}-many_small")
+        for i, path in enumerate(paths):
+            source = mixed_source(rng, sample_pages[i % len(sample_pages):])
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(render_pages(source, SMALL_FILE_BYTES))
+    cases["many_small"] = paths
+    return cases
+
+
+# ========== STAGE TIMING ==========
+
+# (stage, function of the values computed so far, name to keep its result under)
+# Inputs are prepared like validate_file prepares them
+STAGES = [
+    ("preprocess_file_content", lambda ctx: preprocess_file_content(ctx["raw"]), "cleaned"),
+    ("parse_xml", lambda ctx: parse_xml(ctx["cleaned"], preprocessed=True)[0], "tree"),
+    ("check_invalid_angle_tags", lambda ctx: check_invalid_angle_tags(ctx["raw"], SUPPORTED_TAGS), None),
+    ("check_blank_lines_after_page_one", lambda ctx: check_blank_lines_after_page_one(ctx["raw"]), None),
+    ("check_entities", lambda ctx: check_entities(ctx["raw"], CUSTOM_ENTITIES), None),
+    ("check_table_spacing", lambda ctx: check_table_spacing(ctx["raw"]), None),
+    ("check_tag_nesting", lambda ctx: check_tag_nesting(ctx["raw"]), None),
+    ("check_cross_page_tags", lambda ctx: check_cross_page_tags(ctx["raw"]), None),
+    ("validate_tags", lambda ctx: validate_tags(ctx["tree"], active_ruleset().allowed_tags, NON_CLOSING_TAGS), None),
+    # parse_xml + validate_tags without a tree (--stream-parse)
+    ("parse_xml_streaming", lambda ctx: parse_xml_streaming(
+        ctx["cleaned"], preprocessed=True, make_target=partial(TagRulesTarget, active_ruleset().allowed_tags)
+    ), None),
+]
+
+
+def _run_stage(func, ctx, repeat):
+    """Best wall time of `repeat` runs, then the tracemalloc peak of one more."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(ctx)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        etree.clear_error_log()
+    # tracemalloc sees Python allocations only, not libxml2's
+    tracemalloc.start()
+    try:
+        func(ctx)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    etree.clear_error_log()
+    return result, best, peak
+
+
+def time_stages(file_path, repeat=3):
+    """{stage: (seconds, peak bytes)} for one file; validate_tags is skipped if parsing fails."""
+    with open(file_path, "r", encoding="utf-8") as f:
+        raw_content = f.read()
+    ctx = {"raw": SPAGE_TAG_PATTERN.sub("", ROOT_TAG_PATTERN.sub("", raw_content))}
+    timings = {}
+    for stage, func, key in STAGES:
+        if stage == "validate_tags" and ctx.get("tree") is None:
+            continue
+        result, seconds, peak = _run_stage(func, ctx, repeat)
+        if key is not None:
+            ctx[key] = result
+        timings[stage] = (seconds, peak)
+    return timings
+
+
+def _peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * KB
+
+
+def _validate_file_child(file_paths, repeat):
+    best = 0.0
+    for file_path in file_paths:
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            validate_file(file_path)
+            times.append(time.perf_counter() - start)
+        best += min(times)
+    return best, _peak_rss_bytes() if resource is not None else None
+
+
+def time_validate_file(file_paths, repeat=3):
+    """
+    End-to-end validate_file time over the files, and the peak RSS of the
+    process that ran it (a fresh one, so earlier cases do not count).
+    """
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(1) as pool:
+        return pool.apply(_validate_file_child, (file_paths, repeat))
+
+
+def run_case(file_paths, repeat=3):
+    """Stage and end-to-end results of one case; files of a case are summed up."""
+    total_bytes = sum(os.path.getsize(path) for path in file_paths)
+    seconds = {}
+    peaks = {}
+    for path in file_paths:
+        for stage, (elapsed, peak) in time_stages(path, repeat).items():
+            seconds[stage] = seconds.get(stage, 0.0) + elapsed
+            peaks[stage] = max(peaks.get(stage, 0), peak)
+    total_seconds, peak_rss = time_validate_file(file_paths, repeat)
+    seconds["validate_file"] = total_seconds
+
+    stages = {}
+    for stage, elapsed in seconds.items():
+        stages[stage] = {
+            "seconds": round(elapsed, 6),
+            "mb_per_s": round(total_bytes / MB / elapsed, 3) if elapsed else None,
+            "peak_kb": peaks[stage] // KB if stage in peaks else None,
+        }
+    return {
+        "bytes": total_bytes,
+        "files": len(file_paths),
+        "stages": stages,
+        "peak_rss_mb": round(peak_rss / MB, 1) if peak_rss is not None else None,
+    }
+
+
+# ========== STARTUP ==========
+
+def _launchers(executables):
+    """(name, command) of every way of starting the validator that is compared."""
+    yield "python main.py", [sys.executable, MAIN_SCRIPT]
+    for executable in executables:
+        executable = os.path.abspath(executable)
+        inside = executable.startswith(HERE + os.sep)
+        yield os.path.relpath(executable, HERE) if inside else executable, [executable]
+
+
+def time_launch(command, launches, cwd):
+    """Wall time of the first launch (the coldest: nothing of it cached yet) and the median of the next ones."""
+    times = []
+    for _ in range(launches + 1):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=cwd, stdin=subprocess.DEVNULL,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return {"first_ms": round(times[0] * 1000, 1), "median_ms": round(statistics.median(times[1:]) * 1000, 1)}
+
+
+def run_startup(executables, launches=DEFAULT_LAUNCHES):
+    """
+    {launcher: {scenario: time_launch result}}: `python main.py` and each
+    executable started for --help, an empty folder and the sample file.
+    Launches run in a scratch folder, so their validator.log lands there.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="startup-") as work:
+        empty = os.path.join(work, "empty")
+        os.mkdir(empty)
+        scenarios = {
+            "--help": ["--help"],
+            "empty folder": [empty],
+            "one file": [SAMPLE_FILE, "--no-cache"],
+        }
+        for name, command in _launchers(executables):
+            results[name] = {
+                scenario: time_launch(command + arguments, launches, work)
+                for scenario, arguments in scenarios.items()
+            }
+    return results
+
+
+def print_startup(results):
+    for name, scenarios in results.items():
+        print(f"\n🚀 {name}")
+        for scenario, entry in scenarios.items():
+            print(f"   {scenario:<16}first {entry['first_ms']:9.1f} ms   median {entry['median_ms']:9.1f} ms")
+
+
+# ========== RESULTS ==========
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "lxml": ".".join(map(str, etree.LXML_VERSION)),
+        "libxml2": ".".join(map(str, etree.LIBXML_VERSION)),
+        "platform": platform.platform(),
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def load_results(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_results(path, results):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"environment": environment(), "cases": results}, f, indent=2)
+
+
+def find_regressions(results, baseline, max_slowdown=DEFAULT_MAX_SLOWDOWN,
+                     max_memory_growth=DEFAULT_MAX_MEMORY_GROWTH):
+    """
+    Messages for every stage whose MB/s dropped by more than max_slowdown or
+    whose peak memory grew by more than max_memory_growth (fractions) against
+    the baseline. Cases whose corpus file changed size are not compared.
+    """
+    regressions = []
+    for case, current in results.items():
+        old = baseline.get(case)
+        if old is None or old["bytes"] != current["bytes"]:
+            continue
+        for stage, now in current["stages"].items():
+            before = old["stages"].get(stage)
+            if before is None:
+                continue
+            if (before["seconds"] >= MIN_COMPARE_SECONDS and now["mb_per_s"] is not None
+                    and now["mb_per_s"] < before["mb_per_s"] * (1 - max_slowdown)):
+                regressions.append(
+                    f"{case} / {stage}: {now['mb_per_s']:.2f} MB/s, was {before['mb_per_s']:.2f} MB/s"
+                )
+            if (before["peak_kb"] is not None and before["peak_kb"] >= MIN_COMPARE_KB
+                    and now["peak_kb"] > before["peak_kb"] * (1 + max_memory_growth)):
+                regressions.append(
+                    f"{case} / {stage}: peak {now['peak_kb']} KB, was {before['peak_kb']} KB"
+                )
+        before_rss, now_rss = old.get("peak_rss_mb"), current.get("peak_rss_mb")
+        if before_rss and now_rss and now_rss > before_rss * (1 + max_memory_growth):
+            regressions.append(f"{case} / validate_file: peak RSS {now_rss} MB, was {before_rss} MB")
+    return regressions
+
+
+def print_case(case, result):
+    print(f"\n📊 {case}: {result['files']} file(s), {result['bytes'] / MB:.2f} MB"
+          + (f", peak RSS {result['peak_rss_mb']} MB" if result["peak_rss_mb"] else ""))
+    for stage, entry in result["stages"].items():
+        speed = f"{entry['mb_per_s']:10.2f} MB/s" if entry["mb_per_s"] is not None else " " * 15
+        peak = f"{entry['peak_kb']:10d} KB" if entry["peak_kb"] is not None else ""
+        print(f"   {stage:<34}{entry['seconds'] * 1000:12.1f} ms{speed}{peak}")
+
+
+def parse_size(text):
+    match = re.fullmatch(r"\s*(\d+)\s*([KMG]?B)\s*", text.upper())
+    if not match:
+        raise argparse.ArgumentTypeError(f"invalid size: {text!r} (e.g. 64KB, 16MB)")
+    return int(match.group(1)) * {"B": 1, "KB": KB, "MB": MB, "GB": 1024 * MB}[match.group(2)]
+
+
+def parse_args(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Validator throughput benchmark")
+    arg_parser.add_argument(
+        "--startup", action="store_true",
+        help="Time launches of python main.py and the frozen builds instead of the throughput"
+    )
+    arg_parser.add_argument(
+        "--exe", action="append", default=[], metavar="PATH",
+        help="With --startup, an executable to time (repeatable; default: the builds found in dist/)"
+    )
+    arg_parser.add_argument(
+        "--launches", type=int, default=DEFAULT_LAUNCHES,
+        help="With --startup, launches per command after the first one (default: %(default)s)"
+    )
+    arg_parser.add_argument(
+        "--corpus", default=DEFAULT_CORPUS_DIR,
+        help=f"Where the generated corpus is kept (default: {DEFAULT_CORPUS_DIR})"
+    )
+    arg_parser.add_argument(
+        "--max-size", type=parse_size, default=parse_size(DEFAULT_MAX_SIZE),
+        help=f"Largest generated file (sizes: {', '.join(SIZES)}; default: {DEFAULT_MAX_SIZE})"
+    )
+    arg_parser.add_argument(
+        "--regenerate", action="store_true",
+        help="Rebuild the corpus even if it is already there"
+    )
+    arg_parser.add_argument(
+        "--only", help="Run only the cases whose name contains this text"
+    )
+    arg_parser.add_argument(
+        "--repeat", type=int, default=3,
+        help="Runs per stage, the fastest counts (default: 3)"
+    )
+    arg_parser.add_argument(
+        "--results", default=DEFAULT_RESULTS_FILE,
+        help=f"Baseline results file (default: {DEFAULT_RESULTS_FILE})"
+    )
+    arg_parser.add_argument(
+        "--save", action="store_true",
+        help="Store this run as the new baseline instead of comparing against it"
+    )
+    arg_parser.add_argument(
+        "--max-slowdown", type=float, default=DEFAULT_MAX_SLOWDOWN,
+        help="Allowed MB/s drop per stage, as a fraction (default: %(default)s)"
+    )
+    arg_parser.add_argument(
+        "--max-memory-growth", type=float, default=DEFAULT_MAX_MEMORY_GROWTH,
+        help="Allowed peak memory growth per stage, as a fraction (default: %(default)s)"
+    )
+    return arg_parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Returns the exit status: 1 if a regression against the baseline was found."""
+    args = parse_args(argv)
+
+    if args.startup:
+        missing = [path for path in args.exe if not os.path.isfile(path)]
+        if missing:
+            print(f"❌ Not found: {', '.join(missing)}")
+            return 1
+        executables = args.exe or [path for path in FROZEN_BUILDS if os.path.isfile(path)]
+        if not executables:
+            print("⚠ No frozen build found in dist/, timing python main.py only")
+        print_startup(run_startup(executables, args.launches))
+        return 0
+
+    print(f"📂 Corpus: {os.path.abspath(args.corpus)}")
+    cases = build_corpus(args.corpus, args.max_size, regenerate=args.regenerate)
+    if args.only:
+        cases = {name: paths for name, paths in cases.items() if args.only in name}
+
+    results = {}
+    for case, paths in cases.items():
+        results[case] = run_case(paths, args.repeat)
+        print_case(case, results[case])
+
+    baseline = load_results(args.results)
+    if args.save or baseline is None:
+        # Keep the cases of the baseline that were not run this time
+        merged = dict(baseline["cases"]) if baseline is not None else {}
+        merged.update(results)
+        save_results(args.results, merged)
+        print(f"\n💾 Baseline saved to {args.results}")
+        return 0
+
+    regressions = find_regressions(results, baseline["cases"], args.max_slowdown,
+                                   args.max_memory_growth)
+    if regressions:
+        print(f"\n❌ {len(regressions)} REGRESSION(S) against {args.results}:")
+        for message in regressions:
+            print(f"   {message}")
+        return 1
+    print(f"\n✅ No regressions against {args.results}")
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
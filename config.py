@@ -135,4 +135,11 @@ INVALID_NESTING_RULES = {
     "EMB": {"EM", "EMB", "EMS", "EMU"},
     "EMS": {"EM", "EMB", "EMS", "EMU"},
     "EMU": {"EM", "EMB", "EMS", "EMU"},
-}
\ No newline at end of file
+}
+
+# Layout markers the cleaner turns into empty elements (<P20 ...> -> <P20 .../>);
+# besides these, every tag of the layout grammar (see ruleset.layout_tag_names) is a valid tag
+LAYOUT_TAGS = {
+    "P20", "CN", "HN02", "HN24", "P00", "B22", "HN68", "P02", "B24", "HN46",
+    "B42", "P24", "P42", "B44", "B", "C5", "HN00", "HN20"
+}
@@ -0,0 +1,88 @@
+import os
+import logging
+from fnmatch import fnmatch
+
+logger = logging.getLogger(__name__)
+
+# Files the validator itself writes next to the ones it checks
+DEFAULT_EXCLUDE = ("validator.log", "validator_cache.sqlite*", "validator_profile.json", "*.pstats")
+
+# Bytes read from the start of a file to tell whether it is text
+SNIFF_BYTES = 4096
+
+# Starts of binary formats found in the archive (executables, PyInstaller
+# output, archives, images, databases); anything with a NUL byte is binary too
+BINARY_MAGIC = (
+    b"\x7fELF", b"MZ\x90\x00", b"PK\x03\x04", b"%PDF", b"\x89PNG", b"GIF8", b"\xff\xd8\xff",
+    b"\x1f\x8b\x08", b"BZh", b"\xfd7zXZ", b"SQLite format 3\x00", b"\xca\xfe\xba\xbe",
+    b"\xcf\xfa\xed\xfe", b"\xd0\xcf\x11\xe0",
+)
+
+
+def is_binary(file_path):
+    """Whether a file looks binary from its first SNIFF_BYTES bytes."""
+    try:
+        with open(file_path, "rb") as f:
+            head = f.read(SNIFF_BYTES)
+    except OSError:
+        # Left to the validator, which reports why it cannot be read
+        return False
+    return head.startswith(BINARY_MAGIC) or b"\x00" in head
+
+
+def _matches(rel_path, name, patterns):
+    # Patterns with a '/' match the path from the root, the others the name alone
+    return any(fnmatch(rel_path if "/" in pattern else name, pattern) for pattern in patterns)
+
+
+def _extension_suffixes(extensions):
+    """'fnt', '.fnt' and '*.fnt' all mean files ending in .fnt (any case)."""
+    return tuple("." + ext.lower().lstrip("*").lstrip(".") for ext in extensions)
+
+
+def discover_files(root, recursive=True, include=(), exclude=DEFAULT_EXCLUDE, extensions=(),
+                   skip_binary=True):
+    """
+    Yields the files to validate under `root` as paths relative to it, while
+    the walk goes on (os.scandir, a directory at a time), so validation can
+    start on the first files of a large tree right away.
+      include:     globs a file must match (any of them), none = every file
+      exclude:     globs of files and directories left out
+      extensions:  file extensions kept (fnt, .sgm...), none = any
+      skip_binary: leave out files whose first bytes look binary (is_binary)
+    A glob with a '/' is matched against the path relative to root, written
+    with '/', any other against the name alone. Directory symlinks are not
+    followed, so the walk cannot loop.
+    """
+    suffixes = _extension_suffixes(extensions)
+    pending = [""]
+    while pending:
+        rel_dir = pending.pop()
+        subdirs = []
+        try:
+            with os.scandir(os.path.join(root, rel_dir)) as entries:
+                for entry in entries:
+                    rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                    if exclude and _matches(rel_path, entry.name, exclude):
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if recursive:
+                                subdirs.append(rel_path)
+                            continue
+                        if not entry.is_file():
+                            continue
+                    except OSError:
+                        continue
+                    if suffixes and not entry.name.lower().endswith(suffixes):
+                        continue
+                    if include and not _matches(rel_path, entry.name, include):
+                        continue
+                    if skip_binary and is_binary(entry.path):
+                        logger.info(f"Skipped binary file: {entry.path}")
+                        continue
+                    yield rel_path if os.sep == "/" else rel_path.replace("/", os.sep)
+        except OSError as e:
+            logger.warning(f"Cannot list {os.path.join(root, rel_dir)}: {e}")
+        # Depth first, subdirectories in listing order
+        pending.extend(reversed(subdirs))
@@ -1,11 +1,60 @@
 import re
 from config import CUSTOM_ENTITIES, SUPPORTED_TAGS
+from lexer import Consumer, TAG, ENTITY, is_strict_tag, scan
+from line_index import LineIndex
 
 DEFAULT_ENTITIES = {
     'amp', 'lt', 'gt', 'quot', 'apos',
     'mdash', 'sect', 'nbsp', 'copy'  # Add more as needed
 }
 
+EMB_TAG_PATTERN = re.compile(r'<(EMB[^>]*)>(.*?)<\/\1>', re.IGNORECASE | re.DOTALL)
+SPACE_PATTERN = re.compile(r'\s{2,}')
+
+class EntityConsumer(Consumer):
+    """
+    Flags invalid named entities (ignores unescaped chars and numeric entities).
+    Entities inside a tag (like an attribute) are skipped.
+    """
+
+    def __init__(self, allowed_entities):
+        super().__init__()
+        self.allowed_entities = allowed_entities
+        # Last tag span seen on the current line
+        self._span_line = 0
+        self._span_start = 0
+        self._span_end = 0
+
+    def handlers(self):
+        return {
+            TAG: self.on_tag,
+            ENTITY: self.on_entity,
+        }
+
+    def on_tag(self, tok):
+        if is_strict_tag(tok) and self.take(tok):
+            self._span_line = tok.line
+            self._span_start = tok.pos
+            self._span_end = tok.end
+
+    def on_entity(self, tok):
+        entity = tok.name
+        # Only validate named entities (ignore numeric entities)
+        if entity.startswith('#') or entity in self.allowed_entities:
+            return
+        inside_tag = (
+            tok.line == self._span_line and
+            self._span_start <= tok.pos <= self._span_end
+        )
+        if not inside_tag:
+            self.errors.append(("Repent", tok.line, tok.pos + 1,
+                                f"Invalid entity '&{entity};'"))
+
+    def resume(self, state):
+        super().resume(state)
+        self._span_line = 0
+
+
 def check_entities(file_content, custom_entities=None):
     """
     Entity checker that focuses ONLY on invalid entities (ignores unescaped chars)
@@ -13,90 +62,129 @@ def check_entities(file_content, custom_entities=None):
     - Invalid named entities
     - Does NOT check for unescaped <, >, or & characters
     """
-    errors = []
-    lines = file_content.splitlines()
     allowed_entities = DEFAULT_ENTITIES.union(custom_entities or set())
-    
-    # Pattern to match XML/SGML tags
-    tag_pattern = re.compile(r'<\/?[a-zA-Z][a-zA-Z0-9]*(\s+[^>]*)?>')
-    # Pattern to match both named and numeric entities
-    entity_pattern = re.compile(r'&(#[0-9]+|#x[0-9a-fA-F]+|[a-zA-Z0-9]+);')
-
-    for line_num, line in enumerate(lines, 1):
-        # First find all valid tags in the line
-        tag_positions = []
-        for match in tag_pattern.finditer(line):
-            tag_positions.append((match.start(), match.end()))
-        
-        # Check for invalid named entities only
-        for match in entity_pattern.finditer(line):
-            entity = match.group(1)
-            # Only validate named entities (ignore numeric entities)
-            if not entity.startswith('#') and entity not in allowed_entities:
-                # Check if this is inside a tag (like an attribute)
-                inside_tag = any(start <= match.start() <= end for start, end in tag_positions)
-                if not inside_tag:
-                    col = match.start() + 1
-                    errors.append(("Repent", line_num, col, 
-                                 f"Invalid entity '&{entity};'"))
-    errors.extend(check_table_spacing(file_content))   
-    
-    return errors         
-def check_table_spacing(file_content):
+    entity_consumer = EntityConsumer(allowed_entities)
+    table_consumer = TableSpacingConsumer()
+    scan(file_content, [entity_consumer, table_consumer])
+    return entity_consumer.errors + table_consumer.errors
+
+
+class TableSpacingConsumer(Consumer):
     """
     Flags 2+ continuous spaces inside <EMB>...</EMB> tags within <T> or <A> table blocks.
     Groups all excessive spacing per line per tag to reduce clutter.
     """
-    errors = []
-    lines = file_content.splitlines()
-    in_table = False
-    processed_lines = set()
-
-    # ✅ Fix here: match both <T> and <A> tags
-    table_tag_pattern = re.compile(r'<\s*/?(T|A)\s*>', re.IGNORECASE)
-    emb_tag_pattern = re.compile(r'<(EMB[^>]*)>(.*?)<\/\1>', re.IGNORECASE | re.DOTALL)
-    space_pattern = re.compile(r'\s{2,}')
-
-    current_table_lines = []
-    current_line_num = 0
-
-    for line_num, line in enumerate(lines, 1):
-        if table_tag_pattern.search(line):
-            if re.search(r'</\s*(T|A)\s*>', line, re.IGNORECASE):
-                # We reached end of a table
-                table_content = '\n'.join(current_table_lines)
-                for tag_match in emb_tag_pattern.finditer(table_content):
-                    tag_content = tag_match.group(2)
-                    if space_pattern.search(tag_content):
-                        abs_pos = tag_match.start(2)
-                        pos_counter = 0
-                        line_offset = 0
-                        for i, table_line in enumerate(current_table_lines):
-                            if pos_counter + len(table_line) >= abs_pos:
-                                line_offset = i
-                                break
-                            pos_counter += len(table_line) + 1  # newline
-
-                        error_line_num = current_line_num + line_offset
-                        if error_line_num not in processed_lines:
-                            processed_lines.add(error_line_num)
-                            errors.append((
-                                "Reptab",
-                                error_line_num,
-                                1,
-                                f"Excessive spacing inside <{tag_match.group(1)}> tag"
-                            ))
-
-                in_table = False
-                current_table_lines = []
-            elif re.search(r'<\s*(T|A)\s*>', line, re.IGNORECASE):
-                in_table = True
-                current_line_num = line_num
-                current_table_lines = [line]
-            continue
-
-        if in_table:
-            current_table_lines.append(line)
-
-    return errors
 
+    def __init__(self):
+        super().__init__()
+        self.in_table = False
+        self.processed_lines = set()
+        self.table_start = 0
+        self.skipped_lines = set()
+        # Table tags seen on the line currently being read
+        self._pending_line = 0
+        self._has_table_tag = False
+        self._has_close = False
+        self._has_open = False
+
+    def handlers(self):
+        return {TAG: self.on_tag}
+
+    def on_tag(self, tok):
+        name = tok.name
+        if name not in ('T', 'A', 't', 'a') or (tok.rest and not tok.rest.isspace()):
+            return
+        if tok.line != self._pending_line:
+            self._end_line()
+            self._pending_line = tok.line
+        # <\s*/?(T|A)\s*>, </\s*(T|A)\s*> and <\s*(T|A)\s*>
+        if not tok.mid:
+            self._has_table_tag = True
+        if tok.closing and not tok.lead:
+            self._has_close = True
+        if not tok.closing:
+            self._has_open = True
+
+    def _end_line(self):
+        line_num = self._pending_line
+        has_table_tag, has_close, has_open = self._has_table_tag, self._has_close, self._has_open
+        self._has_table_tag = self._has_close = self._has_open = False
+        if not has_table_tag:
+            return
+
+        if has_close:
+            # We reached end of a table
+            if self.in_table:
+                table_lines = [
+                    self.lines[i - 1]
+                    for i in range(self.table_start, line_num)
+                    if i not in self.skipped_lines
+                ]
+                self.errors.extend(self._spacing_errors(table_lines, self.table_start))
+            self.in_table = False
+        elif has_open:
+            self.in_table = True
+            self.table_start = line_num
+            self.skipped_lines = set()
+        else:
+            # Table-tag lines are never part of the table body
+            self.skipped_lines.add(line_num)
+
+    def _spacing_errors(self, current_table_lines, current_line_num):
+        errors = []
+        table_content = '\n'.join(current_table_lines)
+        table_index = None
+        for tag_match in EMB_TAG_PATTERN.finditer(table_content):
+            tag_content = tag_match.group(2)
+            if SPACE_PATTERN.search(tag_content):
+                if table_index is None:
+                    table_index = LineIndex(table_content)
+                error_line_num = current_line_num + table_index.line_of(tag_match.start(2)) - 1
+                if error_line_num not in self.processed_lines:
+                    self.processed_lines.add(error_line_num)
+                    errors.append((
+                        "Reptab",
+                        error_line_num,
+                        1,
+                        f"Excessive spacing inside <{tag_match.group(1)}> tag"
+                    ))
+        return errors
+
+    def finish(self):
+        self._end_line()
+
+    def checkpoint(self):
+        self._end_line()
+        if not self.in_table:
+            return (False,)
+        # The table body is re-read when the table closes, so it is part of the state
+        body = tuple(self.lines[self.table_start - 1:])
+        return (True, self.table_start, frozenset(self.skipped_lines), body)
+
+    def resume(self, state):
+        super().resume(state)
+        self.in_table = state[0]
+        if self.in_table:
+            self.table_start = state[1]
+            self.skipped_lines = set(state[2])
+        # Tables never overlap, lines of earlier ones are never looked up again
+        self.processed_lines = set()
+        self._pending_line = 0
+        self._has_table_tag = self._has_close = self._has_open = False
+
+    def moved(self, state, first_line, delta):
+        if not state[0]:
+            return state
+        _, table_start, skipped_lines, body = state
+        move = lambda line: line + delta if line >= first_line else line
+        return (True, move(table_start), frozenset(move(line) for line in skipped_lines), body)
+
+
+def check_table_spacing(file_content):
+    """
+    Flags 2+ continuous spaces inside <EMB>...</EMB> tags within <T> or <A> table blocks.
+    Groups all excessive spacing per line per tag to reduce clutter.
+    """
+    consumer = TableSpacingConsumer()
+    scan(file_content, [consumer])
+    return consumer.errors
@@ -0,0 +1,140 @@
+from array import array
+from contextlib import contextmanager
+
+# Line an error's context is read from when it is rendered
+SOURCE_LINE = 0    # as checked: after <root> removal
+CLEANED_LINE = 1   # as parsed: after <SPage> removal and the cleaner too
+
+# ErrorList.kept_open() entered, file not read yet
+_NOT_READ = object()
+
+
+class ErrorList:
+    """
+    validate_file errors of one file, stored as parallel arrays: category,
+    page and message are ids into one table of the file's distinct strings,
+    so a message repeated through a whole volume is kept once, and no context
+    line is kept at all.
+    Iterating gives the usual (category, line, page, message, context) tuples;
+    the contexts are read from the file only then, by
+    read_lines(file_path) -> (source lines, cleaned lines) (each with a
+    context(line) method), in line order and once per iteration; inside
+    kept_open() only once for every iteration, e.g. by several reports.
+    len(), truth and slicing (an ErrorList again) work like a list's.
+    """
+
+    __slots__ = ("file_path", "read_lines", "strings", "categories", "lines", "pages",
+                 "messages", "kinds", "_ids", "_kept")
+
+    def __init__(self, file_path, read_lines):
+        self.file_path = file_path
+        self.read_lines = read_lines
+        self.strings = []
+        self.categories = array("I")
+        self.lines = array("q")
+        self.pages = array("I")
+        self.messages = array("I")
+        self.kinds = array("B")
+        self._ids = None
+        # [read_lines() result] inside kept_open(), shared with the slices taken meanwhile
+        self._kept = []
+
+    def _id(self, string):
+        ids = self._ids
+        if ids is None:
+            ids = self._ids = {s: i for i, s in enumerate(self.strings)}
+        string_id = ids.get(string)
+        if string_id is None:
+            string_id = ids[string] = len(self.strings)
+            self.strings.append(string)
+        return string_id
+
+    def append(self, category, line, page, message, kind=SOURCE_LINE):
+        self.categories.append(self._id(category))
+        self.lines.append(line)
+        self.pages.append(self._id(page))
+        self.messages.append(self._id(message))
+        self.kinds.append(kind)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def records(self):
+        """(category, line, page, message) of every error, no context read."""
+        strings = self.strings
+        for category, line, page, message in zip(self.categories, self.lines, self.pages, self.messages):
+            yield strings[category], line, strings[page], strings[message]
+
+    @contextmanager
+    def kept_open(self):
+        """Within the with block the file is read once, for every iteration and slice."""
+        self._kept[:] = [_NOT_READ]
+        try:
+            yield self
+        finally:
+            self._kept.clear()
+
+    def _sources(self):
+        """read_lines(file_path), or None if the file is gone since it was checked."""
+        kept = self._kept
+        if kept and kept[0] is not _NOT_READ:
+            return kept[0]
+        try:
+            sources = self.read_lines(self.file_path)
+        except OSError:
+            sources = None
+        if kept:
+            kept[0] = sources
+        return sources
+
+    def _contexts(self):
+        """{(kind, line): context} of every error, read from the file in line order."""
+        wanted = sorted(set(zip(self.lines, self.kinds)))
+        sources = self._sources()
+        if sources is None:
+            return {(kind, line): "N/A" for line, kind in wanted}
+        return {(kind, line): sources[kind].context(line) for line, kind in wanted}
+
+    def __iter__(self):
+        if not self:
+            return
+        contexts = self._contexts()
+        for (category, line, page, message), kind in zip(self.records(), self.kinds):
+            yield category, line, page, message, contexts[kind, line]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            part = ErrorList(self.file_path, self.read_lines)
+            part.strings = self.strings
+            part._kept = self._kept
+            for name in ("categories", "lines", "pages", "messages", "kinds"):
+                setattr(part, name, getattr(self, name)[i])
+            return part
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("error index out of range")
+        # Reads the file for this one context (unless kept_open); iterate to render many
+        return next(iter(self[i:i + 1]))
+
+    def take(self, indexes):
+        """ErrorList of the errors at these positions, e.g. the ones a report prints."""
+        part = self[:0]
+        for name in ("categories", "lines", "pages", "messages", "kinds"):
+            values = getattr(self, name)
+            getattr(part, name).extend(values[i] for i in indexes)
+        return part
+
+    def rows(self):
+        """[category, line, page, message, kind] lists, for storage (see from_rows)."""
+        return [[*record, kind] for record, kind in zip(self.records(), self.kinds)]
+
+    @classmethod
+    def from_rows(cls, file_path, read_lines, rows):
+        errors = cls(file_path, read_lines)
+        for category, line, page, message, kind in rows:
+            errors.append(category, line, page, message, kind)
+        return errors
+
+    def __repr__(self):
+        return f"<ErrorList {self.file_path!r}: {len(self)} errors>"
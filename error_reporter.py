@@ -44,7 +44,7 @@ def run_all_checks(file_path, custom_entities=None, required_tags=None) -> Dict[
     cleaned_content = preprocess_file_content(raw_content)
 
     # Step 3: Parse cleaned XML
-    tree, parse_errors, _ = parse_xml(raw_content)
+    tree, parse_errors, _ = parse_xml(cleaned_content, preprocessed=True)
     
     for error in parse_errors:
         if len(error) == 5:  # (category, line, col, msg, context)
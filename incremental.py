@@ -0,0 +1,332 @@
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+from lexer import scan_lines
+from parser import parse_xml, preprocess_file_content
+from entity_checker import EntityConsumer, TableSpacingConsumer
+from tag_checker import validate_tags, NestingConsumer, CrossPageConsumer
+from validator import (
+    AngleTagConsumer, BlankLineConsumer, PageTracker,
+    ROOT_TAG_PATTERN, SPAGE_TAG_PATTERN, dedupe_errors,
+)
+from ruleset import active_ruleset
+
+# Lines where PageTracker starts a new page: <Page N> or <P20>N</P20>
+PAGE_LINE_PATTERN = re.compile(r'<[Pp][Aa][Gg][Ee]\s+\d+\s*>|<P20>\d+</P20>')
+
+# Per-page error groups, in the order validate_file reports them
+ANGLE, PARSE, ENTITY, TABLE, NESTING, CROSS, TAGS = range(7)
+
+# One checked page. Line numbers are those of the run that produced it.
+#   raw_lines:  buffer lines, as given
+#   pre_lines:  after <root> removal (used for error context)
+#   lines:      after <SPage> removal too (what the checks read)
+#   start:      line number of lines[0]
+#   entry/exit: checkpoint() of every consumer before/after the page
+#   errors:     one list per group above (TAGS is None if the page did not parse)
+#   pages:      (line, page) changes seen by PageTracker
+PageSegment = namedtuple("PageSegment", "raw_lines pre_lines lines start entry exit errors pages")
+
+
+class PageResult:
+    """
+    What validate_pages returns: `errors` is the deduplicated error list,
+    `segments` lets the next call skip the pages that did not change.
+    `revalidated` is the number of pages actually checked by this call.
+    """
+
+    def __init__(self, segments, errors, revalidated):
+        self.segments = segments
+        self.errors = errors
+        self.revalidated = revalidated
+
+
+def _make_consumers():
+    # Same checks, same order as validate_file
+    rules = active_ruleset()
+    return [
+        PageTracker(),
+        BlankLineConsumer(),
+        AngleTagConsumer(rules.supported_tags, rules.layout_tags),
+        EntityConsumer(rules.allowed_entities),
+        TableSpacingConsumer(),
+        NestingConsumer(),
+        CrossPageConsumer(),
+    ]
+
+
+@lru_cache(maxsize=None)
+def _movers():
+    """Consumers only used for Consumer.moved(), made on first use (not when imported)."""
+    return _make_consumers()
+
+
+class _MovedState:
+    """
+    Page state renumbered by Consumer.moved(), worked out only when it is needed.
+    Reused pages that follow each other share these objects, so most of them are
+    never renumbered at all.
+    """
+
+    def __init__(self, state, first_line, delta):
+        self.state = state
+        self.first_line = first_line
+        self.delta = delta
+        self._value = None
+
+    def value(self):
+        if self._value is None:
+            # Renumbered again by every later call; unwind without recursion
+            chain = []
+            state = self
+            while isinstance(state, _MovedState) and state._value is None:
+                chain.append(state)
+                state = state.state
+            if isinstance(state, _MovedState):
+                state = state._value
+            for moved in reversed(chain):
+                state = tuple(
+                    mover.moved(consumer_state, moved.first_line, moved.delta)
+                    for mover, consumer_state in zip(_movers(), state)
+                )
+                moved._value = state
+                moved.state = None
+        return self._value
+
+
+def _value(state):
+    return state.value() if isinstance(state, _MovedState) else state
+
+
+def _plan(raw_lines, old_segments):
+    """
+    Lines up the buffer with the previous pages: the unchanged run of pages at the
+    start and at the end is reused, everything between is split at page markers.
+    Returns ([(old_segment or None, raw_start, raw_stop)] in buffer order, first_moved):
+    first_moved is the old number of the first line of the unchanged end, from
+    which on old line numbers move by the same amount.
+    """
+    n = len(raw_lines)
+
+    head, pos = 0, 0
+    while head < len(old_segments):
+        seg = old_segments[head]
+        end = pos + len(seg.raw_lines)
+        if end > n or raw_lines[pos:end] != seg.raw_lines:
+            break
+        # The page must also end where it used to
+        if end < n and not PAGE_LINE_PATTERN.search(raw_lines[end]):
+            break
+        head, pos = head + 1, end
+
+    tail, stop = len(old_segments), n
+    while tail > head:
+        seg = old_segments[tail - 1]
+        begin = stop - len(seg.raw_lines)
+        if begin < pos or raw_lines[begin:stop] != seg.raw_lines:
+            break
+        if begin > 0 and not PAGE_LINE_PATTERN.search(raw_lines[begin]):
+            break
+        tail, stop = tail - 1, begin
+
+    plan = [(seg, None, None) for seg in old_segments[:head]]
+    starts = [pos] + [i for i in range(pos + 1, stop) if PAGE_LINE_PATTERN.search(raw_lines[i])]
+    if pos < stop:
+        plan.extend((None, a, b) for a, b in zip(starts, starts[1:] + [stop]))
+    plan.extend((seg, None, None) for seg in old_segments[tail:])
+
+    # The unchanged end usually reaches back into the edited page
+    old_middle = [line for seg in old_segments[head:tail] for line in seg.raw_lines]
+    common = 0
+    limit = min(len(old_middle), stop - pos)
+    while common < limit and old_middle[-1 - common] == raw_lines[stop - 1 - common]:
+        common += 1
+
+    first_moved = None
+    raw_index = pos + len(old_middle) - common
+    raw_start = 0
+    for seg in old_segments:
+        raw_stop = raw_start + len(seg.raw_lines)
+        if raw_index < raw_stop:
+            first_moved = seg.start + min(raw_index - raw_start, len(seg.lines))
+            break
+        raw_start = raw_stop
+    return plan, first_moved
+
+
+def _shift(seg, first_line, delta, moved_states):
+    """
+    Renumbers a reused page: every line from first_line on (this page, the
+    unchanged end of the edited page and the pages in between) moves by delta.
+    moved_states hands neighbouring pages the same renumbered state object.
+    """
+    if not delta:
+        return seg
+
+    def move(error):
+        line = error[1]
+        if line >= first_line:
+            return (error[0], line + delta) + error[2:]
+        return error
+
+    def move_state(state):
+        moved = moved_states.get(id(state))
+        if moved is None:
+            moved = moved_states[id(state)] = _MovedState(state, first_line, delta)
+        return moved
+
+    return seg._replace(
+        start=seg.start + delta,
+        entry=move_state(seg.entry),
+        exit=move_state(seg.exit),
+        errors=tuple(
+            group if group is None else [move(error) for error in group]
+            for group in seg.errors
+        ),
+        pages=tuple((line + delta, page) for line, page in seg.pages),
+    )
+
+
+def _check_segment(consumers, raw_lines, lines, pre_lines, entry):
+    """Runs every check on one page, resuming the consumers from `entry`."""
+    start = len(lines) + 1
+
+    text = "\n".join(raw_lines) + "\n"
+    seg_pre = raw_lines
+    if ROOT_TAG_PATTERN.search(text):
+        text = ROOT_TAG_PATTERN.sub("", text)
+        seg_pre = text.splitlines()
+    seg_lines = seg_pre
+    if SPAGE_TAG_PATTERN.search(text):
+        seg_lines = SPAGE_TAG_PATTERN.sub("", text).splitlines()
+
+    lines.extend(seg_lines)
+    pre_lines.extend(seg_pre)
+
+    for consumer, state in zip(consumers, _value(entry)):
+        consumer.resume(state)
+    scan_lines(lines, consumers, start - 1, len(lines))
+    exit_state = tuple(consumer.checkpoint() for consumer in consumers)
+    tracker, _, angle_check, entity_check, table_check, nesting_check, cross_page_check = consumers
+
+    # 🔍 XML is parsed one page at a time; tags open across pages are left to
+    # the cross-page check (mismatches against the <root> wrapper are not reported)
+    offset = start - 1
+    cleaned_content = preprocess_file_content("\n".join(seg_lines))
+    tree, parse_errors, _ = parse_xml(cleaned_content, preprocessed=True, wrap=True)
+    parse_errors = [
+        (cat, line + offset if line else line, col, msg, context)
+        for cat, line, col, msg, context in parse_errors
+    ]
+    tag_errors = None
+    if tree is not None:
+        rules = active_ruleset()
+        tag_errors = [
+            (cat, line + offset, col, msg)
+            for cat, line, col, msg in validate_tags(tree, rules.allowed_tags, rules.non_closing_tags)
+        ]
+
+    errors = (
+        angle_check.errors, parse_errors, entity_check.errors, table_check.errors,
+        nesting_check.errors, cross_page_check.errors, tag_errors,
+    )
+    pages = tuple(zip(tracker.page_lines[1:], tracker.pages[1:]))
+    return PageSegment(raw_lines, seg_pre, seg_lines, start, entry, exit_state, errors, pages)
+
+
+def validate_pages(content, previous=None):
+    """
+    Validates a buffer page by page; pages start at <Page N> / <P20>N</P20> lines.
+    Pass the PageResult of an earlier call to re-check only the pages whose text
+    changed. The state carried from page to page (open-tag stacks of the nesting
+    and cross-page checks, an open table) is compared as well, so a page after
+    the edit is checked again only if what flows into it changed.
+    Unlike validate_file, XML is parsed per page: a tag left open across pages
+    is reported by the cross-page and nesting checks, not by the parser. Like
+    validate_file, validate_tags results only count if every page parsed.
+    Returns: PageResult
+    """
+    raw_lines = content.splitlines()
+    old_segments = previous.segments if previous is not None else []
+
+    consumers = _make_consumers()
+    lines, pre_lines = [], []
+    for consumer in consumers:
+        consumer.start(lines)
+    state = tuple(consumer.checkpoint() for consumer in consumers)
+
+    plan, first_moved = _plan(raw_lines, old_segments)
+    moved_states = {}
+    segments = []
+    revalidated = 0
+    # After a state mismatch the next pages usually differ as well (an unclosed
+    # tag stays on the stacks): compare again after 1, 2, 4... pages only
+    skip, backoff = 0, 1
+    for old_seg, raw_start, raw_stop in plan:
+        start = len(lines) + 1
+        seg = None
+        if old_seg is not None and skip:
+            skip -= 1
+        elif old_seg is not None:
+            # Pages after the edit all move by the same amount
+            seg = _shift(old_seg, first_moved, start - old_seg.start, moved_states)
+            # Same object: the previous page was reused too, nothing to compare
+            if seg.entry is not state and _value(seg.entry) != _value(state):
+                seg = None
+                skip, backoff = backoff, backoff * 2
+            else:
+                backoff = 1
+        if seg is not None:
+            lines.extend(seg.lines)
+            pre_lines.extend(seg.pre_lines)
+        else:
+            seg_raw = old_seg.raw_lines if old_seg is not None else raw_lines[raw_start:raw_stop]
+            seg = _check_segment(consumers, seg_raw, lines, pre_lines, state)
+            revalidated += 1
+        segments.append(seg)
+        state = seg.exit
+
+    # 🔍 End-of-document checks run on the final state
+    _, blank_check, _, _, _, nesting_check, _ = consumers
+    state = _value(state)
+    blank_check.raw_lines = pre_lines
+    blank_check.resume(state[1])
+    blank_check.finish()
+    nesting_check.resume(state[5])
+    nesting_check.finish()
+
+    page_tracker = PageTracker()
+    page_tracker.start(lines)
+    for seg in segments:
+        for line, page in seg.pages:
+            page_tracker.page_lines.append(line)
+            page_tracker.pages.append(page)
+    page_of = page_tracker.page_of
+
+    def add_errors(errors):
+        for cat, line, col, msg in errors:
+            page = page_of(line)
+            context = pre_lines[line - 1].strip() if 0 < line <= len(pre_lines) else "N/A"
+            categorized_errors.append((cat, line, page, msg, context))
+
+    def group(index):
+        for seg in segments:
+            yield from seg.errors[index]
+
+    categorized_errors = []
+    add_errors(blank_check.errors)
+    add_errors(group(ANGLE))
+    for cat, line, col, msg, context in group(PARSE):
+        categorized_errors.append((cat, line, page_of(line), msg, context))
+    add_errors(group(ENTITY))
+    add_errors(group(TABLE))
+    add_errors(group(NESTING))
+    add_errors(nesting_check.errors)
+    add_errors(group(CROSS))
+
+    # 🔍 Tag structure (only if parsing succeeded)
+    if all(seg.errors[TAGS] is not None for seg in segments):
+        add_errors(group(TAGS))
+
+    return PageResult(segments, dedupe_errors(categorized_errors), revalidated)
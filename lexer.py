@@ -0,0 +1,209 @@
+import re
+from collections import namedtuple
+
+# ========== TOKEN KINDS ==========
+TAG = "tag"            # <EM>, </EM>, <P24/>, < foo bar>
+ENTITY = "entity"      # &para; &#123; &#x1F600;
+PAGE = "page"          # <Page N> or <P20>N</P20> page marker
+SECTION = "section"    # [XX] bracket section
+BLANK = "blank"        # whitespace-only line
+
+# One token per event.
+#   TAG:       name, closing ('/' present), lead/mid (whitespace after '<' and
+#              after '/'), rest (text between the name and '>')
+#   ENTITY:    name is the entity body ('para', '#123')
+#   PAGE:      name is the page number, rest is the marker ('Page' or 'P20'),
+#              lead is True when the marker had whitespace after '<'
+#   SECTION:   name is the section label
+#   BLANK:     only line is meaningful
+Token = namedtuple("Token", "kind line pos end name closing lead mid rest")
+
+# A tag candidate is reported at EVERY '<' (zero-width lookahead), so each
+# consumer can replay the non-overlapping matching of its own pattern.
+# The tag's rest up to '>' is found by tokenize(): scanning for it in the
+# lookahead made lines with many '<' and no '>' quadratic.
+TOKEN_PATTERN = re.compile(
+    r'<(?=(\s*)(/?)(\s*)([A-Za-z0-9_]+))'
+    r'|&(#[0-9]+|#x[0-9a-fA-F]+|[a-zA-Z0-9]+);'
+    r'|\[([A-Za-z0-9]+)\]'
+)
+PAGE_ARGS_PATTERN = re.compile(r'\s+(\d+)\s*')
+P20_PAGE_PATTERN = re.compile(r'<P20>(\d+)</P20>')
+
+
+def is_strict_tag(tok):
+    """
+    True if the tag also matches the strict pattern
+    <\\/?[A-Za-z][A-Za-z0-9]*(\\s[^>]*)?> used by the entity and
+    cross-page checkers (no inner whitespace, name starts with a letter).
+    """
+    return (
+        not tok.lead and not tok.mid and
+        tok.name[0].isalpha() and "_" not in tok.name and
+        (not tok.rest or tok.rest[0].isspace())
+    )
+
+
+def tokenize(lines, start=0, stop=None):
+    """
+    Walks the document once and yields Tokens in line order.
+    Within a line tokens come in position order, except that PAGE
+    markers are emitted first so consumers see the page a line belongs to
+    before any of its tags.
+    With start/stop only lines[start:stop] are read (line numbers stay absolute).
+    """
+    finditer = TOKEN_PATTERN.finditer
+    if start or stop is not None:
+        lines = lines[start:stop]
+    for line_num, line in enumerate(lines, start + 1):
+        if not line or line.isspace():
+            yield Token(BLANK, line_num, 0, 0, None, False, False, False, "")
+            continue
+
+        pages = None
+        tokens = []
+        # Next '>' at or after the current '<'; len(line) once there is none left
+        gt = -1
+        for match in finditer(line):
+            name = match.group(4)
+            if name is not None:
+                pos = match.start()
+                if gt < pos:
+                    gt = line.find(">", pos)
+                    if gt < 0:
+                        gt = len(line)
+                if gt == len(line):
+                    continue
+                lead, slash, mid = match.group(1, 2, 3)
+                rest = line[match.end(4):gt]
+                end = gt + 1
+                closing = slash == "/"
+                tokens.append(Token(TAG, line_num, pos, end, name, closing, bool(lead), bool(mid), rest))
+
+                if closing:
+                    continue
+                if name.lower() == "page":
+                    page_match = PAGE_ARGS_PATTERN.fullmatch(rest)
+                    if page_match:
+                        if pages is None:
+                            pages = []
+                        pages.append(Token(PAGE, line_num, pos, end, page_match.group(1),
+                                           False, bool(lead), False, "Page"))
+                elif name == "P20" and not lead and not rest:
+                    p20_match = P20_PAGE_PATTERN.match(line, pos)
+                    if p20_match:
+                        if pages is None:
+                            pages = []
+                        pages.append(Token(PAGE, line_num, pos, p20_match.end(), p20_match.group(1),
+                                           False, False, False, "P20"))
+            elif match.group(5) is not None:
+                tokens.append(Token(ENTITY, line_num, match.start(), match.end(),
+                                    match.group(5), False, False, False, ""))
+            else:
+                tokens.append(Token(SECTION, line_num, match.start(), match.end(),
+                                    match.group(6), False, False, False, ""))
+
+        if pages:
+            yield from pages
+        yield from tokens
+
+
+class Consumer:
+    """
+    Base class for checkers fed from the shared token stream.
+    Subclasses map token kinds to handlers in `handlers()` and collect
+    (category, line, col, message) tuples in `self.errors`.
+    """
+
+    def __init__(self):
+        self.errors = []
+        self.lines = []
+        self._line = 0
+        self._last_end = 0
+
+    def start(self, lines):
+        self.lines = lines
+
+    def take(self, tok):
+        """
+        Replays re.finditer's non-overlapping rule for this consumer's own
+        pattern: a match is skipped if it starts inside the previous one.
+        """
+        if tok.line != self._line:
+            self._line = tok.line
+            self._last_end = 0
+        if tok.pos < self._last_end:
+            return False
+        self._last_end = tok.end
+        return True
+
+    def handlers(self):
+        return {}
+
+    def finish(self):
+        pass
+
+    def checkpoint(self):
+        """
+        State this consumer carries from one line to the next, taken between
+        two lines. Together with resume() it lets a scan continue part-way
+        through a document (see incremental.py).
+        """
+        return None
+
+    def resume(self, state):
+        """Restores a checkpoint() state; errors found so far are dropped."""
+        self.errors = []
+        self._line = 0
+        self._last_end = 0
+
+    def moved(self, state, first_line, delta):
+        """checkpoint() state with line numbers from first_line on moved by delta."""
+        return state
+
+
+def scan_lines(lines, consumers, start=0, stop=None):
+    """
+    Feeds the tokens of lines[start:stop] to consumers that were already
+    started on `lines`. Does not call finish().
+    """
+    dispatch = {}
+    for consumer in consumers:
+        for kind, handler in consumer.handlers().items():
+            dispatch.setdefault(kind, []).append(handler)
+
+    if dispatch:
+        for tok in tokenize(lines, start, stop):
+            targets = dispatch.get(tok.kind)
+            if targets:
+                for handler in targets:
+                    handler(tok)
+
+
+# scan(stop=...) asks whether to go on once per block of this many lines
+SCAN_BLOCK_LINES = 1000
+
+
+def scan(content, consumers, stop=None):
+    """
+    Tokenizes `content` once and feeds every consumer.
+    `content` is a str or already a sequence of lines (line_index.FileLines).
+    stop() is asked after every SCAN_BLOCK_LINES lines; once it returns True
+    the scan ends there and finish() is not called.
+    Returns the list of lines (shared with the consumers).
+    """
+    lines = content.splitlines() if isinstance(content, str) else content
+    for consumer in consumers:
+        consumer.start(lines)
+
+    if stop is None:
+        scan_lines(lines, consumers)
+    else:
+        for start in range(0, len(lines), SCAN_BLOCK_LINES):
+            scan_lines(lines, consumers, start, start + SCAN_BLOCK_LINES)
+            if stop():
+                return lines
+
+    for consumer in consumers:
+        consumer.finish()
+    return lines
@@ -0,0 +1,362 @@
+import os
+import re
+import copy
+import mmap
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+
+# Everything str.splitlines() breaks on
+LINE_BREAKS = "\r\n\v\f\x1c\x1d\x1e\x85\u2028\u2029"
+
+
+class LineIndex:
+    """
+    Line table of a text: an array of line start offsets instead of a list of
+    line strings. Lines are those of str.splitlines(); indexing returns the
+    line text like the list would (0-based), the methods take 1-based line numbers.
+    """
+
+    def __init__(self, content):
+        self.content = content
+        # starts[i] is where line i + 1 begins, starts[-1] is the end of the text
+        self.starts = array("q", accumulate(map(len, content.splitlines(True)), initial=0))
+
+    def __len__(self):
+        return len(self.starts) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("line index out of range")
+        return self.content[self.starts[i]:self.starts[i + 1]].rstrip(LINE_BREAKS)
+
+    def line_of(self, offset):
+        """1-based line holding the character at `offset`."""
+        return min(bisect_right(self.starts, offset), len(self))
+
+    def context(self, line):
+        """Stripped text of a 1-based line, "N/A" outside the text."""
+        if 0 < line <= len(self):
+            return self[line - 1].strip()
+        return "N/A"
+
+
+# Breaks of str.splitlines() as UTF-8 bytes; the uncommon ones are looked for
+# first so most blocks are split by bytes.splitlines() (\n, \r, \r\n)
+LINE_BREAK_BYTES = re.compile(rb"\r\n|[\n\r\v\f\x1c\x1d\x1e]|\xc2\x85|\xe2\x80[\xa8\xa9]")
+RARE_LINE_BREAK_BYTES = re.compile(rb"[\v\f\x1c\x1d\x1e]|\xc2\x85|\xe2\x80[\xa8\xa9]")
+
+# FileLines indexes and decodes the mapped file this many bytes at a time
+READ_BLOCK_BYTES = 1024 * 1024
+
+# Mapped pages already read are handed back where the OS allows it, so the
+# mapping does not add up to the whole file in the process's memory
+_MADV_DONTNEED = getattr(mmap, "MADV_DONTNEED", None)
+
+# A block ending in one of these ends with a whole line (a lone \r may still
+# be followed by \n in the next block)
+_ENDS_WITH_BREAK = re.compile(rb"(?:[\n\v\f\x1c\x1d\x1e]|\xc2\x85|\xe2\x80[\xa8\xa9])\Z")
+
+
+# The last byte of every line break (of \xc2\x85 and \xe2\x80\xa8/9 as well)
+_BREAK_LAST_BYTES = (b"\n", b"\r", b"\v", b"\f", b"\x1c", b"\x1d", b"\x1e", b"\x85", b"\xa8", b"\xa9")
+
+
+def _may_break(data):
+    """
+    Quick test (bytes `in`, no regex) whether a block may end a line: False
+    means it holds no line break, not even one begun in the block before.
+    """
+    return any(byte in data for byte in _BREAK_LAST_BYTES)
+
+
+def _line_ends(block, offset):
+    """End offsets (+ offset) of the lines of a bytes block, as str.splitlines() would cut them."""
+    if not RARE_LINE_BREAK_BYTES.search(block):
+        return accumulate(map(len, block.splitlines(True)), initial=offset)
+    ends = [offset + match.end() for match in LINE_BREAK_BYTES.finditer(block)]
+    if block and (not ends or ends[-1] != offset + len(block)):
+        ends.append(offset + len(block))
+    return [offset] + ends
+
+
+def _count_lines(block):
+    """Lines of a bytes block ending with a line break, as str.splitlines() counts them."""
+    if RARE_LINE_BREAK_BYTES.search(block):
+        return sum(1 for _ in LINE_BREAK_BYTES.finditer(block))
+    if b"\r" in block:
+        return len(block.splitlines())
+    return block.count(b"\n")
+
+
+def _whole_lines(block):
+    """Length of the part of a bytes block made of whole lines (more may follow the block)."""
+    cut = block.rfind(b"\n") + 1
+    if cut:
+        return cut
+    # No \n at all (\r or rarer breaks only)
+    ends = list(_line_ends(block, 0))
+    return ends[-1] if _ENDS_WITH_BREAK.search(block) else ends[-2]
+
+
+def with_newlines(text):
+    """The text with every line break made '\\n': the lines of text.splitlines() stay the same."""
+    joined = "\n".join(text.splitlines())
+    return joined + "\n" if text and text[-1] in LINE_BREAKS else joined
+
+
+def substitute_text(text, pattern, repl):
+    """
+    pattern.sub(repl, text) on a with_newlines() text, redone line by line if a
+    match crosses a line break: every line keeps its number, as in a
+    FileLines.substituted() view (a last line left empty goes in both).
+    """
+    replaced = pattern.sub(repl, text)
+    if replaced.count("\n") == text.count("\n"):
+        return replaced
+    return "\n".join(pattern.sub(repl, line) for line in text.split("\n"))
+
+
+def substitute_lines(lines, pattern, repl):
+    """
+    [pattern.sub(repl, line) for line in lines], with one sub over the joined
+    lines when no match crosses a line break (the line count does not change);
+    repl must not return line breaks of its own.
+    """
+    joined = "\n".join(lines)
+    replaced = pattern.sub(repl, joined)
+    if replaced.count("\n") == len(lines) - 1:
+        return replaced.split("\n")
+    return [pattern.sub(repl, line) for line in lines]
+
+
+class FileLines:
+    """
+    Lines of a UTF-8 file, mapped with mmap and decoded READ_BLOCK_BYTES at a
+    time instead of read into one str. Only the block being read is held:
+    the index keeps the first line and the byte offset of each block, a few
+    KB per GB of text. Walking the lines in order decodes every block once;
+    indexing works like LineIndex (a line outside the current block decodes
+    its block again), context() decodes just the one line.
+    substituted() gives a view of the same lines with a pattern replaced in
+    every line, which is how the <root>/<SPage> removal and the cleaner run
+    on the file without a copy of the text. A view has the lines the same
+    subs over the whole text would leave: a last line they empty goes, as
+    str.splitlines() drops it.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        with open(file_path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            # An empty file cannot be mapped
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        # Block i: lines block_lines[i] to block_lines[i + 1] - 1 (0-based),
+        # bytes block_offsets[i] to block_offsets[i + 1] - 1
+        self.block_lines = array("q", [0])
+        self.block_offsets = array("q", [0])
+        lines, offset, pos = 0, 0, 0
+        while True:
+            data = self.data[pos:pos + READ_BLOCK_BYTES]
+            pos += len(data)
+            if data and not _may_break(data):
+                # Still in the line begun before, sliced once a line break comes
+                continue
+            block = self.data[offset:pos]
+            self._release(offset, pos)
+            if not data:
+                # Last block, the last line may have no line break
+                cut = len(block)
+                count = sum(1 for _ in _line_ends(block, 0)) - 1
+            else:
+                cut = _whole_lines(block)
+                count = _count_lines(block[:cut])
+            if cut:
+                lines += count
+                offset += cut
+                self.block_lines.append(lines)
+                self.block_offsets.append(offset)
+            if not data:
+                break
+        # Whether the text ends with a line break (no empty line after it then)
+        tail = self.data[-3:]
+        self.ends_with_break = bool(_ENDS_WITH_BREAK.search(tail)) or tail.endswith(b"\r")
+        self.substitutions = ()
+        # (lines, ends with a line break) of the view, see _trim
+        self._shape = None
+        self._block_index = -1
+        self._block = []
+        # Line ends of one block, for context()
+        self._ends_index = -1
+        self._ends = None
+
+    def substituted(self, pattern, repl, rejoin=False):
+        """
+        View of the same lines with pattern.sub(repl, line) applied to each;
+        repl must not return line breaks of its own. rejoin=True first takes
+        the text as '\n'.join(lines), the way preprocess_file_content does:
+        no line break after the last line, so an empty last line goes.
+        """
+        view = copy.copy(self)
+        view.substitutions = self.substitutions + ((pattern, repl, rejoin),)
+        view._block_index, view._block = -1, []
+        view._shape = None
+        return view
+
+    def _trim(self):
+        """
+        (lines, whether the text ends with a line break) of the view. Only the
+        end can change, by a line per substitution at most, so this runs the
+        substitutions on the last few lines of the file.
+        """
+        kept, ends_with_break = self.block_lines[-1], self.ends_with_break
+        tail = [self._raw_line(i) for i in range(max(kept - len(self.substitutions) - 1, 0), kept)]
+        for pattern, repl, rejoin in self.substitutions:
+            if rejoin:
+                ends_with_break = False
+                if tail and tail[-1] == "":
+                    tail.pop()
+                    kept -= 1
+                    ends_with_break = kept > 0
+            tail = [pattern.sub(repl, line) for line in tail]
+            if not ends_with_break and tail and tail[-1] == "":
+                # The break before it now ends the text
+                tail.pop()
+                kept -= 1
+                ends_with_break = kept > 0
+        return kept, ends_with_break
+
+    def close(self):
+        """Unmaps the file, for the views taken from it as well."""
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+    def _release(self, start, stop):
+        """Drops the mapped pages of bytes start to stop once they are copied out (they stay cached by the OS)."""
+        if _MADV_DONTNEED is not None and isinstance(self.data, mmap.mmap):
+            start -= start % mmap.PAGESIZE
+            if stop > start:
+                self.data.madvise(_MADV_DONTNEED, start, stop - start)
+
+    def _read(self, block_index):
+        """Lines of one block, substitutions applied."""
+        if block_index == self._block_index:
+            return self._block
+        start, stop = self.block_offsets[block_index], self.block_offsets[block_index + 1]
+        data = self.data[start:stop]
+        self._release(start, stop)
+        lines = data.decode("utf-8").splitlines()
+        for pattern, repl, _ in self.substitutions:
+            lines = substitute_lines(lines, pattern, repl)
+        self._block_index, self._block = block_index, lines
+        return lines
+
+    def _line(self, i):
+        """Line i alone, substitutions applied: only its own bytes are decoded."""
+        block_index = bisect_right(self.block_lines, i) - 1
+        if block_index == self._block_index:
+            return self._block[i - self.block_lines[block_index]]
+        line = self._raw_line(i, block_index)
+        for pattern, repl, _ in self.substitutions:
+            line = pattern.sub(repl, line)
+        return line
+
+    def _raw_line(self, i, block_index=None):
+        """Line i as it is in the file."""
+        if block_index is None:
+            block_index = bisect_right(self.block_lines, i) - 1
+        if block_index != self._ends_index:
+            start, stop = self.block_offsets[block_index], self.block_offsets[block_index + 1]
+            self._ends = array("q", _line_ends(self.data[start:stop], start))
+            self._release(start, stop)
+            self._ends_index = block_index
+        j = i - self.block_lines[block_index]
+        return self.data[self._ends[j]:self._ends[j + 1]].decode("utf-8").splitlines()[0]
+
+    def __len__(self):
+        if self._shape is None:
+            self._shape = self._trim()
+        return self._shape[0]
+
+    def __iter__(self):
+        count = len(self)
+        for block_index in range(len(self.block_lines) - 1):
+            lines = self._read(block_index)
+            left = count - self.block_lines[block_index]
+            if left < len(lines):
+                # The lines the substitutions left empty at the end
+                yield from lines[:max(left, 0)]
+                return
+            yield from lines
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("line index out of range")
+        block_index = bisect_right(self.block_lines, i) - 1
+        return self._read(block_index)[i - self.block_lines[block_index]]
+
+    def context(self, line):
+        """Stripped text of a 1-based line, "N/A" outside the text."""
+        if 0 < line <= len(self):
+            return self._line(line - 1).strip()
+        return "N/A"
+
+    def text_chunks(self, chunk_chars):
+        """
+        The lines joined with '\\n' (no break after the last one unless the
+        text ends with one), in pieces of at least chunk_chars bytes (or a
+        block) cut after a line break.
+        """
+        length = len(self)
+        # Blocks up to the last line the view keeps
+        count = bisect_left(self.block_lines, length)
+        start = 0
+        while start < count:
+            stop = bisect_left(self.block_offsets, self.block_offsets[start] + chunk_chars, start + 1)
+            stop = min(stop, count)
+            lines = [line for block_index in range(start, stop) for line in self._read(block_index)]
+            if stop < count:
+                yield "\n".join(lines) + "\n"
+            else:
+                lines = lines[:length - self.block_lines[start]]
+                yield "\n".join(lines) + ("\n" if self._shape[1] else "")
+            start = stop
+
+    def ends(self, chars):
+        """
+        (head, tail): the first and the last lines holding about `chars` bytes
+        each, joined with '\\n'; tail is None when head already holds every line.
+        """
+        if self.block_offsets[-1] <= 2 * chars:
+            return "\n".join(self), None
+        return "\n".join(_first_chars(self, chars)), "\n".join(_last_chars(self, chars))
+
+
+def _first_chars(lines, chars):
+    """The first lines, up to the one reaching `chars` characters."""
+    head, size = [], 0
+    for line in lines:
+        if size >= chars:
+            break
+        head.append(line)
+        size += len(line) + 1
+    return head
+
+
+def _last_chars(lines, chars):
+    """The last lines, back to the one reaching `chars` characters."""
+    tail, size = [], 0
+    i = len(lines)
+    while i > 0 and size < chars:
+        i -= 1
+        tail.append(lines[i])
+        size += len(lines[i]) + 1
+    return tail[::-1]
@@ -2,19 +2,153 @@ import os
 import sys
 import logging
 import gc
-from validator import validate_all_files, print_error_report
+import argparse
+import sqlite3
+from functools import partial
+from itertools import chain
+from discovery import DEFAULT_EXCLUDE, discover_files
+from reporting import ConsoleReport, NdjsonReport, XlsxReport, MultiReport
+from result_cache import ResultCache, DEFAULT_CACHE_FILE, DEFAULT_CACHE_MAX_BYTES
+from profiling import DEFAULT_PROFILE_FILE, write_profile, dump_cprofile
+# ⚡ validator (lxml and the checkers) and service are imported only when
+# needed, so --help, bad paths and empty folders start fast
+
+LOG_FILE = 'validator.log'
+
+def parse_args(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Unified XML/SGML validator")
+    arg_parser.add_argument("path", nargs="?", help="File or folder to validate")
+    arg_parser.add_argument(
+        "-j", "--jobs", type=int, default=1,
+        help="Number of worker processes (0 = one per CPU, default: 1); the largest files go first, the output keeps the file order"
+    )
+    arg_parser.add_argument(
+        "--rules", metavar="PATH",
+        help="JSON rules profile whose settings replace those of config.py (supported_tags, custom_entities...)"
+    )
+    arg_parser.add_argument(
+        "--serve", action="store_true",
+        help="Run as a service taking validate jobs over HTTP on localhost (or --socket) until interrupted"
+    )
+    arg_parser.add_argument(
+        "--port", type=int,
+        help="With --serve, the localhost port to listen on (default: 8765)"
+    )
+    arg_parser.add_argument(
+        "--socket", metavar="PATH",
+        help="With --serve, listen on a Unix socket at PATH instead of a port"
+    )
+    arg_parser.add_argument(
+        "--serve-root", metavar="DIR",
+        help="With --serve, the folder jobs may read files from (default: the current folder)"
+    )
+    arg_parser.add_argument(
+        "--queue", type=int, metavar="N",
+        help="With --serve, jobs taken at once before new ones are refused (default: 64)"
+    )
+    arg_parser.add_argument(
+        "-r", "--recursive", action="store_true",
+        help="Also validate the files in subfolders, at any depth"
+    )
+    arg_parser.add_argument(
+        "--include", action="append", default=[], metavar="GLOB",
+        help="Validate only files matching GLOB (repeatable); a GLOB with '/' matches the path within the folder"
+    )
+    arg_parser.add_argument(
+        "--exclude", action="append", default=[], metavar="GLOB",
+        help="Leave out files and folders matching GLOB (repeatable)"
+    )
+    arg_parser.add_argument(
+        "--ext", action="append", default=[], metavar="EXT",
+        help="Validate only files with this extension, e.g. --ext fnt --ext sgm (repeatable)"
+    )
+    arg_parser.add_argument(
+        "--include-binary", action="store_true",
+        help="Also validate files that look binary (skipped by default)"
+    )
+    arg_parser.add_argument(
+        "--stream-parse", action="store_true", default=None,
+        help="Parse every file in streaming mode, without a tree (large files always are)"
+    )
+    arg_parser.add_argument(
+        "--recover", action="store_true",
+        help="Also check the tag structure of files that do not parse, on the tree lxml recovers from them"
+    )
+    arg_parser.add_argument(
+        "--max-errors-per-file", type=int, default=None, metavar="N",
+        help="Stop checking a file once N errors are found and report only those"
+    )
+    arg_parser.add_argument(
+        "--fail-fast", action="store_true",
+        help="Stop at the first file with errors (CI gating); exits with status 1 if any file failed"
+    )
+    arg_parser.add_argument(
+        "--summary-only", action="store_true",
+        help="Print only the scan summary, not the issues of each file"
+    )
+    arg_parser.add_argument(
+        "--max-per-category", type=int, default=None, metavar="N",
+        help="Print at most N issues of each category per file (all are still counted)"
+    )
+    arg_parser.add_argument(
+        "--ndjson", metavar="PATH",
+        help="Also write every result as newline-delimited JSON to PATH"
+    )
+    arg_parser.add_argument(
+        "--xlsx", metavar="PATH",
+        help="Also write every result to an Excel workbook at PATH (a sheet per category and a summary)"
+    )
+    arg_parser.add_argument(
+        "--no-cache", action="store_true",
+        help="Validate every file again instead of reusing cached results"
+    )
+    arg_parser.add_argument(
+        "--cache-file", default=DEFAULT_CACHE_FILE,
+        help=f"Result cache location (default: {DEFAULT_CACHE_FILE})"
+    )
+    arg_parser.add_argument(
+        "--cache-max-mb", type=int, default=DEFAULT_CACHE_MAX_BYTES // (1024 * 1024),
+        help="Size limit of the result cache in MB; least recently used results go first"
+    )
+    arg_parser.add_argument(
+        "--profile", action="store_true",
+        help=f"Record time, memory and errors per stage and file into {DEFAULT_PROFILE_FILE} (next to {LOG_FILE}); every file is validated, the result cache is not used"
+    )
+    arg_parser.add_argument(
+        "--profile-top", type=int, default=0, metavar="N",
+        help="With --profile, validate the N slowest files again under cProfile and write <file>.pstats"
+    )
+    return arg_parser.parse_args(argv)
 
 def main():
+    args = parse_args()
+
     # Configure logging
     logging.basicConfig(
         level=logging.INFO,
         format='%(asctime)s - %(levelname)s - %(message)s',
-        filename='validator.log'
+        filename=LOG_FILE
     )
 
+    # 📐 Rules profile: loaded (and checked) once, before any file or job
+    if args.rules:
+        from ruleset import use_ruleset
+        try:
+            use_ruleset(os.path.abspath(os.path.expanduser(args.rules)))
+        except (OSError, ValueError) as e:
+            print(f"❌ Error: cannot load rules profile: {e}")
+            return
+
+    # 🛰 Service mode: workers stay warm between jobs, no path needed
+    if args.serve:
+        from service import DEFAULT_PORT, DEFAULT_MAX_QUEUE, serve
+        serve(jobs=args.jobs, port=args.port or DEFAULT_PORT, socket_path=args.socket,
+              max_queue=args.queue or DEFAULT_MAX_QUEUE, root=args.serve_root, ready=lambda address: print(f"🛰 Validator service listening on {address} (Ctrl+C to stop)", flush=True))
+        return
+
     # Get path from argument or input
-    if len(sys.argv) > 1:
-        input_path = sys.argv[1]
+    if args.path:
+        input_path = args.path
     else:
         input_path = input("Enter the file or folder path to validate: ").strip()
 
@@ -31,29 +165,104 @@ def main():
         if os.path.isfile(input_path):
             folder = os.path.dirname(input_path)
             file_list = [os.path.basename(input_path)]
-        # If it's a folder, validate all files in it
+            files, found = file_list, iter(())
+            print(f"📂 Scanning: {folder}")
+            print(f"📄 Files detected: {file_list}")
+        # If it's a folder, validate the files found in it while the walk goes on
         elif os.path.isdir(input_path):
             folder = input_path
-            file_list = os.listdir(folder)
+            print(f"📂 Scanning: {folder}")
+            exclude = (*DEFAULT_EXCLUDE, os.path.basename(args.cache_file), *args.exclude)
+            found = discover_files(folder, recursive=args.recursive, include=args.include,
+                                   exclude=exclude, extensions=args.ext,
+                                   skip_binary=not args.include_binary)
+            first = next(found, None)
+            if first is None:
+                print("⚠ No files found to validate.")
+                return
+            # Names handed out so far, for the --fail-fast note
+            file_list = []
+            found = chain([first], found)
+
+            def listed(names):
+                for name in names:
+                    file_list.append(name)
+                    yield name
+            files = listed(found)
         else:
             print(f"❌ Error: '{input_path}' is neither a file nor a folder.")
             return
 
-        if not file_list:
-            print("⚠ No files found to validate.")
-            return
+        from validator import validate_all_files, validate_file
+
+        cache = None
+        # ⏱ A profile of cached results would be empty: --profile validates every file
+        if not args.no_cache and not args.profile:
+            try:
+                cache = ResultCache(args.cache_file, args.cache_max_mb * 1024 * 1024)
+            except sqlite3.Error as e:
+                logging.warning(f"Result cache disabled: {e}")
 
-        print(f"📂 Scanning: {folder}")
-        print(f"📄 Files detected: {file_list}")
+        # 📣 Each file is reported as soon as it is done; only error counts are kept
+        sinks = [ConsoleReport(summary_only=args.summary_only, max_per_category=args.max_per_category)]
+        if args.ndjson:
+            sinks.append(NdjsonReport(args.ndjson))
+        if args.xlsx:
+            sinks.append(XlsxReport(args.xlsx))
+        sink = MultiReport(sinks)
 
-        results = validate_all_files(folder, file_list)
-        print_error_report(results)
+        profiles = [] if args.profile else None
+        try:
+            results = validate_all_files(folder, files, jobs=args.jobs,
+                                         stream_parse=args.stream_parse, cache=cache,
+                                         profiles=profiles, recover=args.recover,
+                                         max_errors=args.max_errors_per_file, fail_fast=args.fail_fast,
+                                         sink=sink)
+        finally:
+            if cache is not None:
+                cache.close()
+            sink.close()
+        if args.fail_fast:
+            unchecked = [name for name in dict.fromkeys(file_list)
+                         if name not in results and os.path.isfile(os.path.join(folder, name))]
+            # The walk is not finished either when it stopped early
+            more = next(found, None) is not None
+            not_checked = []
+            if unchecked:
+                not_checked.append(f"{len(unchecked)} file(s)")
+            if more:
+                not_checked.append("the rest of the folder")
+            if not_checked:
+                print(f"⛔ Stopped at the first file with errors, {' and '.join(not_checked)} not checked")
+
+        if profiles is not None:
+            profile_dir = os.path.dirname(os.path.abspath(LOG_FILE))
+            profile_path = os.path.join(profile_dir, DEFAULT_PROFILE_FILE)
+            write_profile(profile_path, profiles)
+            print(f"⏱ Profile written to {profile_path}")
+            if args.profile_top > 0:
+                slowest = sorted(profiles, key=lambda profile: profile["wall"], reverse=True)
+                slowest = [profile["file"] for profile in slowest[:args.profile_top]]
+                for stats_path in dump_cprofile(
+                    partial(validate_file, stream_parse=args.stream_parse, recover=args.recover,
+                            max_errors=args.max_errors_per_file),
+                    slowest, profile_dir, folder
+                ):
+                    print(f"⏱ cProfile stats written to {stats_path}")
         gc.collect()
 
+        # CI gating: the exit status tells whether every checked file is clean
+        if args.fail_fast or args.max_errors_per_file is not None:
+            return 1 if any(results.values()) else 0
+
     except Exception as e:
         error_msg = f"Critical error: {str(e)}"
         print(f"\n{error_msg}")
         logging.error(error_msg)
 
 if __name__ == "__main__":
-    main()
+    # Needed for the process pool in the frozen (PyInstaller) executable
+    if getattr(sys, "frozen", False):
+        import multiprocessing
+        multiprocessing.freeze_support()
+    sys.exit(main())
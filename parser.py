@@ -1,41 +1,38 @@
 from lxml import etree
+import itertools
 import re
+from line_index import LineIndex
+from ruleset import active_ruleset
 
 # ========== CLEANER ==========
-def preprocess_file_content(raw_content):
-    """Fix layout markers and dynamic non-closing tags for XML compatibility."""
-    page_tag_pattern = re.compile(r"<\s*Page\s+\d+\s*>", re.IGNORECASE)
-    non_closing_tag_pattern = {"fnt","fnr"}
-
-    head_foot = {"\*\*\*\*HEADNOTE\*\*\*\*","\*\*\*\*FOOTNOTE\*\*\*\*"}
-
-    layout_tags = {"P20", "CN", "HN02", "HN24", "P00","B22", "HN68","P02", "B24", "HN46",
-                  "B42", "P24", "P42", "B44", "B", "C5", "HN00", "HN20"}
-
-    cleaned_lines = []
-    for line in raw_content.splitlines():
-        line = page_tag_pattern.sub("<Page/>", line)
-
-    #  Remove all <SPage ...> tags
-        line = re.sub(r"<\s*SPage\b[^>]*>", "", line, flags=re.IGNORECASE)
+# The rewrites are ruleset.compile_preprocess_pattern(), compiled once in the active Ruleset
 
-    # Fix layout tags
-        for tag in layout_tags:
-            line = re.sub(rf"<\s*{tag}(\s[^>]*)?>", rf"<{tag}\1/>", line)
 
-        for tag in non_closing_tag_pattern:
-            line = re.sub(rf"<\s*{tag}[^/>]*(\s[^>]*)?>", rf"<{tag}\1/>", line)
+def _rewrite_tag(match):
+    tag = match.group("layout")
+    if tag is not None:
+        return f"<{tag}{match.group('layout_attrs') or ''}/>"
+    tag = match.group("dynamic")
+    if tag is not None:
+        return f"<{tag}{match.group('dynamic_attrs') or ''}/>"
+    if match.group("page") is not None:
+        return "<Page/>"
+    # <SPage> and HEADNOTE/FOOTNOTE markers are dropped
+    return ""
 
-        for tag in head_foot:
-            line = re.sub(rf"<\s*{tag}(\s[^>]*)?>", rf"", line)
-
-        line = re.sub("\r\n\r\n", "", line)
-
-        cleaned_lines.append(line)
 
+def preprocess_file_content(raw_content):
+    """
+    Fix layout markers and dynamic non-closing tags for XML compatibility.
+    Line breaks are normalized to '\n' and line numbers are preserved.
+    """
+    cleaned_content = "\n".join(raw_content.splitlines())
+    return active_ruleset().preprocess_pattern.sub(_rewrite_tag, cleaned_content)
 
 
-    return "\n".join(cleaned_lines)
+def preprocess_lines(lines):
+    """preprocess_file_content for a line_index.FileLines, applied as its blocks are read (no rewrite spans lines)."""
+    return lines.substituted(active_ruleset().preprocess_pattern, _rewrite_tag, rejoin=True)
 
 # ========== ENTITY CONVERTER ==========
 ENTITY_TO_NUMERIC = {
@@ -220,113 +217,448 @@ ENTITY_TO_NUMERIC = {
     "circle20": "&#9470;", "euro": "&#8364;", "laquo": "&#171;", "raquo": "&#187;"
 }
 
+XML_PREDEFINED_ENTITIES = {"amp", "lt", "gt", "quot", "apos"}
+
+NAMED_ENTITY_PATTERN = re.compile(r'&([a-zA-Z0-9]+);')
+UNESCAPED_AMPERSAND_PATTERN = re.compile(r'&(?!#|[a-zA-Z0-9]+;)')
+# Every '&' in one scan: numeric refs are left alone, named refs are captured,
+# anything else is a bare ampersand
+AMPERSAND_PATTERN = re.compile(r'&(?!#)(?:([a-zA-Z0-9]+);)?')
+
+
 def replace_entities_with_numeric(xml_str):
     """Replaces named entities with numeric character references."""
-    for entity, numeric in ENTITY_TO_NUMERIC.items():
-        xml_str = xml_str.replace(f"&{entity};", numeric)
-    return xml_str
+    def replacer(match):
+        return ENTITY_TO_NUMERIC.get(match.group(1), match.group(0))
+
+    return NAMED_ENTITY_PATTERN.sub(replacer, xml_str)
 
 # ========== AMPERSAND SANITIZER ==========
 def sanitize_unescaped_ampersands(xml_str):
     """
     Replaces unsafe & with &amp;, while preserving:
-    - Valid entities (&amp;, &lt;, etc.)
-    - Legal-style usage (space & space)
+    - Named entities (&amp;, &lt;, &para;, etc.)
     - Numeric entities (&#123;, &#x1F600;)
     """
+    return UNESCAPED_AMPERSAND_PATTERN.sub('&amp;', xml_str)
+
+
+def rewrite_entities(xml_str, unknown_entities=None, first_line=1):
+    """
+    Single pass doing sanitize_unescaped_ampersands + replace_entities_with_numeric.
+    If `unknown_entities` is a list, every named entity that is neither mapped
+    nor predefined by XML is appended to it as (line, col, name).
+    `first_line` is the line number of xml_str's first line (for chunks).
+    """
+    line = first_line
+    line_start = 0
+    scanned = 0
+
     def replacer(match):
-        full_match = match.group(0)
-        # Skip valid entities
-        if full_match.startswith('&#'):
-            return full_match
-        if full_match in {'&amp;', '&lt;', '&gt;', '&quot;', '&apos;'}:
-            return full_match
-        # Skip legal-style & surrounded by spaces
-        if re.match(r'[ ]&[ ]', full_match):
-            return full_match
-        # Skip & followed by punctuation
-        if re.match(r'&[,.;:)]', full_match):
-            return full_match
-        return '&amp;'
-
-    return re.sub(r'&(?!#|amp;|lt;|gt;|quot;|apos;|[a-zA-Z0-9]+;)', replacer, xml_str)
+        nonlocal line, line_start, scanned
+        name = match.group(1)
+        if name is None:
+            return '&amp;'
+        numeric = ENTITY_TO_NUMERIC.get(name)
+        if numeric is not None:
+            return numeric
+        if unknown_entities is not None and name not in XML_PREDEFINED_ENTITIES:
+            pos = match.start()
+            newlines = xml_str.count('\n', scanned, pos)
+            if newlines:
+                line += newlines
+                line_start = xml_str.rfind('\n', scanned, pos) + 1
+            scanned = pos
+            unknown_entities.append((line, pos - line_start + 1, name))
+        return match.group(0)
+
+    return AMPERSAND_PATTERN.sub(replacer, xml_str)
 
 # ========== PARSER ==========
+# "... mismatch: X line N and Y" / "Premature end of data in tag X line N"
+ROOT_MISMATCH_PATTERN = re.compile(r"(?:mismatch: |in tag )(\S+) line (\d+)(?: and (\S+))?")
+
+
+def _categorize_parse_errors(error_log, lines):
+    """
+    Turns lxml log entries into sorted (category, line, col, msg, context) tuples.
+    `lines` is the LineIndex of the parsed text.
+    Mismatches against the <root> wrapper and premature ends are left out, they
+    only repeat an error already reported; if nothing else is left they are
+    the error, and are reported as the tag left open (at the line it opened)
+    or the end tag that closes nothing.
+    """
+    categorized_errors = []
+    seen_messages = set()
+    # Reported only if no other error is
+    fallback = set()
+
+    for entry in error_log:
+        msg = entry.message.strip()
+        line = entry.line
+        col = entry.column
+        context = lines.context(line)
+
+        error_key = (line, col, msg)
+        if error_key in seen_messages:
+            continue
+        seen_messages.add(error_key)
+
+        if "Premature end of data in tag" in msg:
+            fallback.add(_root_mismatch(msg, line, col))
+            continue
+
+        lower_msg = msg.lower()
+        if any(x in lower_msg for x in ["xmlparseentityref", "unescaped", "no name", "amp", "lt", "gt", "semicolon"]):
+            category = "Repent"
+        elif "tag mismatch" in lower_msg:
+            if "root" in lower_msg:
+                fallback.add(_root_mismatch(msg, line, col))
+                continue
+            if "not properly nested" in lower_msg or "misnested" in lower_msg:
+                category = "Reptag-nest"
+            else:
+                category = "Reptag-mismatch"
+        elif "start tag" in lower_msg or "end tag" in lower_msg:
+            category = "Reptag-structure"
+        else:
+            category = "CheckSGM"
+
+        categorized_errors.append((category, line, col, msg, context))
+
+    if not categorized_errors:
+        # 🔑 A document that does not parse is never reported clean
+        for line, col, msg in sorted(fallback - {None}):
+            categorized_errors.append(("Reptag-structure", line, col, msg, lines.context(line)))
+        if not categorized_errors and len(error_log):
+            entry = error_log[0]
+            categorized_errors.append((
+                "CheckSGM", entry.line, entry.column,
+                f"Document does not parse: {entry.message.strip()}", lines.context(entry.line)
+            ))
+
+    categorized_errors.sort(key=lambda x: x[1])
+    return categorized_errors
+
+
+def _root_mismatch(msg, line, col):
+    """(line, col, msg) of what a mismatch against <root> or a premature end stands for, None if unknown."""
+    match = ROOT_MISMATCH_PATTERN.search(msg)
+    if match is None:
+        return None
+    opened, opened_line, closed = match.groups()
+    if opened == "root" and closed not in (None, "root"):
+        return line, col, f"End tag </{closed}> has no start tag"
+    return int(opened_line), 0, f"Tag <{opened}> is never closed"
+
+
+# Prolog that must stay at the very start of the document (<root> cannot go before it)
+_PROLOG_PATTERN = re.compile(r"\s*<(?:\?xml\b|!DOCTYPE\b)")
+# First start tag, after any leading comments and processing instructions
+_FIRST_TAG_PATTERN = re.compile(r"(?:\s|<!--.*?-->|<\?.*?\?>)*<([A-Za-z_][\w.:-]*)[^>]*?(/?)>", re.S)
+# Last end tag of the document
+_LAST_TAG_PATTERN = re.compile(r"</([A-Za-z_][\w.:-]*)\s*>\s*$")
+ROOT_PROBE_CHARS = 4096
+
+
+def has_single_root(cleaned_content):
+    """
+    Cheap probe run before parsing: does the cleaned document already have one
+    root element, or does it need the <root> wrapper? Only the first and last
+    ROOT_PROBE_CHARS characters are looked at: the first start tag must be closed
+    by the last end tag (or be the whole document if it is empty).
+    A prolog (<?xml ...?>, <!DOCTYPE>) always counts as a root, wrapping would break it.
+    """
+    head = cleaned_content[:ROOT_PROBE_CHARS]
+    if _PROLOG_PATTERN.match(head):
+        return True
+    first = _FIRST_TAG_PATTERN.match(head)
+    if first is None:
+        return False
+    tail = cleaned_content[-ROOT_PROBE_CHARS:]
+    if first.group(2):
+        return len(cleaned_content) <= ROOT_PROBE_CHARS and not head[first.end():].strip()
+    last = _LAST_TAG_PATTERN.search(tail)
+    return last is not None and last.group(1) == first.group(1)
+
+
+def _extra_content(error_log):
+    """True if the parse stopped at a second top-level element (the probe guessed wrong)."""
+    return any(entry.type == etree.ErrorTypes.ERR_DOCUMENT_END for entry in error_log)
 
 
-def parse_xml(raw_content):
+def parse_xml(raw_content, preprocessed=False, unknown_entities=None, wrap=None, recover=False):
     """
     Parses XML/SGML after cleaning.
+    Pass preprocessed=True if raw_content already went through preprocess_file_content.
+    Pass a list as unknown_entities to collect undefined named entities (see rewrite_entities).
+    wrap=True parses inside <root> straight away (e.g. a single page), wrap=False
+    never wraps; None lets has_single_root decide, so the document is parsed once.
+    lxml reports every error of the document in that one parse. With recover=True
+    the parser also repairs what it can and the partial tree is returned along
+    with the errors, so element checks can still run on a broken file.
     Returns: (tree, errors, None)
     Always returns an ElementTree if parsing succeeds.
     """
     try:
-        # STEP 1: Pre-cleaning
-        cleaned_content = preprocess_file_content(raw_content)
+        # STEP 1: Pre-cleaning (once per file)
+        cleaned_content = raw_content if preprocessed else preprocess_file_content(raw_content)
 
-        # STEP 2: Sanitize
-        cleaned_content = sanitize_unescaped_ampersands(cleaned_content)
+        # STEP 2: Sanitize and replace known entities in one pass
+        cleaned_content = rewrite_entities(cleaned_content, unknown_entities)
 
-        # STEP 3: Replace known entities
-        cleaned_content = replace_entities_with_numeric(cleaned_content)
+        # lxml keeps a global error log; start clean so errors from an
+        # earlier file never show up in this one
+        etree.clear_error_log()
 
         parser = etree.XMLParser(
-            recover=False,
+            recover=recover,
             huge_tree=True,
             remove_blank_text=True,
             remove_comments=True,
             resolve_entities=False
         )
 
+        if wrap is None:
+            # 🔑 Decide the wrapping up front instead of parse-fail-reparse
+            wrap = not has_single_root(cleaned_content)
+
+        def parse(wrap):
+            content = f"<root>{cleaned_content}</root>" if wrap else cleaned_content
+            return etree.fromstring(content.encode("utf-8"), parser)
+
+        try:
+            root = parse(wrap)
+        except etree.XMLSyntaxError as e:
+            # Probe fooled by <a>..</a> ... <a>..</a>: the parse stopped right
+            # after the first element, so only that part was parsed twice
+            if wrap or not _extra_content(e.error_log):
+                raise
+            etree.clear_error_log()
+            root = parse(True)
+        if recover and not wrap and _extra_content(parser.error_log):
+            etree.clear_error_log()
+            root = parse(True)
+
+        errors = []
+        if recover and parser.error_log.filter_from_errors():
+            errors = _categorize_parse_errors(parser.error_log, LineIndex(raw_content))
+        tree = etree.ElementTree(root) if root is not None else None
+        return tree, errors, None
+
+    except etree.XMLSyntaxError as e:
+        return None, _categorize_parse_errors(e.error_log, LineIndex(raw_content)), None
+
+    except Exception as e:
+        return None, [("CheckSGM", 0, 0, f"Unexpected error: {str(e)}", "N/A")], None
+
+# ========== STREAMING PARSER ==========
+STREAM_CHUNK_CHARS = 1024 * 1024
+
+
+def iter_cleaned_chunks(raw_content, preprocessed=False, unknown_entities=None,
+                        chunk_chars=STREAM_CHUNK_CHARS):
+    """
+    Yields the cleaned document (preprocess + rewrite_entities) as UTF-8 chunks
+    of about chunk_chars characters. Chunks are cut at line boundaries, so every
+    rewrite sees whole lines and the joined chunks equal what parse_xml parses.
+    raw_content may also be a line_index.FileLines (read from the file
+    block by block).
+    """
+    if isinstance(raw_content, str):
+        pieces = _line_chunks(raw_content, chunk_chars)
+    else:
+        if not preprocessed:
+            raw_content = preprocess_lines(raw_content)
+            preprocessed = True
+        pieces = raw_content.text_chunks(chunk_chars)
+    line = 1
+    chunk = next(pieces, None)
+    while chunk is not None:
+        next_chunk = next(pieces, None)
+        if not preprocessed:
+            # preprocess_file_content drops the trailing line break
+            chunk = preprocess_file_content(chunk)
+            if next_chunk is not None:
+                chunk += "\n"
+        chunk = rewrite_entities(chunk, unknown_entities, first_line=line)
+        line += chunk.count("\n")
+        if chunk:
+            yield chunk.encode("utf-8")
+        chunk = next_chunk
+
+
+def _line_chunks(text, chunk_chars):
+    """text in pieces of about chunk_chars characters, each cut after a line break."""
+    length = len(text)
+    pos = 0
+    while pos < length:
+        end = text.find("\n", pos + chunk_chars)
+        end = length if end == -1 else end + 1
+        yield text[pos:end]
+        pos = end
+
+
+class _ChunkReader:
+    """File-like object over chunks, so lxml pulls the input piece by piece."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+
+    def read(self, size=-1):
+        return next(self._chunks, b"")
+
+
+class _NullTarget:
+    """
+    Parser target without start/end/data handlers: lxml reports no events to it
+    and builds no tree, the parse only checks the document.
+    """
+
+    def close(self):
+        return None
+
+
+def _target_elements(chunks, target, recover=False):
+    """
+    Parses the chunks into a parser target (start/end/close, see
+    tag_checker.TagRulesTarget) and returns what its close() returns.
+    lxml builds no tree for a target. The chunks are fed a line at a time with
+    target.line set to that line: lxml calls start() as soon as the start tag
+    is complete, so target.line is the element's sourceline.
+    """
+    parser = etree.XMLParser(
+        target=target,
+        recover=recover,
+        huge_tree=True,
+        remove_blank_text=True,
+        remove_comments=True,
+        resolve_entities=False
+    )
+    feed = parser.feed
+    line = 1
+    for chunk in chunks:
+        pos = 0
+        end = chunk.find(b"\n")
+        while end != -1:
+            target.line = line
+            feed(chunk[pos:end + 1])
+            line += 1
+            pos = end + 1
+            end = chunk.find(b"\n", pos)
+        if pos < len(chunk):
+            # Rest of a line that goes on in the next chunk
+            target.line = line
+            feed(chunk[pos:])
+    return parser.close()
+
+
+def _probe_text(raw_content, preprocessed):
+    """Head and tail of the cleaned document, enough for has_single_root."""
+    if not isinstance(raw_content, str):
+        head, tail = raw_content.ends(ROOT_PROBE_CHARS)
+        if not preprocessed:
+            head = preprocess_file_content(head)
+            tail = tail if tail is None else preprocess_file_content(tail)
+        return head if tail is None else head + "\n" * (ROOT_PROBE_CHARS + 1) + tail
+    if len(raw_content) <= 2 * ROOT_PROBE_CHARS:
+        return raw_content if preprocessed else preprocess_file_content(raw_content)
+    head = raw_content[:ROOT_PROBE_CHARS]
+    tail = raw_content[-ROOT_PROBE_CHARS:]
+    if not preprocessed:
+        # Whole lines only, the rewrites never span a line break
+        head = preprocess_file_content(head[:head.rfind("\n") + 1] or head)
+        tail = preprocess_file_content(tail[tail.find("\n") + 1:] or tail)
+    # Keeps both ends beyond ROOT_PROBE_CHARS of each other
+    return head + "\n" * (ROOT_PROBE_CHARS + 1) + tail
+
+
+def parse_xml_streaming(raw_content, preprocessed=False, unknown_entities=None,
+                        make_target=None, chunk_chars=STREAM_CHUNK_CHARS, recover=False):
+    """
+    Low-memory variant of parse_xml for very large documents: the cleaned
+    content is handed to lxml in chunks and no tree is built, so memory does
+    not grow with the document. Errors are the same as parse_xml's.
+    raw_content may also be a line_index.FileLines, the text then never
+    exists as one str (error context comes from its lines).
+    Pass make_target() -> parser target (see _target_elements) to run element
+    rules on the parsed document; like validate_tags they only run if parsing
+    succeeded, or with recover=True on the repaired document as well (lxml's
+    push parser may repair a broken document differently from parse_xml, so
+    those element errors can differ; parse errors do not).
+    Returns: (None, errors, element_errors)
+    """
+    def chunks(wrap, unknown_entities=None):
+        cleaned = iter_cleaned_chunks(raw_content, preprocessed, unknown_entities, chunk_chars)
+        if not wrap:
+            return cleaned
+        # 🔑 Root wrapping is injected as chunks, the content is not rebuilt
+        return itertools.chain((b"<root>",), cleaned, (b"</root>",))
+
+    def elements(wrap, unknown_entities=None, recover=False):
+        return _target_elements(chunks(wrap, unknown_entities), make_target(), recover)
+
+    def recovered_elements(wrap):
         try:
-            # 🔑 Try parsing directly (works if file already has one root)
-            root = etree.fromstring(cleaned_content.encode("utf-8"), parser)
+            return elements(wrap, recover=True)
         except etree.XMLSyntaxError:
-            # 🔑 If that fails, fallback to wrapping
-            wrapped = f"<root>{cleaned_content}</root>"
-            root = etree.fromstring(wrapped.encode("utf-8"), parser)
+            # Nothing lxml could recover (no element at all)
+            return []
 
-        tree = etree.ElementTree(root)
-        return tree, [], None
+    def errors_only(wrap, unknown_entities):
+        # The push parser behind feed() gives up after some errors, so the
+        # errors are collected by a plain (pull) parser with a target that builds nothing
+        parser = etree.XMLParser(
+            target=_NullTarget(),
+            recover=False,
+            huge_tree=True,
+            remove_blank_text=True,
+            remove_comments=True,
+            resolve_entities=False
+        )
+        etree.parse(_ChunkReader(chunks(wrap, unknown_entities)), parser)
+        return []
 
-    except etree.XMLSyntaxError as e:
-        categorized_errors = []
-        seen_messages = set()
-        lines = raw_content.splitlines()
-
-        for entry in e.error_log:
-            msg = entry.message.strip()
-            line = entry.line
-            col = entry.column
-            context = lines[line-1].strip() if 0 < line <= len(lines) else "N/A"
-
-            error_key = (line, col, msg)
-            if error_key in seen_messages:
-                continue
-            seen_messages.add(error_key)
+    # 🔑 Decided once from both ends of the document, see has_single_root
+    wrap = not has_single_root(_probe_text(raw_content, preprocessed))
 
-            if "Premature end of data in tag" in msg:
-                continue
+    def attempt(parse):
+        nonlocal wrap
+        try:
+            return parse(wrap, unknown_entities)
+        except etree.XMLSyntaxError as e:
+            # Probe fooled by <a>..</a> ... <a>..</a>: the parse stopped right
+            # after the first element, so only that part was read twice
+            if wrap or not _extra_content(e.error_log):
+                raise
+            wrap = True
+            if unknown_entities is not None:
+                # collected again by the second pass
+                del unknown_entities[:]
+            etree.clear_error_log()
+            return parse(wrap, unknown_entities)
 
-            lower_msg = msg.lower()
-            if any(x in lower_msg for x in ["xmlparseentityref", "unescaped", "no name", "amp", "lt", "gt", "semicolon"]):
-                category = "Repent"
-            elif "tag mismatch" in lower_msg:
-                if "root" in lower_msg:
-                    continue
-                if "not properly nested" in lower_msg or "misnested" in lower_msg:
-                    category = "Reptag-nest"
-                else:
-                    category = "Reptag-mismatch"
-            elif "start tag" in lower_msg or "end tag" in lower_msg:
-                category = "Reptag-structure"
-            else:
-                category = "CheckSGM"
+    try:
+        # lxml keeps a global error log; start clean so errors from an
+        # earlier file never show up in this one
+        etree.clear_error_log()
 
-            categorized_errors.append((category, line, col, msg, context))
+        if make_target is None:
+            return None, attempt(errors_only), []
+        try:
+            # A well-formed document is parsed once, checks included
+            return None, [], attempt(elements)
+        except etree.XMLSyntaxError:
+            if unknown_entities is not None:
+                del unknown_entities[:]
+            etree.clear_error_log()
+        attempt(errors_only)
+        return None, [], elements(wrap)
 
-        categorized_errors.sort(key=lambda x: x[1])
-        return None, categorized_errors, None
+    except etree.XMLSyntaxError as e:
+        lines = LineIndex(raw_content) if isinstance(raw_content, str) else raw_content
+        errors = _categorize_parse_errors(e.error_log, lines)
+        return None, errors, recovered_elements(wrap) if recover and make_target is not None else []
 
     except Exception as e:
-        return None, [("CheckSGM", 0, 0, f"Unexpected error: {str(e)}", "N/A")], None
+        return None, [("CheckSGM", 0, 0, f"Unexpected error: {str(e)}", "N/A")], []
@@ -0,0 +1,111 @@
+import os
+import json
+import time
+import cProfile
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+DEFAULT_PROFILE_FILE = "validator_profile.json"
+
+
+class FileProfile:
+    """
+    Per-stage numbers of one validate_file run: wall and CPU seconds, the most
+    memory the stage allocated on top of what was live before it (only while
+    tracemalloc is tracing) and the errors each check reported.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.stages = {}
+
+    def _entry(self, name):
+        entry = self.stages.get(name)
+        if entry is None:
+            entry = self.stages[name] = {"wall": 0.0, "cpu": 0.0, "alloc_bytes": 0, "errors": {}}
+        return entry
+
+    @contextmanager
+    def stage(self, name):
+        entry = self._entry(name)
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            live = tracemalloc.get_traced_memory()[0]
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            entry["wall"] += time.perf_counter() - wall
+            entry["cpu"] += time.process_time() - cpu
+            if tracing:
+                entry["alloc_bytes"] = max(entry["alloc_bytes"], tracemalloc.get_traced_memory()[1] - live)
+
+    def count(self, stage, check, errors):
+        counts = self._entry(stage)["errors"]
+        counts[check] = counts.get(check, 0) + len(errors)
+
+    def as_dict(self):
+        return {
+            "file": self.file_path,
+            "bytes": os.path.getsize(self.file_path),
+            "wall": sum(entry["wall"] for entry in self.stages.values()),
+            "cpu": sum(entry["cpu"] for entry in self.stages.values()),
+            "stages": self.stages,
+        }
+
+
+class _NoProfile:
+    """Stands in for FileProfile when nothing is recorded."""
+
+    def stage(self, name):
+        return nullcontext()
+
+    def count(self, stage, check, errors):
+        pass
+
+
+NO_PROFILE = _NoProfile()
+
+
+def write_profile(path, profiles, cached_files=()):
+    """
+    Writes the FileProfile.as_dict() results, slowest file first, with
+    per-stage totals. Files answered from the result cache are only listed.
+    """
+    profiles = sorted(profiles, key=lambda profile: profile["wall"], reverse=True)
+    totals = {}
+    for profile in profiles:
+        for name, entry in profile["stages"].items():
+            total = totals.setdefault(name, {"wall": 0.0, "cpu": 0.0, "alloc_bytes": 0, "errors": 0})
+            total["wall"] += entry["wall"]
+            total["cpu"] += entry["cpu"]
+            total["alloc_bytes"] = max(total["alloc_bytes"], entry["alloc_bytes"])
+            total["errors"] += sum(entry["errors"].values())
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "totals": totals,
+            "files": profiles,
+            "cached_files": list(cached_files),
+        }, f, indent=2)
+
+
+def dump_cprofile(func, file_paths, out_dir, root=None):
+    """
+    Runs func(file_path) again under cProfile for each file and writes
+    <file name>.pstats into out_dir. Given the folder the files were found in
+    as `root`, the stats go to the same subfolders of out_dir as the files
+    are in under root, so same-named files do not overwrite each other.
+    Returns the written paths.
+    """
+    written = []
+    for file_path in file_paths:
+        profiler = cProfile.Profile()
+        profiler.runcall(func, file_path)
+        name = os.path.basename(file_path) if root is None else os.path.relpath(file_path, root)
+        stats_path = os.path.join(out_dir, name + ".pstats")
+        os.makedirs(os.path.dirname(stats_path), exist_ok=True)
+        profiler.dump_stats(stats_path)
+        written.append(stats_path)
+    return written
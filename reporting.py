@@ -0,0 +1,237 @@
+import sys
+import json
+from collections import Counter
+
+# Sinks hand their output to the stream in pieces of about this many characters
+REPORT_BUFFER_CHARS = 64 * 1024
+
+CATEGORY_COLORS = {
+    "Repent": "\033[91m",
+    "Reptag": "\033[93m",
+    "Reptab": "\033[94m",
+    "CheckSGM": "\033[96m"
+}
+RESET = "\033[0m"
+
+# Context is cut to this many characters on the console
+CONTEXT_CHARS = 120
+
+
+def file_report(filename, errors, max_per_category=None):
+    """
+    Console report of one file's ErrorList, as text pieces: issues grouped by
+    category, at most max_per_category of each (None: all). Only the issues
+    printed get their context read.
+    """
+    if not errors:
+        yield f"✔ {filename}: CLEAN\n\n"
+        return
+
+    yield f"--- {filename}: {len(errors)} ISSUES ---\n\n"
+
+    groups = {}
+    for i, (category, _, _, _) in enumerate(errors.records()):
+        groups.setdefault(category, []).append(i)
+    shown = sorted(i for indexes in groups.values() for i in indexes[:max_per_category])
+    printed = dict(zip(shown, errors.take(shown)))
+
+    for category, indexes in groups.items():
+        color = CATEGORY_COLORS.get(category, "")
+        yield f"{color}{category.upper()} ({len(indexes)}){RESET}\n\n"
+        for i in indexes[:max_per_category]:
+            _, line, page, msg, context = printed[i]
+            more = '...' if len(context) > CONTEXT_CHARS else ''
+            yield f"Page {page}, Line {line}:\n{msg}\nContext: {context[:CONTEXT_CHARS]}{more}\n\n"
+        hidden = len(indexes) - len(indexes[:max_per_category])
+        if hidden:
+            yield f"... {hidden} more {category.upper()} issues not shown\n\n"
+
+
+class _Buffer:
+    """Collects text and writes it to the stream REPORT_BUFFER_CHARS at a time."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._parts = []
+        self._size = 0
+
+    def write(self, text):
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size >= REPORT_BUFFER_CHARS:
+            self.flush()
+
+    def flush(self):
+        if self._parts:
+            self.stream.write("".join(self._parts))
+            self._parts, self._size = [], 0
+        self.stream.flush()
+
+
+class ReportSink:
+    """
+    Takes validate_all_files results one file at a time, as the files are
+    done (file_done), and keeps only the counts; close() ends the report.
+    """
+
+    def __init__(self):
+        self.files = 0
+        self.files_with_errors = 0
+        self.errors = 0
+        self.categories = Counter()
+
+    def file_done(self, filename, errors):
+        self.files += 1
+        self.files_with_errors += bool(errors)
+        self.errors += len(errors)
+        self.categories.update(category for category, _, _, _ in errors.records())
+
+    def close(self):
+        pass
+
+
+class ConsoleReport(ReportSink):
+    """
+    Prints each file's report when the file is done (see file_report) and the
+    scan summary at the end. summary_only=True prints the summary alone.
+    """
+
+    def __init__(self, stream=None, summary_only=False, max_per_category=None):
+        super().__init__()
+        self.out = _Buffer(stream or sys.stdout)
+        self.summary_only = summary_only
+        self.max_per_category = max_per_category
+
+    def file_done(self, filename, errors):
+        super().file_done(filename, errors)
+        if self.summary_only:
+            return
+        if self.files == 1:
+            self.out.write("\n")
+        for text in file_report(filename, errors, self.max_per_category):
+            self.out.write(text)
+        # Shown as soon as the file is done
+        self.out.flush()
+
+    def close(self):
+        out = self.out
+        # File reports already end with a blank line
+        out.write("--- SCAN SUMMARY ---\n" if self.files and not self.summary_only else "\n--- SCAN SUMMARY ---\n")
+        out.write(f"Files Scanned: {self.files}\n")
+        out.write(f"Files with Errors: {self.files_with_errors}\n")
+        out.write(f"Total Issues Found: {self.errors}\n")
+        for category, count in sorted(self.categories.items()):
+            color = CATEGORY_COLORS.get(category, "")
+            out.write(f"{color}{category.upper()}: {count}{RESET}\n")
+        out.write("\n--- VALIDATION COMPLETE ---\n\n")
+        out.flush()
+
+
+class NdjsonReport(ReportSink):
+    """
+    Writes the results as newline-delimited JSON, one object per line:
+      {"type": "error", "file", "category", "line", "page", "message", "context"}
+      {"type": "file", "file", "errors"}      after the errors of each file
+      {"type": "summary", "files", "files_with_errors", "errors"}     at the end
+    """
+
+    def __init__(self, path):
+        super().__init__()
+        self._file = open(path, "w", encoding="utf-8")
+        self.out = _Buffer(self._file)
+
+    def _record(self, record):
+        self.out.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def file_done(self, filename, errors):
+        super().file_done(filename, errors)
+        for category, line, page, msg, context in errors:
+            self._record({"type": "error", "file": filename, "category": category, "line": line,
+                          "page": page, "message": msg, "context": context})
+        self._record({"type": "file", "file": filename, "errors": len(errors)})
+
+    def close(self):
+        self._record({"type": "summary", "files": self.files,
+                      "files_with_errors": self.files_with_errors, "errors": self.errors})
+        self.out.flush()
+        self._file.close()
+
+
+class XlsxReport(ReportSink):
+    """
+    Writes the results to an .xlsx workbook with openpyxl's write-only mode:
+    a Summary sheet (issues per file, then the totals) and one sheet per
+    category with a (File, Page, Line, Message, Context) row per issue. Rows
+    are streamed to disk as each file is done, so memory stays flat however
+    many issues there are; a category past the sheet row limit goes on in
+    "<category> 2", "<category> 3"...
+    """
+
+    MAX_ROWS = 1048576
+    HEADER = ("File", "Page", "Line", "Message", "Context")
+
+    def __init__(self, path):
+        super().__init__()
+        # Only loaded when an .xlsx is asked for
+        from openpyxl import Workbook
+        from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+        self.path = path
+        self._illegal = ILLEGAL_CHARACTERS_RE
+        self.workbook = Workbook(write_only=True)
+        self.summary = self.workbook.create_sheet("Summary")
+        self.summary.append(("File", "Issues"))
+        # category -> [sheet, rows written, sheets used]
+        self._sheets = {}
+
+    def _cell(self, value):
+        """Text Excel accepts in a cell: no control characters, at most 32767 characters."""
+        if isinstance(value, str):
+            return self._illegal.sub("", value)[:32767]
+        return value
+
+    def _sheet(self, category):
+        entry = self._sheets.get(category)
+        if entry is None or entry[1] >= self.MAX_ROWS:
+            used = entry[2] + 1 if entry else 1
+            # Sheet names: at most 31 characters, none of []:*?/\
+            name = "".join("_" if c in "[]:*?/\\" else c for c in category)[:28]
+            sheet = self.workbook.create_sheet(name if used == 1 else f"{name} {used}")
+            sheet.append(self.HEADER)
+            entry = self._sheets[category] = [sheet, 1, used]
+        entry[1] += 1
+        return entry[0]
+
+    def file_done(self, filename, errors):
+        super().file_done(filename, errors)
+        cell = self._cell
+        for category, line, page, msg, context in errors:
+            # Page numbers as numbers, so the sheet sorts and filters on them
+            page = int(page) if page.isdigit() else cell(page)
+            self._sheet(category).append((cell(filename), page, line, cell(msg), cell(context)))
+        self.summary.append((cell(filename), len(errors)))
+
+    def close(self):
+        summary = self.summary
+        summary.append(())
+        summary.append(("Files Scanned", self.files))
+        summary.append(("Files with Errors", self.files_with_errors))
+        summary.append(("Total Issues Found", self.errors))
+        for category, count in sorted(self.categories.items()):
+            summary.append((category, count))
+        self.workbook.save(self.path)
+
+
+class MultiReport(ReportSink):
+    """Hands every result to each of several sinks."""
+
+    def __init__(self, sinks):
+        super().__init__()
+        self.sinks = list(sinks)
+
+    def file_done(self, filename, errors):
+        for sink in self.sinks:
+            sink.file_done(filename, errors)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import sqlite3
+import time
+
+import config
+
+# Bump when a change to the checks themselves, or to the stored rows, alters the results
+CACHE_VERSION = 4
+
+DEFAULT_CACHE_FILE = "validator_cache.sqlite"
+DEFAULT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+READ_BLOCK = 1024 * 1024
+
+
+def config_fingerprint():
+    """
+    Hash of the active Ruleset (see ruleset.Ruleset.fingerprint) and of
+    config.py itself, so any edit to the config, or another rules profile,
+    makes every cached result stale.
+    """
+    # Loaded here, main imports this module before it needs the rules
+    from ruleset import active_ruleset
+    digest = hashlib.sha256(f"v{CACHE_VERSION}".encode())
+    digest.update(active_ruleset().fingerprint.encode("ascii"))
+    try:
+        with open(config.__file__, "rb") as f:
+            digest.update(f.read())
+    except (OSError, TypeError):
+        # Frozen build: no config.py next to the executable, the rules above still count
+        pass
+    return digest.hexdigest()
+
+
+def digest_file(file_path):
+    """SHA-256 of the file's bytes."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(READ_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    On-disk store of validate_file results, keyed by content digest and
+    config_fingerprint(). Once the stored results exceed max_bytes the least
+    recently used ones are evicted. Changes are written by save().
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_FILE, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.fingerprint = config_fingerprint()
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " digest TEXT NOT NULL, fingerprint TEXT NOT NULL, errors TEXT NOT NULL,"
+            " size INTEGER NOT NULL, used REAL NOT NULL,"
+            " PRIMARY KEY (digest, fingerprint))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+        # Results of any other configuration can never be hit again
+        self._db.execute("DELETE FROM results WHERE fingerprint != ?", (self.fingerprint,))
+        self._db.commit()
+
+    def get(self, digest):
+        """Cached ErrorList.rows() for this content, or None."""
+        row = self._db.execute(
+            "SELECT errors FROM results WHERE digest = ? AND fingerprint = ?",
+            (digest, self.fingerprint)
+        ).fetchone()
+        if row is None:
+            return None
+        self._db.execute(
+            "UPDATE results SET used = ? WHERE digest = ? AND fingerprint = ?",
+            (time.time(), digest, self.fingerprint)
+        )
+        return json.loads(row[0])
+
+    def put(self, digest, errors):
+        data = json.dumps(errors, ensure_ascii=False)
+        self._db.execute(
+            "INSERT OR REPLACE INTO results (digest, fingerprint, errors, size, used)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (digest, self.fingerprint, data, len(data), time.time())
+        )
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        stale = []
+        for digest, fingerprint, size in self._db.execute(
+            "SELECT digest, fingerprint, size FROM results ORDER BY used"
+        ):
+            if total <= self.max_bytes:
+                break
+            stale.append((digest, fingerprint))
+            total -= size
+        self._db.executemany("DELETE FROM results WHERE digest = ? AND fingerprint = ?", stale)
+
+    def save(self):
+        self._evict()
+        self._db.commit()
+
+    def close(self):
+        self.save()
+        self._db.close()
@@ -0,0 +1,176 @@
+import logging
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# TAG_RELATIONSHIPS keys the engine enforces; empty values mean "no rule"
+SUPPORTED_KEYS = {"required_parent", "forbidden_parent", "allowed_children"}
+
+# Everything that applies to one tag name, resolved once per name.
+#   required_parent / forbidden_parent:  parent tag or None
+#   allowed_children:   _TagSet the children must match, or None
+#   forbidden_ancestors: tags this one must not be inside (at any depth)
+TagRules = namedtuple("TagRules", "required_parent forbidden_parent allowed_children forbidden_ancestors")
+
+NO_RULES = TagRules(None, None, None, ())
+
+
+class _TagSet:
+    """Tag names and 'prefix*' wildcards, matched in O(1) for exact names."""
+
+    def __init__(self, patterns):
+        self.names = frozenset(p for p in patterns if not p.endswith("*"))
+        self.prefixes = tuple(p[:-1] for p in patterns if p.endswith("*"))
+        self.label = ", ".join(f"<{p}>" for p in patterns)
+
+    def __contains__(self, tag):
+        return tag in self.names or (bool(self.prefixes) and tag.startswith(self.prefixes))
+
+
+class StructureRules:
+    """
+    TAG_RELATIONSHIPS and INVALID_NESTING_RULES compiled into per-tag tables.
+    Rules are looked up once per distinct tag name and cached, so an element
+    whose tag (and parent tag) has no rule costs two dict lookups.
+    Every rule is decided when the element starts (parent and ancestors are
+    known then), so the same check works on a full tree and while streaming.
+    Non-closing tags (<fnt1>, <P20>...) are empty elements once parsed; the
+    siblings after one are its content, not children of the parent.
+    """
+
+    def __init__(self, tag_relationships=None, invalid_nesting_rules=None, non_closing_tags=()):
+        self.non_closing = _TagSet(sorted(non_closing_tags))
+        self._exact = {}
+        self._wildcards = []
+        for key, rules in (tag_relationships or {}).items():
+            unknown = {name for name, value in rules.items() if value and name not in SUPPORTED_KEYS}
+            if unknown:
+                logger.warning(f"Tag rules for <{key}>: {', '.join(sorted(unknown))} not enforced")
+            if key.endswith("*"):
+                self._wildcards.append((key[:-1], rules))
+            else:
+                self._exact[key] = rules
+
+        # INVALID_NESTING_RULES is parent -> tags it must not contain; turned around per child
+        forbidden = {}
+        for ancestor, tags in (invalid_nesting_rules or {}).items():
+            for tag in tags:
+                forbidden.setdefault(tag, []).append(ancestor)
+        self._forbidden_ancestors = {tag: tuple(sorted(ancestors)) for tag, ancestors in forbidden.items()}
+
+        self._cache = {}
+
+    def _compile(self, tag):
+        # Exact entry first, then matching wildcards; the first value found wins
+        matching = [self._exact[tag]] if tag in self._exact else []
+        matching.extend(rules for prefix, rules in self._wildcards if tag.startswith(prefix))
+
+        def first(name):
+            for rules in matching:
+                if rules.get(name):
+                    return rules[name]
+            return None
+
+        allowed = first("allowed_children")
+        compiled = TagRules(
+            first("required_parent"),
+            first("forbidden_parent"),
+            _TagSet(allowed) if allowed else None,
+            self._forbidden_ancestors.get(tag, ()),
+        )
+        return NO_RULES if compiled == NO_RULES else compiled
+
+    def rules_for(self, tag):
+        rules = self._cache.get(tag)
+        if rules is None:
+            rules = self._cache[tag] = self._compile(tag)
+        return rules
+
+    def start_document(self):
+        """Checker for one document, elements given in document order."""
+        return DocumentRules(self)
+
+
+class DocumentRules:
+    """
+    StructureRules applied to one document; remembers the last non-closing child seen.
+    Elements come as start/end events, from parser events or from a walk over
+    a tree (tag_checker.validate_tags), in document order.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        # Parent whose later children belong to a non-closing sibling
+        self._marked_parent = None
+        # Tags of the open elements and a number telling them apart
+        self._open_tags = []
+        self._open_ids = []
+        self._started = 0
+        # tag -> depths where it is open (innermost last), so an ancestor
+        # lookup costs one dict lookup per forbidden tag, whatever the depth
+        self._open_depths = {}
+
+    def start(self, tag, line, col):
+        """(category, line, col, message) errors of an element starting; end() closes it."""
+        open_tags = self._open_tags
+        open_depths = self._open_depths
+
+        def ancestor(tags):
+            # Innermost of the open ones
+            nearest, nearest_depth = None, -1
+            for ancestor_tag in tags:
+                depths = open_depths.get(ancestor_tag)
+                if depths and depths[-1] > nearest_depth:
+                    nearest, nearest_depth = ancestor_tag, depths[-1]
+            return nearest
+
+        if open_tags:
+            errors = self._check(tag, self._open_ids[-1], open_tags[-1], ancestor, line, col)
+        else:
+            errors = self._check(tag, None, None, ancestor, line, col)
+        self._started += 1
+        open_depths.setdefault(tag, []).append(len(open_tags))
+        open_tags.append(tag)
+        self._open_ids.append(self._started)
+        return errors
+
+    def end(self):
+        self._open_depths[self._open_tags.pop()].pop()
+        self._open_ids.pop()
+
+    def _check(self, tag, parent, parent_tag, ancestor, line, col):
+        # parent: anything telling the parent element apart, None at the root
+        rules_for = self.rules.rules_for
+        rules = rules_for(tag)
+        parent_rules = rules_for(parent_tag) if parent_tag is not None else NO_RULES
+        if rules is NO_RULES and parent_rules.allowed_children is None:
+            return []
+
+        errors = []
+        if rules.required_parent is not None and parent_tag != rules.required_parent:
+            errors.append((
+                "Reptag", line, col,
+                f"<{tag}> must be inside <{rules.required_parent}> tags (found outside)"
+            ))
+        if rules.forbidden_parent is not None and parent_tag == rules.forbidden_parent:
+            errors.append((
+                "Reptag", line, col,
+                f"<{tag}> must not be inside <{parent_tag}>"
+            ))
+        allowed = parent_rules.allowed_children
+        if allowed is not None:
+            if tag in self.rules.non_closing:
+                self._marked_parent = parent
+            elif tag not in allowed and parent != self._marked_parent:
+                errors.append((
+                    "Reptag", line, col,
+                    f"Only {allowed.label} tags allowed inside <{parent_tag}>, found <{tag}>"
+                ))
+        if rules.forbidden_ancestors:
+            ancestor_tag = ancestor(rules.forbidden_ancestors)
+            if ancestor_tag is not None:
+                errors.append((
+                    "Reptag", line, col,
+                    f"Invalid nesting: <{tag}> should not be inside <{ancestor_tag}>"
+                ))
+        return errors
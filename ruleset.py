@@ -0,0 +1,183 @@
+import re
+import json
+import hashlib
+from functools import lru_cache
+from itertools import product
+from types import MappingProxyType
+import config
+from entity_checker import DEFAULT_ENTITIES
+from rule_engine import StructureRules
+
+# Layout tags: a prefix and one or two numbers, each 0 or even up to 20.
+# One number, or two single-digit ones run together (P24 = 2 and 4), or two
+# written with a comma (B10,12), which two-digit numbers need
+LAYOUT_PREFIXES = ("P", "B", "HN")
+LAYOUT_VALUES = range(0, 21, 2)
+
+# Removed before any check runs
+ROOT_TAG_PATTERN = re.compile(r"<\s*/?\s*root\s*>", re.IGNORECASE)
+SPAGE_TAG_PATTERN = re.compile(r"<\s*SPage\b[^>]*>", re.IGNORECASE)
+
+# Cleaner rewrites besides the layout markers (see parser.preprocess_file_content)
+NON_CLOSING_TAG_PREFIXES = ("fnt", "fnr")
+HEAD_FOOT_MARKERS = ("****HEADNOTE****", "****FOOTNOTE****")
+
+# Profile file keys and the config setting each one replaces
+PROFILE_KEYS = {
+    "supported_tags": "SUPPORTED_TAGS",
+    "non_closing_tags": "NON_CLOSING_TAGS",
+    "balanced_tags": "BALANCED_TAGS",
+    "custom_entities": "CUSTOM_ENTITIES",
+    "layout_tags": "LAYOUT_TAGS",
+    "tag_relationships": "TAG_RELATIONSHIPS",
+    "invalid_nesting_rules": "INVALID_NESTING_RULES",
+}
+
+
+def layout_tag_names():
+    """Every tag name the layout grammar accepts, in each way it can be written."""
+    def spellings(value):
+        return [str(value), f"0{value}"] if value < 10 else [str(value)]
+
+    names = set()
+    for prefix in LAYOUT_PREFIXES:
+        for first in LAYOUT_VALUES:
+            if first < 10:
+                names.add(f"{prefix}{first}")
+            for second in LAYOUT_VALUES:
+                if first < 10 and second < 10:
+                    names.add(f"{prefix}{first}{second}")
+                for a, b in product(spellings(first), spellings(second)):
+                    names.add(f"{prefix}{a},{b}")
+    return frozenset(names)
+
+
+def compile_preprocess_pattern(layout_markers):
+    """
+    All cleaner rewrites in one alternation, applied to the whole buffer at once:
+      <Page N>             -> <Page/>
+      <SPage ...>          -> removed
+      <P20 ...>, <CN>, ... -> <P20 .../>     (the layout markers)
+      <fnt1>, <fnr*>, ...  -> <fnt/>, <fnr/>
+      <****HEADNOTE****>   -> removed
+    """
+    # Whitespace / tag body that stays within one line of the joined buffer
+    ws = r"[^\S\n]"
+    body = r"[^>\n]"
+    markers = "|".join(re.escape(tag) for tag in sorted(layout_markers, key=lambda t: (-len(t), t)))
+    return re.compile(
+        rf"(?P<page>(?i:<{ws}*Page{ws}+\d+{ws}*>))"
+        rf"|(?i:<{ws}*SPage\b{body}*>)"
+        rf"|<{ws}*(?P<layout>{markers})(?P<layout_attrs>{ws}{body}*)?>"
+        rf"|<{ws}*(?P<dynamic>{'|'.join(NON_CLOSING_TAG_PREFIXES)})[^/>\n]*(?P<dynamic_attrs>{ws}{body}*)?>"
+        rf"|<{ws}*(?:{'|'.join(re.escape(m) for m in HEAD_FOOT_MARKERS)})(?:{ws}{body}*)?>"
+    )
+
+
+def _frozen(value):
+    """Read-only copy of profile/config data: sets and lists become frozensets/tuples."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _frozen(item) for key, item in value.items()})
+    if isinstance(value, (set, frozenset)):
+        return frozenset(value)
+    if isinstance(value, list):
+        return tuple(_frozen(item) for item in value)
+    return value
+
+
+def _canonical(value):
+    """JSON-ready form with a stable order, for the fingerprint."""
+    if isinstance(value, (set, frozenset)):
+        return sorted(_canonical(item) for item in value)
+    if isinstance(value, (dict, MappingProxyType)):
+        return {key: _canonical(value[key]) for key in sorted(value)}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    return value
+
+
+class Ruleset:
+    """
+    Everything the checks know about tags and entities, built once (see
+    load_ruleset) from config.py, with the settings of a JSON profile file
+    on top if one is given (keys: PROFILE_KEYS; missing ones keep config).
+    Immutable: sets are frozensets, rule tables read-only mappings.
+      layout_tags:  the layout markers plus every name of the layout grammar,
+                    so a layout check is one set lookup
+      allowed_tags: supported_tags | layout_tags, what every tag check accepts
+      preprocess_pattern, root_tag_pattern, spage_tag_pattern: the compiled rewrites
+      structure:    the StructureRules of tag_relationships/invalid_nesting_rules
+      fingerprint:  hash of the rules, for the result cache
+    """
+
+    __slots__ = ("source", "supported_tags", "non_closing_tags", "balanced_tags", "custom_entities",
+                 "allowed_entities", "layout_markers", "layout_tags", "allowed_tags", "tag_relationships",
+                 "invalid_nesting_rules", "structure", "preprocess_pattern", "root_tag_pattern",
+                 "spage_tag_pattern", "fingerprint")
+
+    def __init__(self, profile_path=None):
+        settings = {key: getattr(config, name) for key, name in PROFILE_KEYS.items()}
+        if profile_path is not None:
+            with open(profile_path, "r", encoding="utf-8") as f:
+                profile = json.load(f)
+            if not isinstance(profile, dict):
+                raise ValueError(f"{profile_path}: a JSON object of rule settings is expected")
+            unknown = set(profile) - set(PROFILE_KEYS)
+            if unknown:
+                raise ValueError(f"{profile_path}: unknown settings {', '.join(sorted(unknown))}")
+            settings.update(profile)
+
+        def freeze(name, value):
+            object.__setattr__(self, name, value)
+
+        freeze("source", profile_path)
+        freeze("supported_tags", frozenset(settings["supported_tags"]))
+        freeze("non_closing_tags", frozenset(settings["non_closing_tags"]))
+        freeze("balanced_tags", frozenset(settings["balanced_tags"]))
+        freeze("custom_entities", frozenset(settings["custom_entities"]))
+        freeze("allowed_entities", DEFAULT_ENTITIES | self.custom_entities)
+        freeze("layout_markers", frozenset(settings["layout_tags"]))
+        freeze("layout_tags", self.layout_markers | layout_tag_names())
+        freeze("allowed_tags", self.supported_tags | self.layout_tags)
+        freeze("tag_relationships", _frozen(settings["tag_relationships"]))
+        freeze("invalid_nesting_rules", _frozen(settings["invalid_nesting_rules"]))
+        freeze("structure", StructureRules(self.tag_relationships, self.invalid_nesting_rules,
+                                           self.non_closing_tags))
+        freeze("preprocess_pattern", compile_preprocess_pattern(self.layout_markers))
+        freeze("root_tag_pattern", ROOT_TAG_PATTERN)
+        freeze("spage_tag_pattern", SPAGE_TAG_PATTERN)
+        rules = {key: _canonical(settings[key]) for key in PROFILE_KEYS}
+        freeze("fingerprint", hashlib.sha256(json.dumps(rules).encode("utf-8")).hexdigest())
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Ruleset is immutable")
+
+    def __reduce__(self):
+        # Rebuilt (once per process) from the same source on the other side
+        return load_ruleset, (self.source,)
+
+    def __repr__(self):
+        return f"<Ruleset {self.source or 'config'}: {len(self.supported_tags)} tags>"
+
+
+@lru_cache(maxsize=None)
+def load_ruleset(profile_path=None):
+    """The Ruleset of config.py (None) or of a profile file, built once per process."""
+    return Ruleset(profile_path)
+
+
+_active = None
+
+
+def active_ruleset():
+    """The Ruleset every check uses: config.py's unless use_ruleset() chose another."""
+    if _active is None:
+        return load_ruleset(None)
+    return _active
+
+
+def use_ruleset(profile_path=None):
+    """Makes the Ruleset of this profile file (None: config.py) the active one and returns it."""
+    global _active
+    _active = load_ruleset(profile_path)
+    return _active
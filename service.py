@@ -0,0 +1,301 @@
+import os
+import json
+import stat
+import time
+import socket
+import logging
+import tempfile
+import threading
+import http.client
+import socketserver
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from validator import validate_all_files
+from ruleset import active_ruleset, use_ruleset
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8765
+# Jobs waiting or running at once; more are turned away with 503 until one is done
+DEFAULT_MAX_QUEUE = 64
+
+# Host headers accepted on a port (DNS rebinding: a web page's request names its own host)
+LOCAL_HOSTS = ("127.0.0.1", "localhost", "[::1]")
+
+# Validated by every worker when it starts, so the first real job finds the
+# modules imported, the patterns compiled and the tag rule cache filled
+WARM_UP_DOCUMENT = (
+    "<Page 1>\n<root><HN1>Heading &amp; &sect;</HN1>\n<P>Text <EMB>x</EMB> &bogus;</P>\n"
+    "<TABLE><TR><TD>a  b</TD></TR></TABLE>\n<fnt1>note\n</root>\n"
+)
+
+
+def _rendered(results):
+    """{filename: [[category, line, page, message, context], ...]} of validate_all_files results."""
+    return {filename: [list(error) for error in errors] for filename, errors in results.items()}
+
+
+def check_job(job, root):
+    """
+    Checks a validate request (see run_job) before it is queued: ValueError
+    for malformed fields, PermissionError for a path outside `root` (the
+    folder the service may read). Returns the job with "path" made absolute.
+    """
+    if not isinstance(job, dict) or ("path" in job) == ("content" in job):
+        raise ValueError('give either "path" or "content"')
+    if "content" in job:
+        if not isinstance(job["content"], str):
+            raise ValueError('"content" must be a string')
+        name = job.get("name")
+        if name is not None and (not isinstance(name, str) or name in ("", ".", "..")
+                                 or any(c in name for c in "/\\\0")):
+            raise ValueError('"name" must be a plain file name')
+    else:
+        if not isinstance(job["path"], str) or "\0" in job["path"]:
+            raise ValueError('"path" must be a string')
+        files = job.get("files")
+        if files is not None and (not isinstance(files, list)
+                                  or not all(isinstance(f, str) and "\0" not in f for f in files)):
+            raise ValueError('"files" must be a list of file names')
+    for option in ("stream_parse", "recover"):
+        if job.get(option) is not None and not isinstance(job[option], bool):
+            raise ValueError(f'"{option}" must be true or false')
+    max_errors = job.get("max_errors")
+    if max_errors is not None and (isinstance(max_errors, bool) or not isinstance(max_errors, int)
+                                   or max_errors < 1):
+        raise ValueError('"max_errors" must be a positive number')
+
+    if "path" not in job:
+        return job
+    root = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(root, os.path.expanduser(job["path"])))
+    targets = [path] + [os.path.realpath(os.path.join(path, f)) for f in job.get("files") or ()]
+    for target in targets:
+        if os.path.commonpath((root, target)) != root:
+            raise PermissionError(f"'{target}' is outside {root}")
+    return dict(job, path=path)
+
+
+def run_job(job):
+    """
+    One validate request, in a worker:
+      {"path": file or folder, "files": [names in the folder]}  -> validate_all_files
+      {"content": text, "name": "x.fnt"}                       -> the text as a file of that name
+    plus the validate_all_files options "stream_parse", "recover" and "max_errors".
+    Returns the rendered results (see _rendered).
+    """
+    options = {name: job[name] for name in ("stream_parse", "recover", "max_errors") if name in job}
+    if "content" in job:
+        name = os.path.basename(job.get("name") or "inline.fnt")
+        with tempfile.TemporaryDirectory(prefix="validator-") as folder:
+            with open(os.path.join(folder, name), "w", encoding="utf-8", newline="") as f:
+                f.write(job["content"])
+            # Rendered before the file goes, the contexts are read from it
+            return _rendered(validate_all_files(folder, [name], **options))
+
+    path = os.path.abspath(os.path.expanduser(job["path"]))
+    if os.path.isfile(path):
+        return _rendered(validate_all_files(os.path.dirname(path), [os.path.basename(path)], **options))
+    if os.path.isdir(path):
+        return _rendered(validate_all_files(path, job.get("files"), **options))
+    raise FileNotFoundError(f"'{path}' does not exist")
+
+
+def _warm_up(rules_source=None):
+    # A process worker starts with config.py's rules, the service's are loaded again here
+    use_ruleset(rules_source)
+    try:
+        run_job({"content": WARM_UP_DOCUMENT})
+    except Exception as e:
+        logger.warning(f"Worker warm-up failed: {e}")
+
+
+class QueueFull(Exception):
+    pass
+
+
+class ValidationService:
+    """
+    Runs validate jobs (see run_job) on workers kept alive between requests:
+    one thread for jobs=1, else a pool of `jobs` processes. At most max_queue
+    jobs are taken at once, waiting ones included.
+    """
+
+    def __init__(self, jobs=1, max_queue=DEFAULT_MAX_QUEUE):
+        if jobs == 0:
+            jobs = os.cpu_count() or 1
+        initargs = (active_ruleset().source,)
+        if jobs <= 1:
+            self.executor = ThreadPoolExecutor(1, initializer=_warm_up, initargs=initargs)
+        else:
+            self.executor = ProcessPoolExecutor(jobs, initializer=_warm_up, initargs=initargs)
+        self.max_queue = max_queue
+        self._slots = threading.BoundedSemaphore(max_queue)
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.done = 0
+        # Starts the worker(s) now rather than on the first request
+        self.executor.submit(len, ()).result()
+
+    def validate(self, job):
+        """Runs one job and returns its result; QueueFull when max_queue jobs are already in."""
+        if not self._slots.acquire(blocking=False):
+            raise QueueFull(f"{self.max_queue} jobs already queued")
+        with self._lock:
+            self.queued += 1
+        try:
+            return self.executor.submit(run_job, job).result()
+        finally:
+            with self._lock:
+                self.queued -= 1
+                self.done += 1
+            self._slots.release()
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+
+class ValidatorRequestHandler(BaseHTTPRequestHandler):
+    """
+    JSON over HTTP:
+      POST /validate  body: a run_job request  ->  {"results", "files", "errors", "ms"}
+      GET  /health                             ->  {"status", "queued", "done"}
+    Errors come back as {"error": message} with 400 (bad request, see
+    check_job), 403 (path outside the served root, or a Host other than
+    localhost), 404 (no such path), 415 (body not sent as application/json),
+    503 (queue full, try again) or 500.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def _send(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if status == 503:
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _local_host(self):
+        """False for a Host header naming anything but this machine (see LOCAL_HOSTS)."""
+        host = self.headers.get("Host", "")
+        if host.startswith("["):
+            host = host[:host.find("]") + 1]
+        else:
+            host = host.rsplit(":", 1)[0]
+        return host in LOCAL_HOSTS
+
+    def do_GET(self):
+        if not self._local_host():
+            return self._send(403, {"error": "Only local requests are served"})
+        if self.path != "/health":
+            return self._send(404, {"error": f"No such endpoint: {self.path}"})
+        service = self.server.service
+        self._send(200, {"status": "ok", "queued": service.queued, "done": service.done})
+
+    def do_POST(self):
+        if not self._local_host():
+            return self._send(403, {"error": "Only local requests are served"})
+        if self.path != "/validate":
+            return self._send(404, {"error": f"No such endpoint: {self.path}"})
+        # A browser cannot send application/json to another origin without asking first
+        content_type = self.headers.get("Content-Type", "").split(";", 1)[0].strip().lower()
+        if content_type != "application/json":
+            return self._send(415, {"error": "Send the job as application/json"})
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            job = check_job(json.loads(self.rfile.read(length) or b"{}"), self.server.root)
+        except PermissionError as e:
+            return self._send(403, {"error": str(e)})
+        except ValueError as e:
+            return self._send(400, {"error": f"Bad request: {e}"})
+
+        start = time.perf_counter()
+        try:
+            results = self.server.service.validate(job)
+        except QueueFull as e:
+            return self._send(503, {"error": str(e)})
+        except FileNotFoundError as e:
+            return self._send(404, {"error": str(e)})
+        except Exception as e:
+            logger.exception("Validate job failed")
+            return self._send(500, {"error": f"Unexpected error: {e}"})
+        self._send(200, {
+            "results": results,
+            "files": len(results),
+            "errors": sum(len(errors) for errors in results.values()),
+            "ms": round((time.perf_counter() - start) * 1000, 2),
+        })
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else "unix socket"
+
+    def log_message(self, format, *args):
+        logger.info(f"{self.address_string()} {format % args}")
+
+
+if hasattr(socketserver, "UnixStreamServer"):
+    class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+else:
+    # No Unix sockets on this platform (Windows)
+    UnixHTTPServer = None
+
+
+def serve(jobs=1, port=DEFAULT_PORT, socket_path=None, max_queue=DEFAULT_MAX_QUEUE, ready=None,
+          root=None):
+    """
+    Serves validate jobs on localhost:port, or on a Unix socket at
+    socket_path (only the user running it can connect), until interrupted.
+    Jobs may only name paths under `root` (default: the current folder);
+    relative paths are taken from it. ready(address) is called once listening.
+    """
+    if socket_path and UnixHTTPServer is None:
+        raise OSError("Unix sockets are not supported here, use a port")
+    service = ValidationService(jobs, max_queue)
+    if socket_path:
+        # A socket file left behind by an earlier run
+        if os.path.exists(socket_path) and stat.S_ISSOCK(os.stat(socket_path).st_mode):
+            os.unlink(socket_path)
+        server = UnixHTTPServer(socket_path, ValidatorRequestHandler)
+        os.chmod(socket_path, 0o600)
+        address = socket_path
+    else:
+        server = ThreadingHTTPServer(("127.0.0.1", port), ValidatorRequestHandler)
+        address = f"http://127.0.0.1:{server.server_address[1]}"
+    server.service = service
+    server.root = os.path.realpath(os.path.expanduser(root or os.getcwd()))
+    try:
+        if ready is not None:
+            ready(address)
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if socket_path and os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def request(job, port=DEFAULT_PORT, socket_path=None, timeout=None):
+    """
+    Sends one validate job to a running service and returns its JSON answer;
+    errors come back as {"error": ...} like the service sends them.
+    """
+    if socket_path:
+        connection = http.client.HTTPConnection("localhost", timeout=timeout)
+        connection.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.sock.settimeout(timeout)
+        connection.sock.connect(socket_path)
+    else:
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    try:
+        body = json.dumps(job).encode("utf-8")
+        connection.request("POST", "/validate", body, {"Content-Type": "application/json"})
+        return json.loads(connection.getresponse().read())
+    finally:
+        connection.close()
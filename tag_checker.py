@@ -1,159 +1,16 @@
 from lxml import etree
 from entity_checker import check_entities
-from config import SUPPORTED_TAGS, NON_CLOSING_TAGS, TAG_RELATIONSHIPS, BALANCED_TAGS,INVALID_NESTING_RULES
 from lxml.etree import _Element
+from lexer import Consumer, TAG, PAGE, is_strict_tag, scan
+from ruleset import active_ruleset
 import logging
 import re
+from array import array
 
 logger = logging.getLogger(__name__)
 
-def is_valid_layout_tag(tag):
-    """
-    Validates layout tags like P24, B10, HN2, P2, P2,10, B10,12, etc.
-    Rules:
-    - Tag starts with P, B, or HN
-    - Contains 1 or 2 numbers, each must be multiple of 2 (2–20)
-    - If either number is two-digit, comma is required
-    - If single combined (e.g., P24), split into digits
-    """
-    match = re.match(r'^(P|B|HN)(\d{1,2})(?:,(\d{1,2}))?$', tag)
-    if not match:
-        return False
-
-    prefix, first, second = match.group(1), match.group(2), match.group(3)
-
-    try:
-        # If comma present
-        if second is not None:
-            first_val = int(first)
-            second_val = int(second)
-        else:
-            # If only one number present
-            if len(first) == 2:
-                first_val = int(first[0])
-                second_val = int(first[1])
-            else:
-                first_val = int(first)
-                second_val = None
-    except ValueError:
-        return False
-
-    # Helper: check if number is valid multiple of 2 up to 20
-    is_valid = lambda x: x in range(2, 21, 2)
-
-    if not is_valid(first_val):
-        return False
-
-    if second_val is not None and not is_valid(second_val):
-        return False
-
-    # If either value is two-digit, comma must be present
-    if second_val is not None and (first_val >= 10 or second_val >= 10) and second is None:
-        return False
-
-    return True
-
-
-
-def validate_tags(tree, allowed_tags=None, non_closing_tags=None, line_mapping=None):
-    errors = []
-    if tree is None:
-        return errors
-
-    root = tree.getroot()
-
-    def is_fnt_variant(tag):
-        tag_lower = tag.lower()
-        return (tag_lower.startswith('fnt') and 
-                (tag_lower in {'fnt', 'fnt*'} or 
-                 tag_lower[3:].isdigit()))
-
-    def is_non_closing(tag):
-        tag_lower = tag.lower()
-        non_closing_tags_lower = {t.lower() for t in (non_closing_tags or NON_CLOSING_TAGS)}
-        return any(
-            tag_lower == base_tag.lower() or
-            (base_tag.endswith('*') and tag_lower.startswith(base_tag.rstrip('*').lower())) or
-            (base_tag[:-1].isdigit() and tag_lower == base_tag.lower()[:-1])
-            for base_tag in non_closing_tags_lower
-        )
-
-    for elem in root.iter():
-        tag = elem.tag
-        parent = elem.getparent()
-        parent_tag = parent.tag if parent is not None else None
-
-        line = elem.sourceline or 0
-        col = getattr(elem, "sourcepos", 0)
-        orig_line = line_mapping.get(line, line) if line_mapping else line
-
-        if allowed_tags and tag not in allowed_tags and not is_valid_layout_tag(tag):
-
-            errors.append((
-                "Reptag",
-                orig_line,
-                col,
-                f"Unsupported tag <{tag}> found"
-            ))
-
-        if is_fnt_variant(tag) and parent_tag != 'FN':
-            errors.append((
-                "Reptag",
-                orig_line,
-                col,
-                f"<{tag}> must be inside <FN> tags (found outside)"
-            ))
-
-        if is_fnt_variant(tag) and elem.tail and '</' + tag.lower() + '>' in elem.tail.lower():
-            errors.append((
-                "Reptag",
-                orig_line,
-                col,
-                f"<{tag}> is a non-closing tag (do not use </{tag}>)"
-            ))
-
-        if parent_tag == 'FN' and not is_fnt_variant(tag) and tag.lower() != 'fn':
-            errors.append((
-                "Reptag",
-                orig_line,
-                col,
-                f"Only <fnt*> tags allowed inside <FN>, found <{tag}>"
-            ))
-
-        # Custom rule: EMB/EMS/EMU must not contain EM, EMB, EMS, or EMU
-        if parent_tag in INVALID_NESTING_RULES and tag in INVALID_NESTING_RULES[parent_tag]:
-            errors.append((
-                "Reptag",
-                orig_line,
-                col,
-                f"Invalid nesting: <{tag}> should not be inside <{parent_tag}>"
-            ))
-
-    fn_stack = []
-    for event, elem in etree.iterwalk(tree, events=("start", "end")):
-        tag = elem.tag
-        line = elem.sourceline or 0
-        col = getattr(elem, "sourcepos", 0)
-        orig_line = line_mapping.get(line, line) if line_mapping else line
-
-        if event == "start":
-            if tag == 'FN':
-                fn_stack.append((elem, orig_line, col))
-        elif event == "end":
-            if tag == 'FN' and fn_stack:
-                fn_elem, fn_line, fn_col = fn_stack.pop()
-                if any(not is_fnt_variant(child.tag) for child in fn_elem):
-                    errors.append((
-                        "Reptag",
-                        orig_line,
-                        col,
-                        f"<FN> contains invalid child elements"
-                    ))
-
-    return errors
-
-
-
+# Structural rules: active_ruleset().structure (a StructureRules compiled
+# once), start_document() for each document checked
 
 def check_tag_balancing(file_content):
     """
@@ -166,6 +23,7 @@ def check_tag_balancing(file_content):
     stack = []
     errors = []
     lines = file_content.splitlines()
+    balanced_tags = active_ruleset().balanced_tags
     
     # Match tags, including self-closing and ignoring attributes
     tag_pattern = re.compile(r'<(/?)([A-Za-z][A-Za-z0-9]*)(?:\s+[^>]*?)?(/?)\s*>')
@@ -178,7 +36,7 @@ def check_tag_balancing(file_content):
             col = match.start() + 1  # 1-based column position
             
             # Skip non-balanced tags and self-closing tags
-            if tag_name not in BALANCED_TAGS or is_self_closing:
+            if tag_name not in balanced_tags or is_self_closing:
                 continue
                 
             if not is_closing:
@@ -222,143 +80,256 @@ def check_tag_balancing(file_content):
     
     return errors
 
+def check_element(elem, allowed_tags=None, line_mapping=None, structure=None):
+    """
+    Element-level rules of validate_tags for one element (TagRulesTarget applies
+    the same rules while streaming).
+    `structure` is the Ruleset.structure.start_document() of the document, if
+    the structural rules should be checked; elements must come in document order
+    and structure.end() be called once an element's children are done (see validate_tags).
+    """
+    errors = []
+    tag = elem.tag
+
+    line = elem.sourceline or 0
+    col = getattr(elem, "sourcepos", 0)
+    orig_line = line_mapping.get(line, line) if line_mapping else line
+
+    if allowed_tags and tag not in allowed_tags:
+        errors.append((
+            "Reptag",
+            orig_line,
+            col,
+            f"Unsupported tag <{tag}> found"
+        ))
+
+    # Structural rules from config (parents, children, nesting)
+    if structure is not None:
+        errors.extend(structure.start(tag, orig_line, col))
+
+    return errors
+
 def validate_tags(tree, allowed_tags=None, non_closing_tags=None, line_mapping=None):
-    """Validate tags while considering balancing"""
+    """
+    Validate tags: check_element rules, including the structural ones, in one walk
+    over the parsed tree.
+    A parsed tree is balanced by construction, so there is no balancing pass
+    over the serialized tree; unbalanced source already fails to parse and
+    is reported by the parser and NestingConsumer.
+    Only elements are visited (processing instructions are not tags), and
+    they go through the structural rules as start/end events, the same as
+    when streaming: ancestors are looked up in the open tags, not walked up to.
+    """
     errors = []
     if tree is None:
         return errors
 
-    root = tree.getroot()
-    
-    # First get balancing errors from the raw content
-    raw_content = etree.tostring(tree, encoding='unicode')
-    balance_errors = check_tag_balancing(raw_content)
-    errors.extend(balance_errors)
-    
-    # Then check other tag validation rules
-    for elem in root.iter():
-        tag = elem.tag
-        parent = elem.getparent()
-        parent_tag = parent.tag if parent is not None else None
-
-        line = elem.sourceline or 0
-        col = getattr(elem, "sourcepos", 0)
-        orig_line = line_mapping.get(line, line) if line_mapping else line
-
-        # Skip if this was already reported as a balance error
-        if any(e[1] == orig_line and e[2] == col for e in balance_errors):
-            continue
-
-        # Other validation checks...
-        if allowed_tags and tag not in allowed_tags:
-            errors.append((
-                "Reptag",
-                orig_line,
-                col,
-                f"Unsupported tag <{tag}> found"
-            ))
-
-        # Add other validation rules as needed...
-    
+    structure = active_ruleset().structure.start_document()
+    for event, elem in etree.iterwalk(tree.getroot(), events=("start", "end"), tag=etree.Element):
+        if event == "start":
+            errors.extend(check_element(elem, allowed_tags, line_mapping, structure))
+        else:
+            structure.end()
+
     return errors
 
 
-def check_tag_nesting(file_content):
-    errors = []
-    stack = []
-    lines = file_content.splitlines()
-    tag_pattern = re.compile(r'<(/?)([a-zA-Z0-9]+)[^>]*>')
+class TagRulesTarget:
+    """
+    lxml parser target running the check_element rules without a tree: the
+    parser calls start()/end() and only the stack of open tags is kept, so
+    memory does not grow with the document. Text is not asked for (no data()).
+    Whoever feeds the parser keeps `line` at the line being fed, see
+    parser.parse_xml_streaming; close() returns the errors.
+    """
 
-    for line_num, line in enumerate(lines, 1):
-        for match in tag_pattern.finditer(line):
-            is_closing = match.group(1) == '/'
-            tag = match.group(2)
-            col = match.start() + 1
+    def __init__(self, allowed_tags=None, structure=None):
+        self.allowed_tags = allowed_tags
+        self.structure = structure if structure is not None else active_ruleset().structure.start_document()
+        self.line = 0
+        self.errors = []
 
-            if tag not in BALANCED_TAGS:
-                continue
+    def start(self, tag, attrib):
+        # Same errors, same order as check_element (lxml gives no column either)
+        if self.allowed_tags and tag not in self.allowed_tags:
+            self.errors.append(("Reptag", self.line, 0, f"Unsupported tag <{tag}> found"))
+        self.errors.extend(self.structure.start(tag, self.line, 0))
 
-            if not is_closing:
-                # Check for invalid parent-child relationship
-                if stack:
-                    parent_tag = stack[-1][0]
-                    if (parent_tag in INVALID_NESTING_RULES and 
-                        tag in INVALID_NESTING_RULES[parent_tag]):
-                        errors.append((
-                            "Reptag", line_num, col,
-                            f"Invalid nesting: <{tag}> should not be inside <{parent_tag}>"
-                        ))
-                        # Don't push invalid nesting to stack
-                        continue
-                stack.append((tag, line_num, col))
-            else:
-                if not stack:
-                    errors.append(("Reptag", line_num, col, f"Unexpected closing tag </{tag}>"))
-                    continue
-                
-                # Find the most recent matching opening tag in the stack
-                found = False
-                for i in range(len(stack)-1, -1, -1):
-                    if stack[i][0] == tag:
-                        # Found matching opening tag
-                        found = True
-                        # Remove this item and any unclosed tags after it
-                        stack = stack[:i]
-                        break
-                
-                if not found:
-                    errors.append((
+    def end(self, tag):
+        self.structure.end()
+
+    def close(self):
+        return self.errors
+
+
+class NestingConsumer(Consumer):
+    """
+    Checks balanced_tags open/close pairing and invalid_nesting_rules (of
+    the active Ruleset) with a tag stack.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.stack = []
+        rules = active_ruleset()
+        self.balanced_tags = rules.balanced_tags
+        self.invalid_nesting_rules = rules.invalid_nesting_rules
+
+    def handlers(self):
+        return {TAG: self.on_tag}
+
+    def on_tag(self, tok):
+        # <(/?)([a-zA-Z0-9]+)[^>]*>
+        if tok.lead or tok.mid or tok.name[0] == '_' or not self.take(tok):
+            return
+        is_closing = tok.closing
+        tag = tok.name.split('_', 1)[0]
+        line_num = tok.line
+        col = tok.pos + 1
+
+        if tag not in self.balanced_tags:
+            return
+
+        stack = self.stack
+        if not is_closing:
+            # Check for invalid parent-child relationship
+            if stack:
+                parent_tag = stack[-1][0]
+                invalid = self.invalid_nesting_rules.get(parent_tag)
+                if invalid is not None and tag in invalid:
+                    self.errors.append((
                         "Reptag", line_num, col,
-                        f"Mismatched nesting: found </{tag}> but no matching opening tag"
+                        f"Invalid nesting: <{tag}> should not be inside <{parent_tag}>"
                     ))
+                    # Don't push invalid nesting to stack
+                    return
+            stack.append((tag, line_num, col))
+        else:
+            if not stack:
+                self.errors.append(("Reptag", line_num, col, f"Unexpected closing tag </{tag}>"))
+                return
+
+            # Find the most recent matching opening tag in the stack
+            found = False
+            for i in range(len(stack)-1, -1, -1):
+                if stack[i][0] == tag:
+                    # Found matching opening tag
+                    found = True
+                    # Remove this item and any unclosed tags after it
+                    del stack[i:]
+                    break
+
+            if not found:
+                self.errors.append((
+                    "Reptag", line_num, col,
+                    f"Mismatched nesting: found </{tag}> but no matching opening tag"
+                ))
+
+    def finish(self):
+        for unclosed_tag, line_num, col in self.stack:
+            self.errors.append(("Reptag", line_num, col, f"Unclosed tag <{unclosed_tag}>"))
+
+    def checkpoint(self):
+        return tuple(self.stack)
+
+    def resume(self, state):
+        super().resume(state)
+        self.stack = list(state)
+
+    def moved(self, state, first_line, delta):
+        return tuple(
+            (tag, line + delta if line >= first_line else line, col)
+            for tag, line, col in state
+        )
 
-    for unclosed_tag, line_num, col in stack:
-        errors.append(("Reptag", line_num, col, f"Unclosed tag <{unclosed_tag}>"))
 
-    return errors
+def check_tag_nesting(file_content):
+    consumer = NestingConsumer()
+    scan(file_content, [consumer])
+    return consumer.errors
 
-def check_cross_page_tags(file_content):
+
+class CrossPageConsumer(Consumer):
     """
     Ensures that tags opened in one <Page> block are closed within the same page.
     """
-    errors = []
-    lines = file_content.splitlines()
-
-    tag_stack = []  # Stack of (tag, page_num, line_num, col)
-    page_line_map = {}  # line_num → page_num
 
-    current_page = "1"
-    for line_num, line in enumerate(lines, 1):
-        page_match = re.search(r'<Page\s+(\d+)\s*>', line, re.IGNORECASE)
-        if page_match:
-            current_page = page_match.group(1)
-        page_line_map[line_num] = current_page
-
-    tag_pattern = re.compile(r'<(/?)([A-Za-z][A-Za-z0-9]*)(?:\s[^>]*?)?>')
+    def __init__(self):
+        super().__init__()
+        # tag -> (pages, lines, cols) of its unclosed opening tags, oldest first.
+        # Layout markers (<P20>, <Page N>, ...) are never closed and pile up here,
+        # so one stack per tag keeps </tag> O(1) and the entries small
+        self.open_tags = {}
+        self.current_page = "1"
+        self._page_line = 0
+
+    def handlers(self):
+        return {TAG: self.on_tag, PAGE: self.on_page}
+
+    def on_page(self, tok):
+        # First <Page N> of a line wins (P20 markers don't count here)
+        if tok.rest == "Page" and not tok.lead and tok.line != self._page_line:
+            self._page_line = tok.line
+            self.current_page = tok.name
+
+    def on_tag(self, tok):
+        # <(/?)([A-Za-z][A-Za-z0-9]*)(?:\s[^>]*?)?>
+        if not is_strict_tag(tok) or not self.take(tok):
+            return
+        tag_name = tok.name
+        page_num = self.current_page
+
+        if tok.closing:
+            # Match the most recent opening of the same tag
+            opened = self.open_tags.get(tag_name)
+            if opened and opened[0]:
+                pages, lines, cols = opened
+                pg, ln, cl = pages.pop(), lines.pop(), cols.pop()
+                if pg != page_num:
+                    self.errors.append((
+                        "Reptag",
+                        ln,
+                        cl,
+                        f"Tag <{tag_name}> opened in Page {pg} but closed in Page {page_num} — must close in same page"
+                    ))
+        else:
+            # Opening tag
+            opened = self.open_tags.get(tag_name)
+            if opened is None:
+                opened = self.open_tags[tag_name] = ([], array("q"), array("q"))
+            opened[0].append(page_num)
+            opened[1].append(tok.line)
+            opened[2].append(tok.pos + 1)
+
+    def checkpoint(self):
+        open_tags = tuple(
+            (tag, tuple(pages), tuple(lines), tuple(cols))
+            for tag, (pages, lines, cols) in sorted(self.open_tags.items()) if pages
+        )
+        return open_tags, self.current_page
+
+    def resume(self, state):
+        super().resume(state)
+        open_tags, self.current_page = state
+        self.open_tags = {
+            tag: (list(pages), array("q", lines), array("q", cols))
+            for tag, pages, lines, cols in open_tags
+        }
+        self._page_line = 0
+
+    def moved(self, state, first_line, delta):
+        open_tags, current_page = state
+        open_tags = tuple(
+            (tag, pages, tuple(line + delta if line >= first_line else line for line in lines), cols)
+            for tag, pages, lines, cols in open_tags
+        )
+        return open_tags, current_page
 
-    for line_num, line in enumerate(lines, 1):
-        for match in tag_pattern.finditer(line):
-            is_closing = match.group(1) == '/'
-            tag_name = match.group(2)
-            col = match.start() + 1
-            page_num = page_line_map.get(line_num, "1")
-
-            if is_closing:
-                # Try to match with top of stack
-                for i in range(len(tag_stack) - 1, -1, -1):
-                    t, pg, ln, cl = tag_stack[i]
-                    if t == tag_name:
-                        if pg != page_num:
-                            errors.append((
-                                "Reptag",
-                                ln,
-                                cl,
-                                f"Tag <{tag_name}> opened in Page {pg} but closed in Page {page_num} — must close in same page"
-                            ))
-                        tag_stack.pop(i)
-                        break
-            else:
-                # Opening tag
-                tag_stack.append((tag_name, page_num, line_num, col))
 
-    return errors
+def check_cross_page_tags(file_content):
+    """
+    Ensures that tags opened in one <Page> block are closed within the same page.
+    """
+    consumer = CrossPageConsumer()
+    scan(file_content, [consumer])
+    return consumer.errors
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The validator modules sit flat at the top of the repo
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
@@ -0,0 +1,81 @@
+import pickle
+
+import pytest
+
+from error_list import ErrorList, SOURCE_LINE, CLEANED_LINE
+from line_index import LineIndex
+
+SOURCE = "<Page 1>\n<EMB>one</EMB>\n  <HN00>two\nthree\n"
+CLEANED = "<Page/>\n<EMB>one</EMB>\n  <HN00/>two\nthree"
+
+
+class Reader:
+    """read_lines stand-in counting the reads."""
+
+    def __init__(self):
+        self.reads = 0
+
+    def __call__(self, file_path):
+        self.reads += 1
+        return LineIndex(SOURCE), LineIndex(CLEANED)
+
+
+@pytest.fixture
+def errors():
+    errors = ErrorList("doc.fnt", Reader())
+    errors.append("Repent", 2, "1", "Invalid entity", SOURCE_LINE)
+    errors.append("Reptag", 3, "1", "Unsupported tag <HN00>", SOURCE_LINE)
+    errors.append("CheckSGM", 3, "1", "Parse error", CLEANED_LINE)
+    errors.append("Repent", 9, "2", "Invalid entity", SOURCE_LINE)
+    return errors
+
+
+def test_iteration_reads_contexts_of_both_kinds(errors):
+    assert list(errors) == [
+        ("Repent", 2, "1", "Invalid entity", "<EMB>one</EMB>"),
+        ("Reptag", 3, "1", "Unsupported tag <HN00>", "<HN00>two"),
+        ("CheckSGM", 3, "1", "Parse error", "<HN00/>two"),
+        ("Repent", 9, "2", "Invalid entity", "N/A"),
+    ]
+    # Repeated strings are kept once
+    assert errors.strings.count("Invalid entity") == 1
+
+
+def test_slices_and_take_are_error_lists(errors):
+    every = list(errors)
+    assert isinstance(errors[1:3], ErrorList)
+    assert list(errors[1:3]) == every[1:3]
+    assert list(errors.take([3, 0])) == [every[3], every[0]]
+    assert errors[-1] == every[-1]
+    assert len(errors[:0]) == 0 and not errors[:0]
+    with pytest.raises(IndexError):
+        errors[4]
+
+
+def test_file_is_read_once_while_kept_open(errors):
+    reader = errors.read_lines
+    list(errors)
+    list(errors)
+    assert reader.reads == 2
+    with errors.kept_open():
+        list(errors)
+        list(errors.take([0, 2]))
+        errors[1]
+    assert reader.reads == 3
+    list(errors)
+    assert reader.reads == 4
+
+
+def test_missing_file_gives_no_context(errors):
+    def gone(file_path):
+        raise FileNotFoundError(file_path)
+
+    errors.read_lines = gone
+    assert [error[4] for error in errors] == ["N/A"] * 4
+
+
+def test_rows_round_trip(errors):
+    rows = errors.rows()
+    again = ErrorList.from_rows("doc.fnt", errors.read_lines, rows)
+    assert list(again) == list(errors)
+    assert list(pickle.loads(pickle.dumps(errors[:2]))) == list(errors[:2])
@@ -0,0 +1,60 @@
+import os
+import random
+import subprocess
+import sys
+
+import pytest
+
+from incremental import validate_pages
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PIECES = [
+    "<EM>", "</EM>", "<EMB>", "</EMB>", "<T>", "</T>", "<A>", "</a>", "< EM>", "<Page 1>", "<Page 2>",
+    "<P20>7</P20>", "<SPage 4>", "&para;", "&bad;", "&#12;", "&x", "&amp;", "<foo_x>", "<!-- c -->",
+    "<FN>", "</FN>", "<fnt>", "<B64>", "</B64>", "[CN]", "text", "x  y", "<EMB>a  b</EMB>", "<root>",
+    "<", ">", "\n", "\n", "\n", "\n\n", "\n<Page 3>\n", "\n<P20>4</P20>\n",
+]
+
+
+def edited(rng, text):
+    """text with a few lines replaced, inserted or deleted."""
+    lines = text.split("\n")
+    i = rng.randrange(len(lines) + 1)
+    piece = "".join(rng.choice(PIECES) for _ in range(rng.randint(0, 4)))
+    op = rng.random()
+    if op < 0.4:
+        lines[i:i + 1] = piece.split("\n")
+    elif op < 0.7:
+        lines.insert(i, piece)
+    else:
+        del lines[i:i + rng.randint(1, 5)]
+    return "\n".join(lines)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_edits_match_a_full_run(seed):
+    rng = random.Random(seed)
+    for _ in range(40):
+        text = "".join(rng.choice(PIECES) for _ in range(rng.randint(0, 120)))
+        result = validate_pages(text)
+        for _ in range(5):
+            text = edited(rng, text)
+            result = validate_pages(text, result)
+            assert result.errors == validate_pages(text).errors, repr(text)
+
+
+def test_unchanged_pages_are_not_checked_again():
+    pages = "".join(f"<Page {n}>\n<EMB>page {n} &bad;</EMB>\n" for n in range(1, 21))
+    edited_pages = pages.replace("page 7 ", "page seven ")
+    again = validate_pages(edited_pages, validate_pages(pages))
+    assert again.revalidated == 1
+    assert again.errors == validate_pages(edited_pages).errors
+
+
+def test_import_builds_no_rules():
+    # The rules are built on first use, after --rules may have chosen a profile
+    code = "import incremental, ruleset; print(ruleset.load_ruleset.cache_info().currsize)"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            cwd=REPO).stdout
+    assert output.strip() == "0"
@@ -0,0 +1,68 @@
+import random
+import re
+
+import pytest
+
+import line_index
+from line_index import FileLines, LineIndex
+
+PIECES = ["a", "text", "\n", "\r", "\r\n", "\x85", " ", "\x0c", "é", "“quoted”", "x" * 50]
+
+
+def random_texts(count, seed=0):
+    rng = random.Random(seed)
+    return ["".join(rng.choice(PIECES) for _ in range(rng.randint(0, 60))) for _ in range(count)]
+
+
+def test_line_index_matches_splitlines():
+    for text in random_texts(300):
+        lines = text.splitlines()
+        index = LineIndex(text)
+        assert len(index) == len(lines)
+        assert [index[i] for i in range(len(index))] == lines
+        assert index[-1:] == lines[-1:] and index[::2] == lines[::2]
+        assert [index.context(n) for n in range(len(lines) + 2)] == \
+            ["N/A"] + [line.strip() for line in lines] + ["N/A"]
+
+
+def test_line_of_offsets():
+    text = "ab\r\ncd\n\né"
+    index = LineIndex(text)
+    assert [index.line_of(offset) for offset in range(len(text) + 1)] == [1, 1, 1, 1, 2, 2, 2, 3, 4, 4]
+    with pytest.raises(IndexError):
+        index[4]
+
+
+@pytest.mark.parametrize("block_bytes", [1, 2, 3, 7, 64])
+def test_file_lines_match_splitlines(tmp_path, monkeypatch, block_bytes):
+    monkeypatch.setattr(line_index, "READ_BLOCK_BYTES", block_bytes)
+    path = tmp_path / "lines.txt"
+    for text in random_texts(150, seed=block_bytes):
+        path.write_text(text, encoding="utf-8", newline="")
+        lines = FileLines(str(path))
+        assert list(lines) == text.splitlines()
+        assert [lines.context(n) for n in range(len(lines) + 2)] == \
+            [LineIndex(text).context(n) for n in range(len(lines) + 2)]
+
+
+def test_line_over_many_blocks(tmp_path, monkeypatch):
+    monkeypatch.setattr(line_index, "READ_BLOCK_BYTES", 16)
+    path = tmp_path / "long.txt"
+    long_line = "<P>" + "y" * 5000 + "</P>"
+    path.write_text(f"first\n{long_line}\nlast", encoding="utf-8")
+    lines = FileLines(str(path))
+    assert list(lines) == ["first", long_line, "last"]
+    assert lines[1] == long_line
+
+
+@pytest.mark.parametrize("block_bytes", [3, 64])
+def test_context_decodes_only_its_line(tmp_path, monkeypatch, block_bytes):
+    monkeypatch.setattr(line_index, "READ_BLOCK_BYTES", block_bytes)
+    path = tmp_path / "lines.txt"
+    for text in random_texts(100, seed=block_bytes + 1):
+        path.write_text(text.replace("a", "<root>"), encoding="utf-8", newline="")
+        view = FileLines(str(path)).substituted(re.compile("<root>"), "")
+        contexts = [view.context(n) for n in range(1, len(view) + 1)]
+        # No block was decoded for them
+        assert view._block_index == -1
+        assert contexts == [line.strip() for line in view]
@@ -0,0 +1,72 @@
+import random
+import re
+
+import pytest
+
+from parser import ENTITY_TO_NUMERIC, parse_xml, parse_xml_streaming, rewrite_entities
+
+# Documents that do not parse only because an element is left open at the end
+UNCLOSED_AT_END = [
+    ("<EM>a", "EM", 1),
+    ("<X>a</X>\n<Y>b", "Y", 2),
+    ("<P>text\n<B64>Obviously, state\ninterference\n", "B64", 2),
+    ('<?xml version="1.0"?>\n<EM>a', "EM", 2),
+]
+
+
+@pytest.mark.parametrize("content, tag, line", UNCLOSED_AT_END)
+def test_unclosed_element_at_end_is_reported(content, tag, line):
+    tree, errors, _ = parse_xml(content)
+    assert tree is None
+    assert [(category, error_line, msg) for category, error_line, _, msg, _ in errors] == [
+        ("Reptag-structure", line, f"Tag <{tag}> is never closed")
+    ]
+
+
+@pytest.mark.parametrize("content, tag, line", UNCLOSED_AT_END)
+def test_unclosed_element_at_end_is_reported_streaming(content, tag, line):
+    assert parse_xml_streaming(content)[1] == parse_xml(content)[1]
+
+
+def test_end_tag_without_start_is_reported():
+    # <B> is a layout marker, the cleaner makes it empty so </B> closes nothing
+    for parse in (parse_xml, parse_xml_streaming):
+        errors = parse("<EM>x</EM>\n<B>y</B>")[1]
+        assert [(category, line, msg) for category, line, _, msg, _ in errors] == [
+            ("Reptag-structure", 2, "End tag </B> has no start tag")
+        ]
+
+
+def test_mismatch_is_not_repeated_as_unclosed():
+    _, errors, _ = parse_xml("<root>\n<A>x\n<B>y</B>\n</root>")
+    assert [(category, line) for category, line, _, _, _ in errors] == [("Reptag-mismatch", 3)]
+
+
+def test_well_formed_documents_parse():
+    for content in ("<A>x</A>", "<EM>x</EM>\n<I>y</I>", "<Page 1>\n<P>a &amp; b</P>"):
+        tree, errors, _ = parse_xml(content)
+        assert tree is not None and errors == []
+
+
+def entities_one_by_one(text):
+    """What parse_xml did before rewrite_entities: the sanitizer, then a replace per mapped name."""
+    text = re.sub(r"&(?!#|amp;|lt;|gt;|quot;|apos;|[a-zA-Z0-9]+;)", "&amp;", text)
+    for entity, numeric in ENTITY_TO_NUMERIC.items():
+        text = text.replace(f"&{entity};", numeric)
+    return text
+
+
+def test_rewrite_entities_matches_one_replace_per_entity():
+    pieces = ["&", "&&", "&amp;", "&lt;", "&para;", "&eacute;", "&Eacute", "&bogus;", "&#12;", "&#x1F;",
+              "& ", "&;", "a", "x;", " ", "\n", "#"]
+    rng = random.Random(3)
+    for _ in range(2000):
+        text = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 20)))
+        assert rewrite_entities(text) == entities_one_by_one(text), text
+
+
+def test_rewrite_entities_reports_unknown_names_where_they_are():
+    unknown = []
+    text = "a &amp; b\n  x &bogus; &eacute; &lt;\n&zz;&"
+    assert rewrite_entities(text, unknown, first_line=10) == "a &amp; b\n  x &bogus; &#233; &lt;\n&zz;&amp;"
+    assert unknown == [(11, 5, "bogus"), (12, 1, "zz")]
@@ -0,0 +1,35 @@
+import json
+import os
+import subprocess
+import sys
+
+from profiling import dump_cprofile
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_same_named_files_get_their_own_stats(tmp_path):
+    root = tmp_path / "volumes"
+    for folder in ("a", "b"):
+        (root / folder).mkdir(parents=True)
+        (root / folder / "same.fnt").write_text("<EMB>x</EMB>\n", encoding="utf-8")
+    files = [str(root / "a" / "same.fnt"), str(root / "b" / "same.fnt")]
+    written = dump_cprofile(len, files, str(tmp_path / "out"), str(root))
+    assert written == [str(tmp_path / "out" / "a" / "same.fnt.pstats"),
+                       str(tmp_path / "out" / "b" / "same.fnt.pstats")]
+    assert all(os.path.isfile(path) for path in written)
+
+
+def test_profile_validates_cached_files(tmp_path):
+    folder = tmp_path / "volume"
+    folder.mkdir()
+    (folder / "a.fnt").write_text("<Page 1>\n<EMB>x</EMB>\n", encoding="utf-8")
+    command = [sys.executable, os.path.join(REPO, "main.py"), str(folder),
+               "--cache-file", str(tmp_path / "cache.sqlite")]
+    # The first run fills the cache, the profiled one must not use it
+    subprocess.run(command, cwd=tmp_path, check=True, capture_output=True)
+    subprocess.run(command + ["--profile", "--profile-top", "1"], cwd=tmp_path, check=True, capture_output=True)
+    with open(tmp_path / "validator_profile.json", encoding="utf-8") as f:
+        profile = json.load(f)
+    assert [entry["file"] for entry in profile["files"]] == [str(folder / "a.fnt")]
+    assert (tmp_path / "a.fnt.pstats").is_file()
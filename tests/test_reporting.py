@@ -0,0 +1,98 @@
+import io
+import json
+
+import pytest
+
+from error_list import ErrorList
+from line_index import LineIndex
+from reporting import ConsoleReport, NdjsonReport, XlsxReport
+
+SOURCE = "<Page 1>\nbad &bogus; here\n<ZZ>tag</ZZ>\n" + "".join(f"&e{i}; line\n" for i in range(5))
+
+
+def read_lines(file_path):
+    return LineIndex(SOURCE), LineIndex(SOURCE)
+
+
+@pytest.fixture
+def errors():
+    errors = ErrorList("doc.fnt", read_lines)
+    errors.append("Repent", 2, "1", "Invalid entity '&bogus;'")
+    errors.append("Reptag", 3, "1", "Unsupported tag <ZZ> found")
+    for i in range(5):
+        errors.append("Repent", 4 + i, "1", f"Invalid entity '&e{i};'")
+    return errors
+
+
+def test_console_report_groups_and_caps_each_category(errors):
+    stream = io.StringIO()
+    report = ConsoleReport(stream, max_per_category=2)
+    report.file_done("doc.fnt", errors)
+    report.file_done("clean.fnt", errors[:0])
+    report.close()
+    text = stream.getvalue()
+    assert "--- doc.fnt: 7 ISSUES ---" in text
+    assert "Page 1, Line 2:\nInvalid entity '&bogus;'\nContext: bad &bogus; here" in text
+    assert "Context: &e0; line" in text and "&e1;" not in text
+    assert "... 4 more REPENT issues not shown" in text
+    assert "✔ clean.fnt: CLEAN" in text
+    assert "Files Scanned: 2\nFiles with Errors: 1\nTotal Issues Found: 7\n" in text
+
+
+def test_console_summary_only(errors):
+    stream = io.StringIO()
+    report = ConsoleReport(stream, summary_only=True)
+    report.file_done("doc.fnt", errors)
+    report.close()
+    assert "ISSUES" not in stream.getvalue() and "Total Issues Found: 7" in stream.getvalue()
+
+
+def test_ndjson_report_has_a_record_per_error_file_and_run(tmp_path, errors):
+    path = tmp_path / "report.ndjson"
+    report = NdjsonReport(str(path))
+    report.file_done("doc.fnt", errors[:2])
+    report.file_done("clean.fnt", errors[:0])
+    report.close()
+    records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert records == [
+        {"type": "error", "file": "doc.fnt", "category": "Repent", "line": 2, "page": "1",
+         "message": "Invalid entity '&bogus;'", "context": "bad &bogus; here"},
+        {"type": "error", "file": "doc.fnt", "category": "Reptag", "line": 3, "page": "1",
+         "message": "Unsupported tag <ZZ> found", "context": "<ZZ>tag</ZZ>"},
+        {"type": "file", "file": "doc.fnt", "errors": 2},
+        {"type": "file", "file": "clean.fnt", "errors": 0},
+        {"type": "summary", "files": 2, "files_with_errors": 1, "errors": 2},
+    ]
+
+
+def sheet_rows(workbook, name):
+    return [tuple(cell.value for cell in row) for row in workbook[name].iter_rows()]
+
+
+def test_xlsx_report_has_a_sheet_per_category_and_a_summary(tmp_path, monkeypatch, errors):
+    openpyxl = pytest.importorskip("openpyxl")
+    # Small sheets, so the entities go on into a second one
+    monkeypatch.setattr(XlsxReport, "MAX_ROWS", 4)
+    errors.append("Rep[x]:y", 2, "iv", "Control \x07 character")
+    path = tmp_path / "report.xlsx"
+    report = XlsxReport(str(path))
+    report.file_done("doc.fnt", errors)
+    report.file_done("clean.fnt", errors[:0])
+    report.close()
+
+    workbook = openpyxl.load_workbook(str(path))
+    assert workbook.sheetnames == ["Summary", "Repent", "Reptag", "Repent 2", "Rep_x__y"]
+    assert sheet_rows(workbook, "Repent") == [
+        ("File", "Page", "Line", "Message", "Context"),
+        ("doc.fnt", 1, 2, "Invalid entity '&bogus;'", "bad &bogus; here"),
+        ("doc.fnt", 1, 4, "Invalid entity '&e0;'", "&e0; line"),
+        ("doc.fnt", 1, 5, "Invalid entity '&e1;'", "&e1; line"),
+    ]
+    assert len(sheet_rows(workbook, "Repent 2")) == 4
+    # Pages that are not numbers stay text, control characters are dropped
+    assert sheet_rows(workbook, "Rep_x__y")[1] == ("doc.fnt", "iv", 2, "Control  character", "bad &bogus; here")
+    assert sheet_rows(workbook, "Summary") == [
+        ("File", "Issues"), ("doc.fnt", 8), ("clean.fnt", 0), (None, None),
+        ("Files Scanned", 2), ("Files with Errors", 1), ("Total Issues Found", 8),
+        ("Rep[x]:y", 1), ("Repent", 6), ("Reptag", 1),
+    ]
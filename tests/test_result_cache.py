@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+import result_cache
+from result_cache import ResultCache, config_fingerprint
+from ruleset import use_ruleset
+from validator import validate_all_files
+
+BOGUS = "<Page 1>\n<EMB>x &bogus; y</EMB>\n"
+
+
+@pytest.fixture
+def profile(tmp_path):
+    """A rules profile allowing &bogus;; config.py's rules are active again afterwards."""
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps({"custom_entities": ["bogus"]}), encoding="utf-8")
+    yield str(path)
+    use_ruleset(None)
+
+
+def test_results_are_kept_between_runs(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite"))
+    cache.put("digest", [["Repent", 2, "1", "message"]])
+    cache.save()
+    assert ResultCache(str(tmp_path / "cache.sqlite")).get("digest") == [["Repent", 2, "1", "message"]]
+
+
+def test_version_change_makes_results_stale(tmp_path, monkeypatch):
+    cache = ResultCache(str(tmp_path / "cache.sqlite"))
+    cache.put("digest", [])
+    cache.save()
+    before = config_fingerprint()
+    monkeypatch.setattr(result_cache, "CACHE_VERSION", result_cache.CACHE_VERSION + 1)
+    assert config_fingerprint() != before
+    assert ResultCache(str(tmp_path / "cache.sqlite")).get("digest") is None
+
+
+def test_rules_change_makes_results_stale(tmp_path, profile):
+    (tmp_path / "a.fnt").write_text(BOGUS, encoding="utf-8")
+    cache_file = str(tmp_path / "cache.sqlite")
+
+    def run():
+        cache = ResultCache(cache_file)
+        return [msg for _, _, _, msg, _ in validate_all_files(str(tmp_path), ["a.fnt"], cache=cache)["a.fnt"]]
+
+    errors = run()
+    assert "Invalid entity '&bogus;'" in errors
+    # Cached, and the same again
+    assert run() == errors
+    use_ruleset(profile)
+    assert "Invalid entity '&bogus;'" not in run()
+    use_ruleset(None)
+    assert run() == errors
@@ -0,0 +1,92 @@
+import random
+
+from lxml import etree
+
+from rule_engine import StructureRules
+from tag_checker import validate_tags
+
+RULES = StructureRules(
+    {"C": {"required_parent": "B"}, "D": {"forbidden_parent": "A"}, "T": {"allowed_children": ["R", "X*"]}},
+    {"A": ["C", "D"], "B": ["D"], "R": ["T"]},
+    ["X1"],
+)
+TAGS = ["A", "B", "C", "D", "T", "R", "X1", "X2", "E"]
+
+
+def random_tree(rng, depth=0):
+    elem = etree.Element(rng.choice(TAGS))
+    if depth < 12:
+        for _ in range(rng.randint(0, 3)):
+            elem.append(random_tree(rng, depth + 1))
+    return elem
+
+
+def streamed(root):
+    """DocumentRules.start/end errors, as a parser target sees the elements."""
+    document = RULES.start_document()
+    errors = []
+
+    def walk(elem, line):
+        errors.extend(document.start(elem.tag, line, 0))
+        line += 1
+        for child in elem:
+            line = walk(child, line)
+        document.end()
+        return line
+
+    walk(root, 1)
+    return errors
+
+
+def walked_up(root):
+    """The same rules with parents and ancestors looked up in the tree itself."""
+    document = RULES.start_document()
+    errors = []
+    for line, elem in enumerate(root.iter(), 1):
+        parent = elem.getparent()
+
+        def ancestor(tags):
+            found = next(elem.iterancestors(*tags), None)
+            return found.tag if found is not None else None
+
+        errors.extend(document._check(elem.tag, parent, parent.tag if parent is not None else None,
+                                      ancestor, line, 0))
+    return errors
+
+
+def test_streamed_checks_match_tree_checks():
+    rng = random.Random(0)
+    for _ in range(300):
+        root = random_tree(rng)
+        assert streamed(root) == walked_up(root)
+
+
+def test_nearest_forbidden_ancestor_is_named():
+    root = etree.fromstring("<A><E><B><E><D/></E></B></E></A>")
+    messages = [msg for _, _, _, msg in streamed(root)]
+    assert "Invalid nesting: <D> should not be inside <B>" in messages
+    assert "Invalid nesting: <D> should not be inside <A>" not in messages
+
+
+def test_deep_documents_keep_their_open_tags_straight():
+    depth = 5000
+    document = RULES.start_document()
+    errors = []
+    for i in range(depth):
+        errors.extend(document.start("A" if i == 0 else "E", i + 1, 0))
+    errors.extend(document.start("D", depth + 1, 0))
+    document.end()
+    for _ in range(depth):
+        document.end()
+    assert [msg for _, _, _, msg in errors] == ["Invalid nesting: <D> should not be inside <A>"]
+    assert document._open_tags == [] and not any(document._open_depths.values())
+
+
+def test_deep_trees_are_checked_without_walking_up():
+    # <EMB> may not be inside <EMB> (config.py); every level repeats the error
+    depth = 3000
+    text = "<EMB>" * depth + "</EMB>" * depth
+    tree = etree.ElementTree(etree.fromstring(text, etree.XMLParser(huge_tree=True)))
+    errors = validate_tags(tree)
+    assert len(errors) == depth - 1
+    assert errors[0][3] == "Invalid nesting: <EMB> should not be inside <EMB>"
@@ -0,0 +1,39 @@
+import pytest
+
+import incremental
+from ruleset import active_ruleset
+from validator import validate_file
+
+# Layout tags of the grammar that the cleaner leaves as elements
+LAYOUT_DOCUMENT = (
+    "<Page 1>\n"
+    "<HN00><EMB>A. Procedural History</EMB>\n"
+    "<B64>Obviously, state interference</B64>\n"
+    "<B46>text <B66>more</B66></B46>\n"
+)
+
+
+def test_allowed_tags_cover_the_layout_grammar():
+    rules = active_ruleset()
+    assert rules.allowed_tags == rules.supported_tags | rules.layout_tags
+    assert {"HN00", "B64", "B66", "B46", "P2,10", "B10,12"} <= rules.allowed_tags
+    assert not {"B3", "P22,", "HN000", "P222"} & rules.allowed_tags
+
+
+def test_ruleset_is_immutable():
+    with pytest.raises(AttributeError):
+        active_ruleset().supported_tags = frozenset()
+
+
+@pytest.mark.parametrize("stream_parse", [False, True])
+def test_layout_tags_pass_every_tag_check(tmp_path, stream_parse):
+    path = tmp_path / "layout.fnt"
+    path.write_text(LAYOUT_DOCUMENT, encoding="utf-8")
+    assert list(validate_file(str(path), stream_parse=stream_parse)) == []
+    assert incremental.validate_pages(LAYOUT_DOCUMENT).errors == []
+
+
+def test_unsupported_tag_is_still_reported(tmp_path):
+    path = tmp_path / "unsupported.fnt"
+    path.write_text(LAYOUT_DOCUMENT + "<B65>odd</B65>\n", encoding="utf-8")
+    assert [msg for _, _, _, msg, _ in validate_file(str(path))] == ["Unsupported tag <B65> found"]
@@ -0,0 +1,20 @@
+import os
+
+import pytest
+
+from validator import validate_file
+
+SAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Samples")
+
+# (category, line, page, message) of every issue of each sample
+EXPECTED = {
+    # <B64> left open near the end: the only error, must not be reported CLEAN
+    "327A3D.fnt": [("Reptag-structure", 106720, "1274", "Tag <B64> is never closed")],
+}
+
+
+@pytest.mark.parametrize("name", sorted(EXPECTED))
+@pytest.mark.parametrize("stream_parse", [False, True])
+def test_sample_issues(name, stream_parse):
+    errors = validate_file(os.path.join(SAMPLES, name), stream_parse=stream_parse)
+    assert [(category, line, page, msg) for category, line, page, msg, _ in errors] == EXPECTED[name]
@@ -0,0 +1,118 @@
+import http.client
+import json
+import os
+import stat
+import subprocess
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import service
+from service import ValidationService, ValidatorRequestHandler
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def served(tmp_path):
+    """A service on a free localhost port serving tmp_path/root, as serve() sets it up."""
+    root = tmp_path / "root"
+    root.mkdir()
+    (root / "bad.fnt").write_text("<Page 1>\n<EMB>&bogus;</EMB>\n", encoding="utf-8")
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ValidatorRequestHandler)
+    server.service = ValidationService(1)
+    server.root = os.path.realpath(str(root))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.server_address[1], root
+    server.shutdown()
+    server.server_close()
+    server.service.close()
+
+
+def post(port, body, headers=None):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    if not isinstance(body, (str, bytes)):
+        body = json.dumps(body)
+    connection.request("POST", "/validate", body, {"Content-Type": "application/json", **(headers or {})})
+    response = connection.getresponse()
+    payload = json.loads(response.read())
+    connection.close()
+    return response.status, payload
+
+
+def test_validates_content_and_paths(served):
+    port, root = served
+    status, payload = post(port, {"content": "<Page 1>\n<EMB>ok</EMB>\n", "name": "x.fnt"})
+    assert (status, payload["results"]) == (200, {"x.fnt": []})
+    status, payload = post(port, {"path": "bad.fnt"})
+    assert status == 200 and payload["errors"] == 1
+    assert service.request({"path": str(root)}, port=port)["files"] == 1
+
+
+@pytest.mark.parametrize("job", [
+    {},
+    {"path": "bad.fnt", "content": "x"},
+    {"content": 5},
+    {"content": "x", "name": ".."},
+    {"content": "x", "name": "a/b.fnt"},
+    {"path": 3},
+    {"path": ".", "files": "bad.fnt"},
+    {"path": ".", "files": [1]},
+    {"path": "bad.fnt", "max_errors": "5"},
+    {"path": "bad.fnt", "max_errors": 0},
+    {"path": "bad.fnt", "recover": "yes"},
+    [1, 2],
+])
+def test_malformed_jobs_are_bad_requests(served, job):
+    status, payload = post(served[0], job)
+    assert status == 400 and payload["error"].startswith("Bad request")
+
+
+def test_invalid_json_is_a_bad_request(served):
+    assert post(served[0], "{not json")[0] == 400
+
+
+@pytest.mark.parametrize("job", [
+    {"path": "/etc/passwd"},
+    {"path": ".."},
+    {"path": ".", "files": ["../../etc/passwd"]},
+])
+def test_paths_outside_the_root_are_forbidden(served, job):
+    assert post(served[0], job)[0] == 403
+
+
+def test_missing_path_and_endpoint_are_not_found(served):
+    port, _ = served
+    assert post(port, {"path": "missing.fnt"})[0] == 404
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    connection.request("GET", "/nothing")
+    assert connection.getresponse().status == 404
+    connection.close()
+
+
+def test_foreign_host_and_content_type_are_refused(served):
+    port, _ = served
+    assert post(port, {"path": "bad.fnt"}, {"Host": "evil.example:8765"})[0] == 403
+    assert post(port, {"path": "bad.fnt"}, {"Content-Type": "text/plain"})[0] == 415
+
+
+@pytest.mark.skipif(service.UnixHTTPServer is None, reason="no Unix sockets here")
+def test_unix_socket_is_private(tmp_path):
+    socket_path = str(tmp_path / "validator.sock")
+    process = subprocess.Popen([sys.executable, os.path.join(REPO, "main.py"), "--serve", "--socket",
+                                socket_path, "--serve-root", str(tmp_path)],
+                               cwd=str(tmp_path), stdout=subprocess.DEVNULL)
+    try:
+        deadline = time.time() + 30
+        while not os.path.exists(socket_path) and time.time() < deadline:
+            time.sleep(0.05)
+        assert stat.S_IMODE(os.stat(socket_path).st_mode) == 0o600
+        answer = service.request({"content": "<Page 1>\n<EMB>ok</EMB>\n"}, socket_path=socket_path, timeout=30)
+        assert answer["errors"] == 0
+    finally:
+        process.terminate()
+        process.wait(30)
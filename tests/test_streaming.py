@@ -0,0 +1,65 @@
+import random
+import re
+
+import pytest
+
+import line_index
+from validator import validate_file
+
+PIECES = [
+    "<EM>", "</EM>", "<EMB>", "</EMB>", "<T>", "</T>", "<A>", "</a>", "< EM>", "<Page 1>", "<Page 2>",
+    "<P20>7</P20>", "<SPage 4>", "&para;", "&bad;", "&#12;", "&x", "&amp;", "<foo_x>", "<!-- c -->",
+    "<FN>", "</FN>", "<fnt>", "<B64>", "</B64>", "<HN00>", "[CN]", "text", "x  y", "<EMB>a  b</EMB>",
+    "<root>", "<", ">", "\n", "\n", "\n", "\n\n", "\r\n", "\r", "\x0b", "\n</root>", "<root\n>", "<SPage\x0b2>",
+]
+# The wrapper on a line of its own at the end, where removing it leaves no line
+ENDINGS = ["", "", "\n</root>", "\n</root>\n", "\r</root>", "</root>"]
+
+
+def issues(errors):
+    # lxml names the line of an unfinished start tag only when it has the whole text
+    return [(category, line, page, re.sub(r"(Start Tag \S+) line \d+", r"\1", msg), context)
+            for category, line, page, msg, context in errors]
+
+
+def random_documents(tmp_path, seed, count=120):
+    rng = random.Random(seed)
+    path = tmp_path / "doc.fnt"
+    for _ in range(count):
+        text = "".join(rng.choice(PIECES) for _ in range(rng.randint(0, 150))) + rng.choice(ENDINGS)
+        path.write_text(text, encoding="utf-8", newline="")
+        yield str(path)
+
+
+@pytest.mark.parametrize("block_bytes", [64, line_index.READ_BLOCK_BYTES])
+def test_stream_parse_matches_tree_parse(tmp_path, monkeypatch, block_bytes):
+    # Small blocks, so lines and tags are cut across reads
+    monkeypatch.setattr(line_index, "READ_BLOCK_BYTES", block_bytes)
+    for path in random_documents(tmp_path, block_bytes):
+        tree = validate_file(path, stream_parse=False)
+        assert issues(validate_file(path, stream_parse=True)) == issues(tree), open(path).read()
+
+
+def test_recovered_parse_errors_match(tmp_path):
+    # lxml's push parser may repair a document differently, the parse errors are the same
+    def parse_errors(errors):
+        return [issue for issue in issues(errors) if issue[0] != "Reptag"]
+
+    for path in random_documents(tmp_path, 7):
+        tree = validate_file(path, stream_parse=False, recover=True)
+        assert parse_errors(validate_file(path, stream_parse=True, recover=True)) == parse_errors(tree)
+
+
+def test_well_formed_document_is_clean_both_ways(tmp_path):
+    path = tmp_path / "clean.fnt"
+    path.write_text("<Page 1>\n<HN00><EMB>Heading</EMB>\n<B64>Text &amp; more</B64>\n", encoding="utf-8")
+    assert list(validate_file(str(path), stream_parse=False)) == []
+    assert list(validate_file(str(path), stream_parse=True)) == []
+
+
+@pytest.mark.parametrize("text", ["<root>\n<EM>x<b\n</root>\n", "<root>\n<EM>x<b\n</root>", "<root\n><EM>x<b\n", "<SPage\x0b2>\n&bad;\n"])
+def test_removed_wrapper_lines_count_the_same_both_ways(tmp_path, text):
+    path = tmp_path / "doc.fnt"
+    path.write_text(text, encoding="utf-8", newline="")
+    tree = list(validate_file(str(path), stream_parse=False))
+    assert tree and issues(validate_file(str(path), stream_parse=True)) == issues(tree)
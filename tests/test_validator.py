@@ -0,0 +1,138 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import validator
+from reporting import MultiReport, ReportSink
+from validator import validate_all_files, validate_file, _stream_chunks
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SMALL_FILES = [
+    "<Page 1>\n<EMB>clean</EMB>\n",
+    "<Page 1>\n<EMB>bad &bogus; entity</EMB>\n",
+    "<Page 1>\n<EMB>unsupported <ZZ>tag</ZZ></EMB>\n",
+    "<Page 1>\n<EMB>left open\n",
+]
+
+
+class CollectingSink(ReportSink):
+    def __init__(self):
+        super().__init__()
+        self.reported = []
+
+    def file_done(self, filename, errors):
+        super().file_done(filename, errors)
+        self.reported.append((filename, list(errors)))
+
+
+@pytest.fixture
+def folder(tmp_path):
+    """A large file first (a task of its own, done last by the pool), then many small ones."""
+    big = "<Page 1>\n" + "<EMB>some text &amp; more &bogus;</EMB>\n" * 40000
+    (tmp_path / "a000.fnt").write_text(big, encoding="utf-8")
+    for i in range(120):
+        (tmp_path / f"b{i:03d}.fnt").write_text(SMALL_FILES[i % len(SMALL_FILES)], encoding="utf-8")
+    return tmp_path
+
+
+def run(folder, files, **options):
+    sink = CollectingSink()
+    counts = validate_all_files(str(folder), files, sink=sink, **options)
+    return sink.reported, counts
+
+
+@pytest.mark.parametrize("as_list", [True, False])
+def test_pool_reports_in_input_order(folder, as_list):
+    names = sorted(path.name for path in folder.iterdir())
+    serial = run(folder, list(names))
+    files = list(names) if as_list else iter(names)
+    assert run(folder, files, jobs=3) == serial
+    assert [name for name, _ in serial[0]] == names
+
+
+def test_pool_order_with_a_small_reorder_buffer(folder, monkeypatch):
+    monkeypatch.setattr(validator, "REORDER_MAX_FILES", 2)
+    names = sorted(path.name for path in folder.iterdir())
+    assert run(folder, iter(names), jobs=3) == run(folder, iter(names))
+
+
+def test_results_without_sink_are_the_same_pooled(folder):
+    names = sorted(path.name for path in folder.iterdir())
+    serial = validate_all_files(str(folder), names)
+    pooled = validate_all_files(str(folder), iter(names), jobs=3)
+    assert list(pooled) == names
+    assert {name: list(errors) for name, errors in pooled.items()} == {
+        name: list(errors) for name, errors in serial.items()
+    }
+
+
+def test_found_files_are_scheduled_largest_first_per_window(tmp_path):
+    sizes = [10, 3000, 20, 50000, 5, 400, 2000000, 7]
+    paths = []
+    for i, size in enumerate(sizes):
+        path = tmp_path / f"f{i}.fnt"
+        path.write_bytes(b"x" * size)
+        paths.append(str(path))
+    chunks = list(_stream_chunks(iter(paths), window=4))
+    # Window 1: f0..f3, window 2: f4..f7; the big file gets a task of its own
+    assert chunks == [paths[3:4] + paths[1:2] + paths[2:3] + paths[0:1], paths[6:7],
+                      paths[5:6] + paths[7:8] + paths[4:5]]
+
+
+def test_max_errors_keeps_the_first_errors_found(folder):
+    path = str(folder / "a000.fnt")
+    every = list(validate_file(path))
+    some = list(validate_file(path, max_errors=3))
+    assert len(every) > 3 and len(some) == 3
+    assert all(error in every for error in some)
+    counts = validate_all_files(str(folder), ["a000.fnt", "b001.fnt"], max_errors=1)
+    assert [len(errors) for errors in counts.values()] == [1, 1]
+
+
+@pytest.mark.parametrize("jobs", [1, 3])
+def test_fail_fast_stops_at_the_first_file_with_errors(folder, jobs):
+    names = ["b000.fnt", "b004.fnt", "b001.fnt"] + [f"b{i:03d}.fnt" for i in range(8, 120, 4)]
+    reported, counts = run(folder, names, jobs=jobs, fail_fast=True)
+    # The failing file has a single error; the pool may have checked others
+    # besides, out of input order, but they are reported in it
+    assert counts["b001.fnt"] == 1
+    assert [name for name, _ in reported] == list(counts) == [name for name in names if name in counts]
+    if jobs == 1:
+        assert list(counts) == names[:3]
+
+
+def test_files_listed_twice_are_reported_once(folder):
+    reported, counts = run(folder, ["b001.fnt", "b002.fnt", "b001.fnt"])
+    assert [name for name, _ in reported] == ["b001.fnt", "b002.fnt"]
+    assert list(counts) == ["b001.fnt", "b002.fnt"]
+
+
+def test_fail_fast_note_names_what_was_not_checked(tmp_path):
+    folder = tmp_path / "volume"
+    folder.mkdir()
+    for name in ("a.fnt", "b.fnt"):
+        (folder / name).write_text(SMALL_FILES[1], encoding="utf-8")
+    done = subprocess.run([sys.executable, os.path.join(REPO, "main.py"), str(folder), "--fail-fast", "--no-cache"],
+                          cwd=tmp_path, capture_output=True, text=True, encoding="utf-8")
+    assert done.returncode == 1
+    assert "⛔ Stopped at the first file with errors, the rest of the folder not checked" in done.stdout
+
+
+def test_sinks_share_one_read_of_each_file(folder, monkeypatch):
+    reads = []
+    read_source_lines = validator.read_source_lines
+
+    def counted(file_path, stream=None):
+        reads.append(file_path)
+        return read_source_lines(file_path, stream)
+
+    monkeypatch.setattr(validator, "read_source_lines", counted)
+    sinks = [CollectingSink(), CollectingSink()]
+    names = [f"b{i:03d}.fnt" for i in range(8)]
+    validate_all_files(str(folder), names, sink=MultiReport(sinks))
+    assert sinks[0].reported == sinks[1].reported
+    # Files with errors are read once for both sinks, the clean ones never
+    assert reads == [str(folder / name) for name in names if name not in ("b000.fnt", "b004.fnt")]
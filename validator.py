@@ -1,251 +1,652 @@
 import os
 import re
+import sys
+import tracemalloc
+from array import array
+from bisect import bisect_right
 from collections import defaultdict
-from parser import parse_xml, preprocess_file_content
-from entity_checker import check_entities
-from tag_checker import validate_tags, check_tag_nesting, check_cross_page_tags
-from config import CUSTOM_ENTITIES, SUPPORTED_TAGS, NON_CLOSING_TAGS
-
-
-def is_valid_layout_tag(tag):
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from functools import partial
+from parser import parse_xml, parse_xml_streaming, preprocess_file_content, preprocess_lines
+from lexer import Consumer, TAG, PAGE, scan
+from line_index import LineIndex, FileLines, with_newlines, substitute_text
+from entity_checker import EntityConsumer, TableSpacingConsumer
+from tag_checker import validate_tags, TagRulesTarget, NestingConsumer, CrossPageConsumer
+from ruleset import active_ruleset, use_ruleset, ROOT_TAG_PATTERN, SPAGE_TAG_PATTERN
+from error_list import ErrorList, SOURCE_LINE, CLEANED_LINE
+from result_cache import digest_file
+from discovery import discover_files
+from profiling import FileProfile, NO_PROFILE
+from reporting import file_report
+
+
+# Parallel runs: files this big get a task of their own, smaller ones are
+# packed together up to this many bytes / files per task
+CHUNK_BYTES = 1024 * 1024
+CHUNK_MAX_FILES = 64
+# Results that finished ahead of an earlier file and wait for it before they
+# go to the sink; past this many no new task is started until the early file is done
+REORDER_MAX_FILES = 1024
+# Files still being found are scheduled this many at a time, largest first
+SCHEDULE_WINDOW_FILES = 256
+
+# Files this big are read block by block and parsed with parse_xml_streaming unless told otherwise
+STREAM_PARSE_MIN_BYTES = 64 * 1024 * 1024
+
+
+
+class AngleTagConsumer(Consumer):
     """
-    Validates layout tags like P24, B10, HN2, P00, P2,10, B10,12, etc.
-    Rules:
-    - Tag starts with P, B, or HN
-    - Contains 1 or 2 numbers
-    - Each number must be 0 or a multiple of 2 (0–20)
-    - If either number is two-digit, comma is required
+    Detects unsupported angle-bracket tags like <random>.
+    Skips:
+    - Known allowed tags (from config)
+    - Layout tags (Pxx, Bxx, HNxx, etc.)
+    - Dynamic tags (fnt/fnr)
+    - Artificial wrapper <root>
     """
-    match = re.match(r'^(P|B|HN)(\d{1,2})(?:,(\d{1,2}))?$', tag)
-    if not match:
-        return False
-
-    prefix, first, second = match.group(1), match.group(2), match.group(3)
 
-    try:
-        if second is not None:
-            first_val = int(first)
-            second_val = int(second)
-        else:
-            if len(first) == 2:
-                # Split two-digit number into separate digits (e.g., P24 -> 2 and 4)
-                first_val = int(first[0])
-                second_val = int(first[1])
-            else:
-                first_val = int(first)
-                second_val = None
-    except ValueError:
-        return False
+    def __init__(self, allowed_tags, layout_tags=None):
+        super().__init__()
+        self.allowed_tags = allowed_tags
+        # Every valid layout tag name, precomputed (Ruleset.layout_tags)
+        self.layout_tags = layout_tags if layout_tags is not None else active_ruleset().layout_tags
+        self._skip_line = 0
+        self._checked_line = 0
+
+    def handlers(self):
+        return {TAG: self.on_tag}
+
+    def on_tag(self, tok):
+        line_num = tok.line
+        if line_num != self._checked_line:
+            self._checked_line = line_num
+            # Skip comments, XML declarations, and DOCTYPE
+            if self.lines[line_num - 1].strip().startswith(("<!--", "<?", "<!")):
+                self._skip_line = line_num
+        if line_num == self._skip_line or not self.take(tok):
+            return
+
+        tag = tok.name
+        tag_lower = tag.lower()
+
+        # Skip artificial wrapper
+        if tag_lower == "root":
+            return
+
+        # Dynamic tags like fnt/fnr
+        is_dynamic = tag_lower.startswith("fnt") or tag_lower.startswith("fnr")
+
+        if tag in self.allowed_tags or tag in self.layout_tags or is_dynamic:
+            return
+
+        self.errors.append((
+            "Reptag",
+            line_num,
+            tok.pos + 1,
+            f"Unsupported tag <{tag}> found"
+        ))
+
+    def resume(self, state):
+        super().resume(state)
+        self._skip_line = 0
+        self._checked_line = 0
 
-    # ✅ Allow 0 and even numbers up to 20
-    is_valid = lambda x: x == 0 or x in range(2, 21, 2)
 
-    if not is_valid(first_val):
-        return False
-    if second_val is not None and not is_valid(second_val):
-        return False
+def check_invalid_angle_tags(raw_content, allowed_tags):
+    """
+    Detects unsupported angle-bracket tags like <random>.
+    """
+    consumer = AngleTagConsumer(allowed_tags)
+    scan(raw_content, [consumer])
+    return consumer.errors
 
-    # If either number is two-digit, comma must be present
-    if second_val is not None and (first_val >= 10 or second_val >= 10) and second is None:
-        return False
 
-    return True
+class BlankLineConsumer(Consumer):
+    """
+    Reports error if there are two blank lines after <Page 1> with no tag following.
+    `raw_lines` are the lines before <SPage> removal, if the scanned content had them stripped.
+    """
 
+    def __init__(self, raw_lines=None):
+        super().__init__()
+        self.raw_lines = raw_lines
+        self.page_one_line = None
+
+    def handlers(self):
+        return {PAGE: self.on_page}
+
+    def on_page(self, tok):
+        if self.page_one_line is None and tok.rest == "Page" and tok.name == "1":
+            self.page_one_line = tok.line
+
+    def checkpoint(self):
+        return self.page_one_line
+
+    def resume(self, state):
+        super().resume(state)
+        self.page_one_line = state
+
+    def moved(self, state, first_line, delta):
+        if state is not None and state >= first_line:
+            return state + delta
+        return state
+
+    def finish(self):
+        if self.page_one_line is None:
+            return
+        lines = self.lines if self.raw_lines is None else self.raw_lines
+        i = self.page_one_line - 1
+        if i + 3 >= len(lines):
+            return
+        if lines[i + 1].strip() != "" or lines[i + 2].strip() != "":
+            return
+        next_line = lines[i + 3].strip()
+        # No tag like <...> or [...] or {...}
+        if not re.match(r'[\[<{]', next_line):
+            self.errors.append((
+                "CheckSGM",
+                i + 2,  # report the second blank line number
+                1,
+                "No tag found after two consecutive blank lines following <Page 1>"
+            ))
 
 
-def check_invalid_angle_tags(raw_content, allowed_tags):
+def check_blank_lines_after_page_one(raw_content):
     """
-    Detects unsupported angle-bracket tags like <random>.
-    Skips:
-    - Known allowed tags (from config)
-    - Layout tags (Pxx, Bxx, HNxx, etc.)
-    - Dynamic tags (fnt/fnr)
-    - Artificial wrapper <root>
+    Reports error if there are two blank lines after <Page 1> with no tag following.
     """
-    errors = []
-    tag_pattern = re.compile(r'<\s*/?\s*([a-zA-Z0-9_]+)[^>]*>')
+    consumer = BlankLineConsumer()
+    scan(raw_content, [consumer])
+    return consumer.errors
 
-    layout_tags = {
-        "P20", "Page", "CN", "HN02", "HN24", "P00", "B22", "HN68", "B24", "HN46",
-        "B42", "P24", "P42", "B44", "B", "C5", "HN00", "HN20"
-    }
 
-    lines = raw_content.splitlines()
-    for line_num, line in enumerate(lines, 1):
-        stripped = line.strip()
+class PageTracker(Consumer):
+    """
+    Tracks the page every line belongs to: <Page N> wins, otherwise <P20>N</P20>.
+    page_lines[i] is the line where pages[i] starts.
+    """
 
-        # Skip comments, XML declarations, and DOCTYPE
-        if stripped.startswith(("<!--", "<?", "<!")):
-            continue
+    def __init__(self):
+        super().__init__()
+        self.page_lines = array("l", [0])
+        self.pages = ["1"]
+        self._from_page_tag = False
+
+    def handlers(self):
+        return {PAGE: self.on_page}
+
+    def on_page(self, tok):
+        is_page_tag = tok.rest == "Page"
+        if is_page_tag and tok.lead:
+            return
+        if self.page_lines[-1] == tok.line:
+            # First <Page N> on the line wins over any <P20> marker
+            if self._from_page_tag or not is_page_tag:
+                return
+            self.pages[-1] = tok.name
+        else:
+            self.page_lines.append(tok.line)
+            self.pages.append(tok.name)
+        self._from_page_tag = is_page_tag
 
-        for match in tag_pattern.finditer(line):
-            tag = match.group(1)
-            tag_lower = tag.lower()
+    def checkpoint(self):
+        return self.pages[-1]
 
-            # Skip artificial wrapper
-            if tag_lower == "root":
-                continue
+    def resume(self, state):
+        """Starts over on the given page; only page changes after this point are kept."""
+        super().resume(state)
+        self.page_lines = array("l", [0])
+        self.pages = [state]
+        self._from_page_tag = False
 
-            # Dynamic tags like fnt/fnr
-            is_dynamic = tag_lower.startswith("fnt") or tag_lower.startswith("fnr")
+    def page_of(self, line):
+        if not 0 < line <= len(self.lines):
+            return "1"
+        return self.pages[bisect_right(self.page_lines, line) - 1]
 
-            if (
-                tag in allowed_tags or
-                tag in layout_tags or
-                is_dynamic or
-                is_valid_layout_tag(tag)
-            ):
-                continue
 
-            col = match.start() + 1
-            errors.append((
-                "Reptag",
-                line_num,
-                col,
-                f"Unsupported tag <{tag}> found"
-            ))
+def validate_file(file_path, stream_parse=None, profile=None, recover=False, max_errors=None):
+    """
+    Runs every check on one file and returns its deduplicated errors as an
+    ErrorList (the context lines are read from the file when it is iterated).
+    stream_parse=True maps the file and decodes it a block at a time (see FileLines)
+    and parses with parse_xml_streaming: neither the text nor a tree is held
+    in memory. None picks it for files of STREAM_PARSE_MIN_BYTES or more.
+    recover=True also runs the tag structure checks on files that do not
+    parse, on the tree lxml recovers from them.
+    max_errors=N returns at most N errors and stops checking once it has them:
+    the scan ends within SCAN_BLOCK_LINES lines, and the lexical checks are all
+    reported before the XML parse, which is skipped if they fill the budget.
+    A FileProfile passed as `profile` records the time and errors of each stage.
+    The tags and entities checked for are those of the active Ruleset.
+    """
+    if profile is None:
+        profile = NO_PROFILE
+    rules = active_ruleset()
 
-    return errors
+    if stream_parse is None:
+        stream_parse = os.path.getsize(file_path) >= STREAM_PARSE_MIN_BYTES
 
+    with profile.stage("read"):
+        if stream_parse:
+            # Only the line index, lines are read as the checks reach them
+            file_lines = FileLines(file_path)
+        else:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                raw_content = f.read()
+
+    with profile.stage("scan"):
+        if stream_parse:
+            # ✅ Same removals, block by block as the lines are read
+            lines = file_lines.substituted(ROOT_TAG_PATTERN, "")
+            raw_content = lines.substituted(SPAGE_TAG_PATTERN, "")
+        else:
+            # ✅ Remove artificial <root> wrapper if present (never across a
+            # line break: the lines keep their numbers, as when streaming)
+            raw_content = substitute_text(with_newlines(raw_content), ROOT_TAG_PATTERN, "")
+
+            lines = LineIndex(raw_content)
+
+            # 🔍 Remove <SPage>
+            raw_content = substitute_text(raw_content, SPAGE_TAG_PATTERN, "")
+
+        # 🔍 One pass over the content feeds every lexical checker
+        page_tracker = PageTracker()
+        blank_check = BlankLineConsumer(raw_lines=lines)
+        angle_check = AngleTagConsumer(rules.supported_tags, rules.layout_tags)
+        entity_check = EntityConsumer(rules.allowed_entities)
+        table_check = TableSpacingConsumer()
+        nesting_check = NestingConsumer()
+        cross_page_check = CrossPageConsumer()
+        checks = [blank_check, angle_check, entity_check, table_check, nesting_check, cross_page_check]
+        stop = None
+        if max_errors is not None:
+            # Duplicates count here too, so this may stop a little early
+            stop = lambda: sum(len(check.errors) for check in checks) >= max_errors
+        scan(raw_content, [page_tracker] + checks, stop)
+    page_of = page_tracker.page_of
+    for check, consumer in (
+        ("blank_lines", blank_check), ("angle_tags", angle_check), ("entities", entity_check),
+        ("table_spacing", table_check), ("nesting", nesting_check), ("cross_page", cross_page_check),
+    ):
+        profile.count("scan", check, consumer.errors)
+
+    # Deduplicated as they come; contexts are read when the errors are rendered
+    categorized_errors = ErrorList(file_path, partial(read_source_lines, stream=stream_parse))
+    # Seen errors as ints: the id of the dedupe key, the line below it
+    key_ids = {}
+    seen = set()
+
+    def full():
+        return max_errors is not None and len(categorized_errors) >= max_errors
+
+    def add_error(cat, line, msg, kind=SOURCE_LINE):
+        page = page_of(line)
+        key_id = key_ids.setdefault(_dedupe_key(cat, page, msg), len(key_ids))
+        key = key_id << 32 | line
+        if key not in seen and not full():
+            seen.add(key)
+            categorized_errors.append(cat, line, page, msg, kind)
+
+    def add_errors(errors):
+        for cat, line, col, msg in errors:
+            if full():
+                return
+            add_error(cat, line, msg)
+
+    # 🔍 Blank-line check after <Page 1>
+    add_errors(blank_check.errors)
+
+    # 🔍 Invalid tags
+    add_errors(angle_check.errors)
+
+    # 🔍 Entities, tables, nesting, cross-page tags
+    lexical_errors = [entity_check.errors, table_check.errors, nesting_check.errors, cross_page_check.errors]
+    if max_errors is not None:
+        # ⏩ With a budget they go first: a file that fills it is never parsed
+        for errors in lexical_errors:
+            add_errors(errors)
+        lexical_errors = []
+
+    # 🔍 Parse XML
+    tree = None
+    element_errors = []
+    if not full():
+        with profile.stage("preprocess"):
+            if stream_parse:
+                cleaned_content = preprocess_lines(raw_content)
+            else:
+                cleaned_content = preprocess_file_content(raw_content)
+        with profile.stage("parse"):
+            if stream_parse:
+                tree, parse_errors, element_errors = parse_xml_streaming(
+                    cleaned_content, preprocessed=True,
+                    make_target=partial(TagRulesTarget, rules.allowed_tags), recover=recover
+                )
+            else:
+                tree, parse_errors, _ = parse_xml(cleaned_content, preprocessed=True, recover=recover)
+        profile.count("parse", "parse", parse_errors)
+        profile.count("parse", "elements", element_errors)
+        for error in parse_errors:
+            if len(error) == 5 and not full():
+                cat, line, col, msg, _ = error
+                add_error(cat, line, msg, CLEANED_LINE)
+
+    for errors in lexical_errors:
+        add_errors(errors)
+
+    # 🔍 Tag structure (only if parsing succeeded, or on the recovered tree)
+    if tree is not None and not full():
+        with profile.stage("validate_tags"):
+            tag_errors = validate_tags(tree, rules.allowed_tags, rules.non_closing_tags)
+        profile.count("validate_tags", "tags", tag_errors)
+        add_errors(tag_errors)
+    # Streamed parse: same element rules, collected while parsing. The
+    # balancing half of validate_tags has nothing to add there, a parsed
+    # event stream is balanced by construction
+    add_errors(element_errors)
+
+    if stream_parse:
+        # Contexts are read through a mapping of their own
+        file_lines.close()
+    return categorized_errors
+
+
+def read_source_lines(file_path, stream=None):
+    """
+    (source lines, cleaned lines) of a file, as validate_file checks and
+    parses them: where ErrorList reads error contexts from.
+    stream=True reads them block by block (see FileLines); None picks that
+    for the files validate_file would stream.
+    """
+    if stream is None:
+        stream = os.path.getsize(file_path) >= STREAM_PARSE_MIN_BYTES
+    if stream:
+        lines = FileLines(file_path).substituted(ROOT_TAG_PATTERN, "")
+        return lines, preprocess_lines(lines.substituted(SPAGE_TAG_PATTERN, ""))
+    with open(file_path, 'r', encoding='utf-8') as f:
+        raw_content = substitute_text(with_newlines(f.read()), ROOT_TAG_PATTERN, "")
+    cleaned_content = preprocess_file_content(substitute_text(raw_content, SPAGE_TAG_PATTERN, ""))
+    return LineIndex(raw_content), LineIndex(cleaned_content)
+
+
+def _dedupe_key(cat, page, msg):
+    """Errors on one line with the same key are repeats; tag-structure errors count once per line."""
+    if cat.startswith("Reptag"):
+        lower_msg = msg.lower()
+        if "mismatch" in lower_msg or "nest" in lower_msg:
+            return ("Reptag", "tag_structure_issue")
+    return (cat, page, msg)
+
+
+def dedupe_errors(categorized_errors):
+    """Keeps the first of each repeated error; tag-structure errors count once per line."""
+    unique_errors = set()
+    deduped_errors = []
+    for err in categorized_errors:
+        cat, line, page, msg = err[:4]
+        dedup_key = (line, _dedupe_key(cat, page, msg))
+        if dedup_key not in unique_errors:
+            unique_errors.add(dedup_key)
+            deduped_errors.append(err)
+
+    return deduped_errors
+
+
+def _validate_one(file_path, profiles=None, **options):
+    if profiles is None:
+        return validate_file(file_path, **options)
+    profile = FileProfile(file_path)
+    errors = validate_file(file_path, profile=profile, **options)
+    profiles.append(profile.as_dict())
+    return errors
 
 
-def check_blank_lines_after_page_one(raw_content):
+def _validate_chunk(file_paths, profile=False, fail_fast=False, **options):
     """
-    Reports error if there are two blank lines after <Page 1> with no tag following.
+    Errors of each file; with profile=True also the FileProfile dicts of the chunk.
+    options go to validate_file. fail_fast=True stops after the first file with
+    errors, the files after it get no entry.
     """
-    errors = []
-    lines = raw_content.splitlines()
-
-    page_one_pattern = re.compile(r'<\s*Page\s+1\s*>', re.IGNORECASE)
-
-    for i, line in enumerate(lines):
-        if page_one_pattern.search(line):
-            if i + 2 < len(lines):
-                if lines[i + 1].strip() == "" and lines[i + 2].strip() == "":
-                    if i + 3 < len(lines):
-                        next_line = lines[i + 3].strip()
-                        # No tag like <...> or [...] or {...}
-                        if not re.match(r'[\[<{]', next_line):
-                            errors.append((
-                                "CheckSGM",
-                                i + 2,  # report the second blank line number
-                                1,
-                                "No tag found after two consecutive blank lines following <Page 1>"
-                            ))
-            break
-    return errors
+    profiles = [] if profile else None
+    started = profile and not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        errors = []
+        for file_path in file_paths:
+            errors.append(_validate_one(file_path, profiles, **options))
+            if fail_fast and errors[-1]:
+                break
+    finally:
+        if started:
+            tracemalloc.stop()
+    if not profile:
+        return errors
+    return errors, profiles
+
+
+def _schedule_chunks(file_paths):
+    """
+    Groups files into pool tasks: largest files first, one per task,
+    then the small ones packed together so per-task overhead stays small.
+    """
+    sized = sorted(file_paths, key=os.path.getsize, reverse=True)
+    chunks = []
+    chunk, chunk_bytes = [], 0
+    for file_path in sized:
+        size = os.path.getsize(file_path)
+        if size >= CHUNK_BYTES:
+            chunks.append([file_path])
+            continue
+        chunk.append(file_path)
+        chunk_bytes += size
+        if chunk_bytes >= CHUNK_BYTES or len(chunk) >= CHUNK_MAX_FILES:
+            chunks.append(chunk)
+            chunk, chunk_bytes = [], 0
+    if chunk:
+        chunks.append(chunk)
+    return chunks
 
 
-def validate_all_files(folder_path, files_to_check=None):
-    results = {}
+def _stream_chunks(file_paths, window=SCHEDULE_WINDOW_FILES):
+    """
+    _schedule_chunks for files still being found: each `window` files found
+    are scheduled together (largest first), while the next ones are found.
+    """
+    batch = []
+    for file_path in file_paths:
+        batch.append(file_path)
+        if len(batch) >= window:
+            yield from _schedule_chunks(batch)
+            batch = []
+    if batch:
+        yield from _schedule_chunks(batch)
 
-    # If no file list provided, read all from folder
-    if files_to_check is None:
-        files_to_check = os.listdir(folder_path)
 
-    for filename in files_to_check:
-        file_path = os.path.join(folder_path, filename)
+class _InOrder:
+    """
+    Hands results to emit(*result) in input order (see validate_all_files):
+    done(index, ...) holds a result until those of every earlier index are out.
+    """
 
-        if not os.path.isfile(file_path):
-            continue
+    def __init__(self, emit):
+        self.emit = emit
+        self.next = 0
+        self.held = {}
 
-        with open(file_path, 'r', encoding='utf-8') as f:
-            raw_content = f.read()
-
-        # ✅ Remove artificial <root> wrapper if present
-        raw_content = re.sub(r"<\s*/?\s*root\s*>", "", raw_content, flags=re.IGNORECASE)
-
-        # Track page numbers
-        page_numbers = {}
-        current_page = "1"
-        lines = raw_content.splitlines()
-
-        for line_num, line in enumerate(lines, 1):
-            page_match = re.search(r'<Page\s+(\d+)\s*>', line, re.IGNORECASE)
-            if page_match:
-                current_page = page_match.group(1)
-            elif '<P20>' in line:
-                p20_match = re.search(r'<P20>(\d+)</P20>', line)
-                if p20_match:
-                    current_page = p20_match.group(1)
-            page_numbers[line_num] = current_page
-
-        categorized_errors = []
-
-        # 🔍 Blank-line check after <Page 1>
-        blank_line_errors = check_blank_lines_after_page_one(raw_content)
-        for cat, line, col, msg in blank_line_errors:
-            page = page_numbers.get(line, "1")
-            context = lines[line - 1].strip() if 0 < line <= len(lines) else "N/A"
-            categorized_errors.append((cat, line, page, msg, context))
-
-        # 🔍 Remove <SPage> and check invalid tags
-        raw_content = re.sub(r"<\s*SPage\b[^>]*>", "", raw_content, flags=re.IGNORECASE)
-        invalid_tag_errors = check_invalid_angle_tags(raw_content, SUPPORTED_TAGS)
-        for cat, line, col, msg in invalid_tag_errors:
-            page = page_numbers.get(line, "1")
-            context = lines[line - 1].strip() if 0 < line <= len(lines) else "N/A"
-            categorized_errors.append((cat, line, page, msg, context))
-
-        # 🔍 Parse XML
-        cleaned_content = preprocess_file_content(raw_content)
-        tree, parse_errors, _ = parse_xml(cleaned_content)
-        for error in parse_errors:
-            if len(error) == 5:
-                cat, line, col, msg, context = error
-                page = page_numbers.get(line, "1")
-                categorized_errors.append((cat, line, page, msg, context))
-
-        # 🔍 Entities
-        entity_errors = check_entities(raw_content, CUSTOM_ENTITIES)
-        for cat, line, col, msg in entity_errors:
-            page = page_numbers.get(line, "1")
-            context = lines[line - 1].strip() if 0 < line <= len(lines) else "N/A"
-            categorized_errors.append((cat, line, page, msg, context))
-
-        # 🔍 Nesting
-        nesting_errors = check_tag_nesting(raw_content)
-        for cat, line, col, msg in nesting_errors:
-            page = page_numbers.get(line, "1")
-            context = lines[line - 1].strip() if 0 < line <= len(lines) else "N/A"
-            categorized_errors.append((cat, line, page, msg, context))
-
-        # 🔍 Cross-page tags
-        cross_page_errors = check_cross_page_tags(raw_content)
-        for cat, line, col, msg in cross_page_errors:
-            page = page_numbers.get(line, "1")
-            context = lines[line - 1].strip() if 0 < line <= len(lines) else "N/A"
-            categorized_errors.append((cat, line, page, msg, context))
-
-        # 🔍 Tag structure (only if parsing succeeded)
-        if tree is not None:
-            tag_errors = validate_tags(tree, SUPPORTED_TAGS, NON_CLOSING_TAGS)
-            for cat, line, col, msg in tag_errors:
-                page = page_numbers.get(line, "1")
-                context = lines[line - 1].strip() if 0 < line <= len(lines) else "N/A"
-                categorized_errors.append((cat, line, page, msg, context))
-
-        # ✅ Deduplicate
-        unique_errors = set()
-        deduped_errors = []
-        for err in categorized_errors:
-            if err[0].startswith("Reptag"):
-                line = err[1]
-                msg = err[3]
-                if "mismatch" in msg.lower() or "nest" in msg.lower():
-                    dedup_key = ("Reptag", line, "tag_structure_issue")
-                else:
-                    dedup_key = (err[0], err[1], err[2], err[3])
-            else:
-                dedup_key = (err[0], err[1], err[2], err[3])
-            if dedup_key not in unique_errors:
-                unique_errors.add(dedup_key)
-                deduped_errors.append(err)
+    def done(self, index, *result):
+        self.held[index] = result
+        while self.next in self.held:
+            self.emit(*self.held.pop(self.next))
+            self.next += 1
 
-        results[filename] = deduped_errors
+    def flush(self):
+        """Emits what is still held, in order, past the results that never came (fail_fast)."""
+        for index in sorted(self.held):
+            self.emit(*self.held.pop(index))
 
-    return results
 
+def validate_all_files(folder_path, files_to_check=None, jobs=1, stream_parse=None, cache=None,
+                       profiles=None, recover=False, max_errors=None, fail_fast=False, sink=None):
+    """
+    Validates every file and returns {filename: errors} in input order
+    (a filename listed more than once counts once).
+    files_to_check may be any iterable, e.g. discovery.discover_files():
+    files are validated while it is still yielding more (without a list the
+    folder itself is listed, not recursively).
+    With jobs > 1 files are spread over a process pool (jobs=0 uses every CPU),
+    largest first (among each SCHEDULE_WINDOW_FILES files of an iterable);
+    the results are the same as a serial run.
+    stream_parse, recover and max_errors are passed on to validate_file.
+    fail_fast=True stops at the first file with errors (one error is enough,
+    unless max_errors asks for more): files not validated by then are left
+    out of the result.
+    With a reporting sink (see reporting.ReportSink) the errors of each file
+    go to sink.file_done(filename, errors) and are not kept: {filename: error
+    count} is returned instead. Files go to the sink in input order, each as
+    soon as it and every file before it are done (a file finished early by
+    the pool waits for the earlier ones).
+    With a ResultCache, files whose content and config are unchanged since an
+    earlier run are not validated again. Results cut short by max_errors are
+    not stored.
+    If a list is given as `profiles`, a FileProfile dict of every file actually
+    validated is appended to it (tracemalloc runs meanwhile, which is slower).
+    """
+    # If no file list provided, read all from folder
+    if files_to_check is None:
+        files_to_check = discover_files(folder_path, recursive=False, exclude=(), skip_binary=False)
+    # A list is scheduled as a whole, largest files first; anything else a
+    # window of files at a time (see _stream_chunks)
+    known = isinstance(files_to_check, (list, tuple))
+
+    paths = {}
+    names = defaultdict(list)
+
+    if fail_fast and max_errors is None:
+        max_errors = 1
+
+    # file path -> its errors, or their count with a sink
+    file_errors = {}
+    failed = False
+
+    def report(file_path, errors):
+        # One read of the file for the contexts of every report (sink) of it
+        with errors.kept_open():
+            for filename in names[file_path]:
+                sink.file_done(filename, errors)
+
+    in_order = _InOrder(report)
+    # file path -> its place in the input, for in_order
+    indexes = {}
+
+    def file_done(file_path, errors):
+        nonlocal failed
+        failed = failed or bool(errors)
+        if sink is None:
+            file_errors[file_path] = errors
+            return
+        file_errors[file_path] = len(errors)
+        in_order.done(indexes[file_path], file_path, errors)
+
+    digests = {}
+
+    def pending_files():
+        """Files still to validate, in input order; cached results are reported on the way."""
+        for filename in files_to_check:
+            if fail_fast and failed:
+                # A cached result already failed the run
+                return
+            if filename in paths:
+                # Listed twice: validated and reported once
+                continue
+            file_path = os.path.join(folder_path, filename)
+            if file_path in names:
+                paths[filename] = file_path
+                names[file_path].append(filename)
+                continue
+            if not os.path.isfile(file_path):
+                continue
+            paths[filename] = file_path
+            names[file_path].append(filename)
+            indexes[file_path] = len(indexes)
+            if cache is not None:
+                digest = digest_file(file_path)
+                if recover:
+                    # Recovered files report more errors; keep both results apart
+                    digest += ":recover"
+                rows = cache.get(digest)
+                if rows is not None:
+                    # Contexts are read from this file, same content as the cached one
+                    errors = ErrorList.from_rows(file_path, partial(read_source_lines, stream=stream_parse), rows)
+                    file_done(file_path, errors[:max_errors])
+                    continue
+                digests[file_path] = digest
+            yield file_path
+
+    pending = pending_files()
+    if known:
+        pending = list(pending)
+
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+
+    profile = profiles is not None
+    options = dict(stream_parse=stream_parse, recover=recover, max_errors=max_errors)
+
+    def chunk_done(chunk, chunk_result):
+        if profile:
+            chunk_result, chunk_profiles = chunk_result
+            profiles.extend(chunk_profiles)
+        for file_path, errors in zip(chunk, chunk_result):
+            if cache is not None and max_errors is None:
+                cache.put(digests[file_path], errors.rows())
+            file_done(file_path, errors)
+
+    if jobs <= 1 or (known and len(pending) <= 1):
+        # One file at a time, so each is reported as soon as it is done
+        for file_path in pending:
+            chunk_done([file_path], _validate_chunk([file_path], profile, **options))
+            if fail_fast and failed:
+                break
+    else:
+        chunks = _schedule_chunks(pending) if known else _stream_chunks(pending)
+        # Workers check with the same Ruleset (spawned ones do not inherit it)
+        with ProcessPoolExecutor(max_workers=min(jobs, len(chunks)) if known else jobs,
+                                 initializer=use_ruleset, initargs=(active_ruleset().source,)) as executor:
+            # Chunks handed to the pool ahead of the workers: enough to keep
+            # them busy while the rest are still being found
+            in_flight = {}
+
+            def collect():
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chunk_done(in_flight.pop(future), future.result())
+
+            for chunk in chunks:
+                in_flight[executor.submit(_validate_chunk, chunk, profile, fail_fast, **options)] = chunk
+                while len(in_flight) >= 2 * jobs and not (fail_fast and failed):
+                    collect()
+                # Bounded memory: an early file holding many results back
+                # is waited for before more are started
+                while in_flight and len(in_order.held) > REORDER_MAX_FILES and not (fail_fast and failed):
+                    collect()
+                if fail_fast and failed:
+                    break
+            while in_flight and not (fail_fast and failed):
+                collect()
+            if fail_fast and failed:
+                # ⏩ Chunks not started yet are dropped
+                executor.shutdown(cancel_futures=True)
+
+    # Files validated after the one that failed the run (fail_fast) are still reported
+    in_order.flush()
+
+    if cache is not None and max_errors is None:
+        cache.save()
+
+    return {filename: file_errors[file_path] for filename, file_path in paths.items()
+            if file_path in file_errors}
 
 
 def print_error_report(results):
@@ -259,29 +660,6 @@ def print_error_report(results):
     print(f"Total Issues Found: {total_errors}\n")
 
     for filename, errors in results.items():
-        if not errors:
-            print(f"✔ {filename}: CLEAN\n")
-            continue
-
-        print(f"--- {filename}: {len(errors)} ISSUES ---\n")
-
-        error_groups = defaultdict(list)
-        for err in errors:
-            error_groups[err[0]].append(err[1:])
-
-        for category, err_list in error_groups.items():
-            color = {
-                "Repent": "\033[91m",
-                "Reptag": "\033[93m",
-                "Reptab": "\033[94m",
-                "CheckSGM": "\033[96m"
-            }.get(category, "")
-            reset = "\033[0m"
-
-            print(f"{color}{category.upper()} ({len(err_list)}){reset}\n")
-            for line, page, msg, context in err_list:
-                print(f"Page {page}, Line {line}:")
-                print(msg)
-                print(f"Context: {context[:120]}{'...' if len(context) > 120 else ''}\n")
+        sys.stdout.write("".join(file_report(filename, errors)))
 
     print("--- VALIDATION COMPLETE ---\n")